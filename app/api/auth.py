@@ -1,11 +1,11 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
-from app.api.deps import CurrentUser
+from app.api.deps import CurrentUser, conditional_get
 from app.schemas.common import UserOut
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 
 
-@router.get('/me', response_model=UserOut)
-def me(user: CurrentUser):
+@router.get('/me', response_model=UserOut, dependencies=[Depends(conditional_get)])
+async def me(user: CurrentUser):
     return user
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Response
+from sqlalchemy.orm import Session
+
+from app.api.deps import CurrentUser, ReadDBSession, conditional_get
+from app.api.instances import _to_row
+from app.api.responses import as_dict, json_response
+from app.models.models import TelegramUser
+from app.schemas.common import BootstrapOut, SessionOut, SettingsOut, TaskOut, UserOut
+from app.services.domain import bootstrap_state
+
+router = APIRouter(prefix='/bootstrap', tags=['bootstrap'])
+
+
+def _bootstrap_rows(db: Session, user: TelegramUser) -> dict:
+    state = bootstrap_state(db, user.id)
+    return {
+        'user': as_dict(user, UserOut),
+        'settings': as_dict(state['settings'], SettingsOut),
+        'tasks': [as_dict(task, TaskOut) for task in state['tasks']],
+        'open_day': as_dict(state['open_day'], SessionOut) if state['open_day'] else None,
+        'open_week': as_dict(state['open_week'], SessionOut) if state['open_week'] else None,
+        'today': [_to_row(inst) for inst in state['today']],
+        'week': [_to_row(inst) for inst in state['week']],
+    }
+
+
+@router.get('', response_model=BootstrapOut, dependencies=[Depends(conditional_get)])
+async def bootstrap(response: Response, db: ReadDBSession, user: CurrentUser):
+    return json_response(response, BootstrapOut, await db.run_sync(_bootstrap_rows, user))
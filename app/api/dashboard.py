@@ -1,20 +1,16 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from sqlalchemy import select
 
-from app.api.deps import CurrentUser, DBSession
+from app.api.deps import CurrentUser, ReadDBSession, conditional_get
 from app.models.models import DaySession, WeekSession
 
 router = APIRouter(prefix='/dashboard', tags=['dashboard'])
 
 
-@router.get('')
-def dashboard_state(db: DBSession, user: CurrentUser):
-    day = db.scalar(
-        select(DaySession).where(DaySession.user_id == user.id, DaySession.closed_at.is_(None)).order_by(DaySession.id.desc())
-    )
-    week = db.scalar(
-        select(WeekSession).where(WeekSession.user_id == user.id, WeekSession.closed_at.is_(None)).order_by(WeekSession.id.desc())
-    )
+@router.get('', dependencies=[Depends(conditional_get)])
+async def dashboard_state(db: ReadDBSession, user: CurrentUser):
+    day = await db.scalar(select(DaySession).where(DaySession.user_id == user.id, DaySession.closed_at.is_(None)))
+    week = await db.scalar(select(WeekSession).where(WeekSession.user_id == user.id, WeekSession.closed_at.is_(None)))
     return {
         'open_day': {
             'id': day.id,
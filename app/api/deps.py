@@ -1,11 +1,33 @@
+from datetime import datetime
 from typing import Annotated
 
-from fastapi import Depends
-from sqlalchemy.orm import Session
+from fastapi import Depends, Header, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.auth import get_current_user
-from app.db.session import get_db
+from app.db.session import get_async_db, get_async_read_db
 from app.models.models import TelegramUser
 
-DBSession = Annotated[Session, Depends(get_db)]
+DBSession = Annotated[AsyncSession, Depends(get_async_db)]
+ReadDBSession = Annotated[AsyncSession, Depends(get_async_read_db)]
 CurrentUser = Annotated[TelegramUser, Depends(get_current_user)]
+
+
+def data_etag(user: TelegramUser) -> str:
+    # The month is part of the tag because stats for period=months follow the calendar.
+    return f'W/"{user.id}.{user.data_version}.{datetime.utcnow():%Y%m}"'
+
+
+def _weak_tags(header: str) -> set[str]:
+    return {tag.strip().removeprefix('W/') for tag in header.split(',')}
+
+
+async def conditional_get(response: Response, user: CurrentUser, if_none_match: Annotated[str | None, Header()] = None) -> None:
+    """Answer 304 from the user row loaded by authentication, before any data query runs."""
+    etag = data_etag(user)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if if_none_match:
+        tags = _weak_tags(if_none_match)
+        if '*' in tags or etag.removeprefix('W/') in tags:
+            raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
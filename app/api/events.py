@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+
+from app.api.deps import CurrentUser
+from app.services.events import event_broker
+
+router = APIRouter(prefix='/events', tags=['events'])
+
+
+@router.get('')
+async def events(user: CurrentUser):
+    """Server-Sent Events: instance.updated/added, day.opened/closed, week.opened/closed, resync."""
+    return StreamingResponse(
+        event_broker.stream(user.id, user.data_version),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
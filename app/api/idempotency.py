@@ -0,0 +1,110 @@
+"""Idempotency-Key support for writes that must not run twice.
+
+The first successful response for a (user, key) pair is stored and
+replayed, with ``Idempotent-Replayed: true``, for every retry that carries
+the same key. A retry that arrives while the first request is still
+running waits for it and shares its result, instead of queueing a second
+transaction on the writer. Errors are not stored: a failed write changed
+nothing, so running it again is safe. Within a process retries wait on the
+first request's future; across workers the first request claims the key
+with a row in idempotent_responses before it runs, and a retry served by
+another worker polls that row until the response is stored.
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Annotated
+
+from fastapi import Depends, Header, HTTPException, Request, Response
+
+from app.api.deps import CurrentUser, DBSession
+from app.api.responses import encode_model
+from app.db.session import AsyncReadSessionLocal
+from app.models.models import IdempotentResponse
+from app.services.idempotency import IN_PROGRESS, claim_key, find_response, is_abandoned, release_key, save_response
+
+MAX_KEY_LENGTH = 255
+# How often a retry checks on a request with the same key running in another worker.
+CLAIM_POLL_SECONDS = 0.05
+
+# (user id, key) -> future of (request, status code, body) for requests being executed.
+_in_flight: dict[tuple[int, str], asyncio.Future] = {}
+
+
+def _replay(status_code: int, body: str) -> Response:
+    return Response(body, status_code=status_code, media_type='application/json', headers={'Idempotent-Replayed': 'true'})
+
+
+class Idempotency:
+    def __init__(
+        self, request: Request, db: DBSession, user: CurrentUser, idempotency_key: Annotated[str | None, Header()] = None
+    ) -> None:
+        self.db = db
+        self.user_id = user.id
+        self.key = idempotency_key
+        self.request = f'{request.method} {request.url.path}'
+
+    def _check_request(self, request: str) -> None:
+        if request != self.request:
+            raise HTTPException(status_code=422, detail=f'Idempotency-Key was already used for {request}')
+
+    async def _claim(self) -> IdempotentResponse | None:
+        """Claim the key for this request; returns the stored response instead once another request has one."""
+        while True:
+            async with AsyncReadSessionLocal() as db:
+                stored = await db.run_sync(find_response, self.user_id, self.key)
+            if stored is None or is_abandoned(stored):
+                if await self.db.run_sync(claim_key, self.user_id, self.key, self.request, stored):
+                    return None
+            elif stored.status_code != IN_PROGRESS or stored.request != self.request:
+                return stored
+            else:
+                await asyncio.sleep(CLAIM_POLL_SECONDS)
+
+    async def run(self, response_model, call: Callable[[], Awaitable]):
+        """Run ``call`` once per key and answer with its response_model-encoded result."""
+        if not self.key:
+            return await call()
+        if len(self.key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters')
+
+        slot = (self.user_id, self.key)
+        in_flight = _in_flight.get(slot)
+        if in_flight is not None:
+            request, status_code, body = await asyncio.shield(in_flight)
+            self._check_request(request)
+            return _replay(status_code, body)
+
+        future = asyncio.get_running_loop().create_future()
+        _in_flight[slot] = future
+        try:
+            stored = await self._claim()
+            if stored is not None:
+                result = (stored.request, stored.status_code, stored.body)
+            else:
+                try:
+                    result = (self.request, 200, encode_model(response_model, await call()).decode())
+                except BaseException:
+                    await asyncio.shield(self.db.run_sync(release_key, self.user_id, self.key))
+                    raise
+                # The request's own session: the SQLite writer pool has a single connection.
+                await self.db.run_sync(save_response, self.user_id, self.key, *result[1:])
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # waiters re-raise it; nobody else needs to retrieve it
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del _in_flight[slot]
+
+        if stored is None:
+            return Response(result[2], media_type='application/json')
+        self._check_request(stored.request)
+        return _replay(stored.status_code, stored.body)
+
+
+Idempotent = Annotated[Idempotency, Depends()]
@@ -1,43 +1,80 @@
-from fastapi import APIRouter
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.orm import Session
 
-from app.api.deps import CurrentUser, DBSession
-from app.models.models import Instance
-from app.schemas.common import AddBacklogToScope, InstanceOut, InstanceStatusUpdate
-from app.services.domain import add_backlog_to_scope, list_instances, update_instance_status
+from app.api.deps import CurrentUser, DBSession, ReadDBSession, conditional_get
+from app.api.idempotency import Idempotent
+from app.api.responses import json_response
+from app.core.config import settings
+from app.models.models import ArchivedInstance, Instance, InstanceStatus, TelegramUser
+from app.schemas.common import AddBacklogToScope, InstanceOut, InstancesStatusUpdate, InstanceStatusUpdate
+from app.services.domain import add_backlog_to_scope, list_history, list_instances, update_instance_status, update_instance_statuses
 
 router = APIRouter(prefix='/instances', tags=['instances'])
 
 
+def _to_row(instance: Instance | ArchivedInstance) -> dict:
+    return {
+        'id': instance.id,
+        'task_id': instance.task_id,
+        'task_title': instance.task.title,
+        'task_kind': instance.task.kind,
+        'status': instance.status,
+        'penalty_applied': instance.penalty_applied,
+        'day_session_id': instance.day_session_id,
+        'week_session_id': instance.week_session_id,
+        'created_at': instance.created_at,
+    }
+
+
 def _to_out(instance: Instance) -> InstanceOut:
-    return InstanceOut(
-        id=instance.id,
-        task_id=instance.task_id,
-        task_title=instance.task.title,
-        task_kind=instance.task.kind,
-        status=instance.status,
-        penalty_applied=instance.penalty_applied,
-        day_session_id=instance.day_session_id,
-        week_session_id=instance.week_session_id,
-        created_at=instance.created_at,
-    )
+    return InstanceOut(**_to_row(instance))
+
+
+def _list_rows(db: Session, user: TelegramUser, scope: str, cursor: str | None, limit: int | None) -> tuple[list[dict], str | None]:
+    if scope == 'history':
+        instances, next_cursor = list_history(db, user, cursor, limit)
+        return [_to_row(inst) for inst in instances], next_cursor
+    return [_to_row(inst) for inst in list_instances(db, user, scope)], None
+
+
+def _set_status_out(db: Session, user: TelegramUser, instance_id: int, status: InstanceStatus) -> InstanceOut:
+    return _to_out(update_instance_status(db, user, instance_id, status))
+
+
+def _set_statuses_out(db: Session, user: TelegramUser, changes: list[tuple[int, InstanceStatus]]) -> list[InstanceOut]:
+    return [_to_out(inst) for inst in update_instance_statuses(db, user, changes)]
+
+
+def _add_backlog_out(db: Session, user: TelegramUser, task_id: int, scope: str) -> InstanceOut:
+    return _to_out(add_backlog_to_scope(db, user, task_id, scope))
+
+
+@router.get('', response_model=list[InstanceOut], dependencies=[Depends(conditional_get)])
+async def get_instances(
+    scope: str,
+    response: Response,
+    db: ReadDBSession,
+    user: CurrentUser,
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=settings.history_page_size_max),
+):
+    rows, next_cursor = await db.run_sync(_list_rows, user, scope, cursor, limit)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return json_response(response, list[InstanceOut], rows)
 
 
-@router.get('', response_model=list[InstanceOut])
-def get_instances(scope: str, db: DBSession, user: CurrentUser):
-    instances = list_instances(db, user.id, scope)
-    return [_to_out(inst) for inst in instances]
+@router.put('/status', response_model=list[InstanceOut])
+async def set_statuses(payload: InstancesStatusUpdate, db: DBSession, user: CurrentUser):
+    changes = [(change.instance_id, change.status) for change in payload.changes]
+    return await db.run_sync(_set_statuses_out, user, changes)
 
 
 @router.put('/{instance_id}/status', response_model=InstanceOut)
-def set_status(instance_id: int, payload: InstanceStatusUpdate, db: DBSession, user: CurrentUser):
-    instance = update_instance_status(db, user, instance_id, payload.status)
-    instance = db.scalar(select(Instance).where(Instance.id == instance.id))
-    return _to_out(instance)
+async def set_status(instance_id: int, payload: InstanceStatusUpdate, db: DBSession, user: CurrentUser):
+    return await db.run_sync(_set_status_out, user, instance_id, payload.status)
 
 
 @router.post('/add_backlog', response_model=InstanceOut)
-def add_backlog(payload: AddBacklogToScope, db: DBSession, user: CurrentUser):
-    instance = add_backlog_to_scope(db, user, payload.task_id, payload.scope)
-    instance = db.scalar(select(Instance).where(Instance.id == instance.id))
-    return _to_out(instance)
+async def add_backlog(payload: AddBacklogToScope, db: DBSession, user: CurrentUser, idempotency: Idempotent):
+    return await idempotency.run(InstanceOut, lambda: db.run_sync(_add_backlog_out, user, payload.task_id, payload.scope))
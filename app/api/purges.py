@@ -0,0 +1,17 @@
+from fastapi import APIRouter, HTTPException
+from sqlalchemy import select
+
+from app.api.deps import CurrentUser, ReadDBSession
+from app.models.models import PurgeJob
+from app.schemas.common import PurgeOut
+
+router = APIRouter(prefix='/purges', tags=['purges'])
+
+
+@router.get('/{purge_id}', response_model=PurgeOut)
+async def get_purge(purge_id: int, db: ReadDBSession, user: CurrentUser):
+    # No ETag: the job moves from pending to running without a data_version bump.
+    job = await db.scalar(select(PurgeJob).where(PurgeJob.id == purge_id, PurgeJob.user_id == user.id))
+    if not job:
+        raise HTTPException(status_code=404, detail='Purge not found')
+    return job
@@ -1,31 +1,29 @@
 from fastapi import APIRouter
 
 from app.api.deps import CurrentUser, DBSession
+from app.api.idempotency import Idempotent
 from app.schemas.common import CloseSessionOut, SessionOut
 from app.services.domain import (
     build_day_close_result,
     build_week_close_result,
     close_day,
     close_week,
-    get_open_week,
     start_day,
     start_week,
 )
-from app.services.telegram_notify import notify_day_closed, notify_week_closed
+from app.services.telegram_notify import notification_dispatcher
 
 router = APIRouter(prefix='/sessions', tags=['sessions'])
 
 
-@router.post('/start_day', response_model=SessionOut)
-def api_start_day(db: DBSession, user: CurrentUser):
-    return start_day(db, user)
+async def _start_day(db: DBSession, user: CurrentUser):
+    return await db.run_sync(start_day, user)
 
 
-@router.post('/close_day', response_model=CloseSessionOut)
-def api_close_day(db: DBSession, user: CurrentUser):
-    day = close_day(db, user)
-    summary, currency = build_day_close_result(db, user, day)
-    notify_day_closed(user.telegram_user_id, day.id, summary, currency)
+async def _close_day(db: DBSession, user: CurrentUser) -> dict:
+    day = await db.run_sync(close_day, user)
+    notification_dispatcher.wake()
+    summary, currency = await db.run_sync(build_day_close_result, user, day)
     return {
         'id': day.id,
         'started_at': day.started_at,
@@ -36,21 +34,16 @@ def api_close_day(db: DBSession, user: CurrentUser):
     }
 
 
-@router.post('/start_week', response_model=SessionOut)
-def api_start_week(db: DBSession, user: CurrentUser):
-    previous_week = get_open_week(db, user.id)
-    week = start_week(db, user)
-    if previous_week:
-        summary, currency = build_week_close_result(db, user, previous_week)
-        notify_week_closed(user.telegram_user_id, previous_week.id, summary, currency, auto=True)
+async def _start_week(db: DBSession, user: CurrentUser):
+    week = await db.run_sync(start_week, user)
+    notification_dispatcher.wake()
     return week
 
 
-@router.post('/close_week', response_model=CloseSessionOut)
-def api_close_week(db: DBSession, user: CurrentUser):
-    week = close_week(db, user)
-    summary, currency = build_week_close_result(db, user, week)
-    notify_week_closed(user.telegram_user_id, week.id, summary, currency)
+async def _close_week(db: DBSession, user: CurrentUser) -> dict:
+    week = await db.run_sync(close_week, user)
+    notification_dispatcher.wake()
+    summary, currency = await db.run_sync(build_week_close_result, user, week)
     return {
         'id': week.id,
         'started_at': week.started_at,
@@ -59,3 +52,23 @@ def api_close_week(db: DBSession, user: CurrentUser):
         'currency': currency,
         'amount_to_transfer': summary['total_penalty'],
     }
+
+
+@router.post('/start_day', response_model=SessionOut)
+async def api_start_day(db: DBSession, user: CurrentUser, idempotency: Idempotent):
+    return await idempotency.run(SessionOut, lambda: _start_day(db, user))
+
+
+@router.post('/close_day', response_model=CloseSessionOut)
+async def api_close_day(db: DBSession, user: CurrentUser, idempotency: Idempotent):
+    return await idempotency.run(CloseSessionOut, lambda: _close_day(db, user))
+
+
+@router.post('/start_week', response_model=SessionOut)
+async def api_start_week(db: DBSession, user: CurrentUser, idempotency: Idempotent):
+    return await idempotency.run(SessionOut, lambda: _start_week(db, user))
+
+
+@router.post('/close_week', response_model=CloseSessionOut)
+async def api_close_week(db: DBSession, user: CurrentUser, idempotency: Idempotent):
+    return await idempotency.run(CloseSessionOut, lambda: _close_week(db, user))
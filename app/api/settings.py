@@ -1,24 +1,40 @@
-from fastapi import APIRouter
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 
-from app.api.deps import CurrentUser, DBSession
+from app.api.deps import CurrentUser, DBSession, ReadDBSession, conditional_get
 from app.models.models import UserSettings
 from app.schemas.common import SettingsOut, SettingsUpdate
+from app.services.settings_cache import bump_settings_version, user_settings_cache
 
 router = APIRouter(prefix='/settings', tags=['settings'])
 
 
-@router.get('', response_model=SettingsOut)
-def get_settings(db: DBSession, user: CurrentUser):
-    return db.scalar(select(UserSettings).where(UserSettings.user_id == user.id))
+def _validate_schedule(payload: SettingsUpdate) -> None:
+    if payload.timezone is not None:
+        try:
+            ZoneInfo(payload.timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise HTTPException(status_code=400, detail='Unknown timezone')
+    if payload.day_start_hour is not None and not 0 <= payload.day_start_hour <= 23:
+        raise HTTPException(status_code=400, detail='day_start_hour must be between 0 and 23')
+    if payload.week_start_day is not None and not 0 <= payload.week_start_day <= 6:
+        raise HTTPException(status_code=400, detail='week_start_day must be between 0 (Monday) and 6 (Sunday)')
+
+
+@router.get('', response_model=SettingsOut, dependencies=[Depends(conditional_get)])
+async def get_settings(db: ReadDBSession, user: CurrentUser):
+    return await db.run_sync(user_settings_cache.get, user)
 
 
 @router.put('', response_model=SettingsOut)
-def update_settings(payload: SettingsUpdate, db: DBSession, user: CurrentUser):
-    settings = db.scalar(select(UserSettings).where(UserSettings.user_id == user.id))
-    settings.currency = payload.currency
-    settings.penalty_daily_default = payload.penalty_daily_default
-    settings.penalty_weekly_default = payload.penalty_weekly_default
-    db.commit()
-    db.refresh(settings)
+async def update_settings(payload: SettingsUpdate, db: DBSession, user: CurrentUser):
+    _validate_schedule(payload)
+    settings = await db.scalar(select(UserSettings).where(UserSettings.user_id == user.id))
+    for key, value in payload.model_dump(exclude_none=True).items():
+        setattr(settings, key, value)
+    await db.run_sync(bump_settings_version, user.id)
+    await db.commit()
+    await db.refresh(settings)
     return settings
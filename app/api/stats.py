@@ -1,29 +1,36 @@
-from fastapi import APIRouter
-from sqlalchemy import delete
+from fastapi import APIRouter, Depends, Query, Response
 
-from app.api.deps import CurrentUser, DBSession
-from app.models.models import DaySession, Instance, WeekSession
-from app.schemas.common import MessageOut, StatsDetailsOut, StatsOut
+from app.api.deps import CurrentUser, DBSession, ReadDBSession, conditional_get
+from app.api.responses import json_response
+from app.core.config import settings
+from app.schemas.common import PurgeOut, StatsDetailsOut, StatsOut
 from app.services.domain import stats_details, stats_penalty
+from app.services.purge import purge_worker, start_purge
 
 router = APIRouter(prefix='/stats', tags=['stats'])
 
 
-@router.get('', response_model=StatsOut)
-def get_stats(period: str, db: DBSession, user: CurrentUser):
-    failed_count, total_penalty = stats_penalty(db, user.id, period)
+@router.get('', response_model=StatsOut, dependencies=[Depends(conditional_get)])
+async def get_stats(period: str, db: ReadDBSession, user: CurrentUser):
+    failed_count, total_penalty = await db.run_sync(stats_penalty, user.id, period)
     return StatsOut(period=period, failed_count=failed_count, total_penalty=total_penalty)
 
 
-@router.get('/details', response_model=StatsDetailsOut)
-def get_stats_details(period: str, db: DBSession, user: CurrentUser):
-    return stats_details(db, user.id, period)
-
-
-@router.delete('', response_model=MessageOut)
-def clear_stats(db: DBSession, user: CurrentUser):
-    db.execute(delete(Instance).where(Instance.user_id == user.id))
-    db.execute(delete(DaySession).where(DaySession.user_id == user.id))
-    db.execute(delete(WeekSession).where(WeekSession.user_id == user.id))
-    db.commit()
-    return {'message': 'Statistics cleared'}
+@router.get('/details', response_model=StatsDetailsOut, dependencies=[Depends(conditional_get)])
+async def get_stats_details(
+    period: str,
+    response: Response,
+    db: ReadDBSession,
+    user: CurrentUser,
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=settings.history_page_size_max),
+):
+    return json_response(response, StatsDetailsOut, await db.run_sync(stats_details, user, period, cursor, limit))
+
+
+@router.delete('', response_model=PurgeOut, status_code=202)
+async def clear_stats(db: DBSession, user: CurrentUser):
+    job = await db.run_sync(start_purge, user.id, 'stats')
+    await db.commit()
+    purge_worker.wake()
+    return job
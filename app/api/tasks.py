@@ -1,31 +1,37 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy import func, select
 
-from app.api.deps import CurrentUser, DBSession
+from app.api.deps import CurrentUser, DBSession, ReadDBSession, conditional_get
+from app.api.responses import as_dict, json_response
 from app.models.models import Task
-from app.schemas.common import MessageOut, TaskCreate, TaskOut, TaskUpdate, TasksReorderIn
+from app.schemas.common import MessageOut, PurgeOut, TaskCreate, TaskOut, TaskUpdate, TasksReorderIn
+from app.services.domain import bump_data_version
+from app.services.purge import purge_worker, start_purge
+from app.services.settings_cache import bump_settings_version
 
 router = APIRouter(prefix='/tasks', tags=['tasks'])
 
 
-@router.get('', response_model=list[TaskOut])
-def list_tasks(db: DBSession, user: CurrentUser):
-    return db.scalars(select(Task).where(Task.user_id == user.id).order_by(Task.order_index.asc(), Task.created_at.asc())).all()
+@router.get('', response_model=list[TaskOut], dependencies=[Depends(conditional_get)])
+async def list_tasks(response: Response, db: ReadDBSession, user: CurrentUser):
+    tasks = (await db.scalars(select(Task).where(Task.user_id == user.id).order_by(Task.order_index.asc(), Task.created_at.asc()))).all()
+    return json_response(response, list[TaskOut], [as_dict(task, TaskOut) for task in tasks])
 
 
 @router.post('', response_model=TaskOut)
-def create_task(payload: TaskCreate, db: DBSession, user: CurrentUser):
-    max_order = db.scalar(select(func.coalesce(func.max(Task.order_index), -1)).where(Task.user_id == user.id))
+async def create_task(payload: TaskCreate, db: DBSession, user: CurrentUser):
+    max_order = await db.scalar(select(func.coalesce(func.max(Task.order_index), -1)).where(Task.user_id == user.id))
     task = Task(user_id=user.id, order_index=int(max_order) + 1, **payload.model_dump())
     db.add(task)
-    db.commit()
-    db.refresh(task)
+    await db.run_sync(bump_settings_version, user.id)
+    await db.commit()
+    await db.refresh(task)
     return task
 
 
 @router.post('/reorder', response_model=MessageOut)
-def reorder_tasks(payload: TasksReorderIn, db: DBSession, user: CurrentUser):
-    tasks = db.scalars(select(Task).where(Task.user_id == user.id)).all()
+async def reorder_tasks(payload: TasksReorderIn, db: DBSession, user: CurrentUser):
+    tasks = (await db.scalars(select(Task).where(Task.user_id == user.id))).all()
     by_id = {task.id: task for task in tasks}
     ordered_ids = payload.ordered_ids
 
@@ -35,27 +41,33 @@ def reorder_tasks(payload: TasksReorderIn, db: DBSession, user: CurrentUser):
     for idx, task_id in enumerate(ordered_ids):
         by_id[task_id].order_index = idx
 
-    db.commit()
+    await db.run_sync(bump_data_version, user.id)
+    await db.commit()
     return {'message': 'Tasks reordered'}
 
 
 @router.put('/{task_id}', response_model=TaskOut)
-def update_task(task_id: int, payload: TaskUpdate, db: DBSession, user: CurrentUser):
-    task = db.scalar(select(Task).where(Task.id == task_id, Task.user_id == user.id))
+async def update_task(task_id: int, payload: TaskUpdate, db: DBSession, user: CurrentUser):
+    task = await db.scalar(select(Task).where(Task.id == task_id, Task.user_id == user.id))
     if not task:
         raise HTTPException(status_code=404, detail='Task not found')
     for key, value in payload.model_dump().items():
         setattr(task, key, value)
-    db.commit()
-    db.refresh(task)
+    await db.run_sync(bump_settings_version, user.id)
+    await db.commit()
+    await db.refresh(task)
     return task
 
 
-@router.delete('/{task_id}')
-def delete_task(task_id: int, db: DBSession, user: CurrentUser):
-    task = db.scalar(select(Task).where(Task.id == task_id, Task.user_id == user.id))
+@router.delete('/{task_id}', response_model=PurgeOut, status_code=202)
+async def delete_task(task_id: int, db: DBSession, user: CurrentUser):
+    task = await db.scalar(select(Task).where(Task.id == task_id, Task.user_id == user.id))
     if not task:
         raise HTTPException(status_code=404, detail='Task not found')
-    db.delete(task)
-    db.commit()
-    return {'message': 'Task deleted'}
+    # No new instances while the purge removes the existing ones; the task row goes last.
+    task.is_active = False
+    job = await db.run_sync(start_purge, user.id, 'task', task.id)
+    await db.run_sync(bump_settings_version, user.id)
+    await db.commit()
+    purge_worker.wake()
+    return job
@@ -1,20 +1,66 @@
 import hashlib
 import hmac
 import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Annotated
 from urllib.parse import parse_qsl
 
-from fastapi import Depends, Header, HTTPException, Query
+from fastapi import Header, HTTPException, Query
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.db.session import get_db
+from app.db.session import AsyncReadSessionLocal, AsyncSessionLocal
 from app.models.models import TelegramUser, UserSettings
 
 
-def _build_data_check_string(init_data: str) -> tuple[str, str]:
-    pairs = dict(parse_qsl(init_data, strict_parsing=True))
+class _VerifiedInitDataCache:
+    """Bounded LRU of already verified initData strings -> (user id, expiry timestamp)."""
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._items: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, init_data: str) -> int | None:
+        with self._lock:
+            item = self._items.get(init_data)
+            if item is None:
+                return None
+            user_id, expires_at = item
+            if expires_at <= time.time():
+                del self._items[init_data]
+                return None
+            self._items.move_to_end(init_data)
+            return user_id
+
+    def put(self, init_data: str, user_id: int, expires_at: float) -> None:
+        if self._max_size <= 0:
+            return
+        with self._lock:
+            self._items[init_data] = (user_id, expires_at)
+            self._items.move_to_end(init_data)
+            while len(self._items) > self._max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+_verified_init_data = _VerifiedInitDataCache(settings.auth_cache_size)
+
+
+@lru_cache(maxsize=1)
+def _secret_key(bot_token: str) -> bytes:
+    return hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+
+
+def _build_data_check_string(pairs: dict[str, str]) -> tuple[str, str]:
+    pairs = dict(pairs)
     received_hash = pairs.pop('hash', None)
     if not received_hash:
         raise HTTPException(status_code=401, detail='Missing initData hash')
@@ -22,20 +68,39 @@ def _build_data_check_string(init_data: str) -> tuple[str, str]:
     return data_check_string, received_hash
 
 
-def validate_telegram_init_data(init_data: str) -> dict:
-    data_check_string, received_hash = _build_data_check_string(init_data)
+def _expires_at(pairs: dict[str, str]) -> float:
+    if settings.init_data_max_age_seconds <= 0:
+        return float('inf')
+    try:
+        auth_date = int(pairs['auth_date'])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=401, detail='Missing initData auth_date')
+    expires_at = float(auth_date + settings.init_data_max_age_seconds)
+    if expires_at <= time.time():
+        raise HTTPException(status_code=401, detail='Telegram initData expired')
+    return expires_at
 
-    secret_key = hmac.new(b'WebAppData', settings.bot_token.encode(), hashlib.sha256).digest()
-    calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+
+def _verify_init_data(init_data: str) -> tuple[dict, float]:
+    pairs = dict(parse_qsl(init_data, strict_parsing=True))
+    data_check_string, received_hash = _build_data_check_string(pairs)
+
+    calculated_hash = hmac.new(_secret_key(settings.bot_token), data_check_string.encode(), hashlib.sha256).hexdigest()
 
     if not hmac.compare_digest(calculated_hash, received_hash):
         raise HTTPException(status_code=401, detail='Invalid Telegram initData signature')
 
-    pairs = dict(parse_qsl(init_data, strict_parsing=True))
+    expires_at = _expires_at(pairs)
+
     if 'user' not in pairs:
         raise HTTPException(status_code=401, detail='Missing user payload')
 
     user_payload = json.loads(pairs['user'])
+    return user_payload, expires_at
+
+
+def validate_telegram_init_data(init_data: str) -> dict:
+    user_payload, _ = _verify_init_data(init_data)
     return user_payload
 
 
@@ -56,11 +121,17 @@ def _get_or_create_user(db: Session, user_payload: dict) -> TelegramUser:
         db.refresh(user)
         return user
 
-    user.username = user_payload.get('username')
-    user.first_name = user_payload.get('first_name')
-    user.last_name = user_payload.get('last_name')
-    db.commit()
-    db.refresh(user)
+    profile = {
+        'username': user_payload.get('username'),
+        'first_name': user_payload.get('first_name'),
+        'last_name': user_payload.get('last_name'),
+    }
+    if any(getattr(user, key) != value for key, value in profile.items()):
+        for key, value in profile.items():
+            setattr(user, key, value)
+        user.data_version = TelegramUser.data_version + 1
+        db.commit()
+        db.refresh(user)
     return user
 
 
@@ -77,13 +148,37 @@ def _get_or_create_fake_user(db: Session, fake_user_id: int) -> TelegramUser:
     return user
 
 
-def get_current_user(
-    db: Annotated[Session, Depends(get_db)],
+async def _get_user_by_init_data(init_data: str) -> TelegramUser:
+    cached_user_id = _verified_init_data.get(init_data)
+    if cached_user_id is not None:
+        async with AsyncReadSessionLocal() as db:
+            user = await db.get(TelegramUser, cached_user_id)
+        if user:
+            return user
+
+    user_payload, expires_at = _verify_init_data(init_data)
+    async with AsyncSessionLocal() as db:
+        user = await db.run_sync(_get_or_create_user, user_payload)
+    _verified_init_data.put(init_data, user.id, expires_at)
+    return user
+
+
+async def _get_fake_user(fake_user_id: int) -> TelegramUser:
+    async with AsyncReadSessionLocal() as db:
+        user = await db.scalar(select(TelegramUser).where(TelegramUser.telegram_user_id == fake_user_id))
+    if user:
+        return user
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(_get_or_create_fake_user, fake_user_id)
+
+
+async def get_current_user(
     x_telegram_init_data: Annotated[str | None, Header()] = None,
     authorization: Annotated[str | None, Header()] = None,
     init_data_query: Annotated[str | None, Query(alias='initData')] = None,
     x_telegram_user_id: Annotated[int | None, Header()] = None,
 ) -> TelegramUser:
+    """Resolve the caller on the read pool; the writer is only touched to create or update a profile."""
     init_data = x_telegram_init_data
     if not init_data and authorization and authorization.lower().startswith('tma '):
         init_data = authorization[4:].strip()
@@ -91,10 +186,9 @@ def get_current_user(
         init_data = init_data_query
 
     if init_data:
-        user_payload = validate_telegram_init_data(init_data)
-        return _get_or_create_user(db, user_payload)
+        return await _get_user_by_init_data(init_data)
 
     if settings.debug_allow_fake_auth and x_telegram_user_id:
-        return _get_or_create_fake_user(db, x_telegram_user_id)
+        return await _get_fake_user(x_telegram_user_id)
 
     raise HTTPException(status_code=401, detail='Missing authentication headers')
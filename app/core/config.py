@@ -7,9 +7,57 @@ class Settings(BaseSettings):
     bot_token: str
     mini_app_url: str = 'http://localhost:8000'
     database_url: str = 'sqlite:///./routine.db'
+    sqlite_profile: str = 'production'  # production | default
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 268435456
+    sqlite_cache_size_kib: int = 65536
+    db_read_pool_size: int = 8
+    # Server databases (PostgreSQL): per process, for the sync and the async engine each.
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_pre_ping: bool = True
     app_host: str = '0.0.0.0'
     app_port: int = 8000
+    app_reload: bool = False  # development: one process restarted on code changes
+    app_workers: int = 0  # 0: one per available CPU
+    app_preload: bool = True
+    app_loop: str = 'auto'  # auto | uvloop | asyncio
+    app_http: str = 'auto'  # auto | httptools | h11
+    app_keepalive_seconds: int = 65
+    app_backlog: int = 2048
+    app_graceful_shutdown_seconds: float = 30.0
     debug_allow_fake_auth: bool = True
+    scheduler_interval_seconds: int = 60
+    scheduler_batch_size: int = 500
+    scheduler_concurrency: int = 4
+    history_page_size: int = 200
+    history_page_size_max: int = 500
+    instance_batch_max: int = 500
+    telegram_api_url: str = 'https://api.telegram.org'
+    notify_concurrency: int = 8
+    notify_global_rate: float = 25.0
+    notify_per_chat_interval: float = 1.0
+    notify_max_attempts: int = 6
+    notify_poll_interval: float = 1.0
+    init_data_max_age_seconds: int = 86400
+    auth_cache_size: int = 4096
+    settings_cache_size: int = 10000
+    metrics_enabled: bool = True
+    metrics_flush_seconds: float = 1.0
+    gzip_minimum_size: int = 1024
+    gzip_compresslevel: int = 6
+    events_queue_size: int = 64
+    events_heartbeat_seconds: float = 15.0
+    events_max_age_seconds: float = 600.0
+    events_retry_ms: int = 3000
+    events_poll_seconds: float = 1.0
+    archive_after_days: int = 90
+    archive_batch_size: int = 200
+    idempotency_ttl_hours: int = 24
+    purge_batch_size: int = 1000
+    purge_pause_seconds: float = 0.05
+    purge_poll_interval: float = 5.0
+    purge_job_ttl_hours: int = 24
 
 
 settings = Settings()
@@ -0,0 +1,281 @@
+"""In-process metrics rendered in the Prometheus text format.
+
+Every series is a plain counter or a fixed-bucket histogram stored in a
+dict keyed by its label values. Observing is a bisect and a few integer
+increments, and no locks are taken. Updates from worker threads may
+rarely lose an increment, which is acceptable for monitoring.
+
+Under the supervisor the workers publish their series to a shared
+directory and a scrape of any worker returns the sum over all of them.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+LOCK_ERROR_MARKERS = ('database is locked', 'database table is locked', 'lock timeout', 'deadlock detected')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def state(self) -> list:
+        return [[list(labels), value] for labels, value in list(self._values.items())]
+
+    def render(self, states: list[list]) -> list[str]:
+        """Render the sum of ``states``, one per process."""
+        values: dict[tuple, float] = {}
+        for state in states:
+            for labels, value in state:
+                key = tuple(labels)
+                values[key] = values.get(key, 0) + value
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        if not self.labelnames and not values:
+            lines.append(f'{self.name} 0')
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class _HistogramSeries:
+    __slots__ = ('counts', 'total')
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.total = 0.0
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: dict[tuple, _HistogramSeries] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _HistogramSeries(len(self.buckets) + 1)
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.total += value
+
+    def state(self) -> list:
+        return [[list(labels), list(series.counts), series.total] for labels, series in list(self._series.items())]
+
+    def render(self, states: list[list]) -> list[str]:
+        """Render the sum of ``states``, one per process."""
+        merged: dict[tuple, _HistogramSeries] = {}
+        for state in states:
+            for labels, counts, total in state:
+                series = merged.get(tuple(labels))
+                if series is None:
+                    series = merged[tuple(labels)] = _HistogramSeries(len(self.buckets) + 1)
+                series.counts = [a + b for a, b in zip(series.counts, counts)]
+                series.total += total
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series.counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {series.total}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+http_requests = Counter('http_requests_total', 'HTTP requests by route and status.', ('method', 'route', 'status'))
+http_latency = Histogram('http_request_duration_seconds', 'HTTP request latency.', ('method', 'route'))
+db_statements = Counter('db_statements_total', 'SQL statements executed.')
+db_time = Counter('db_statement_seconds_total', 'Time spent executing SQL statements.')
+db_lock_errors = Counter('db_lock_errors_total', 'Statements that failed waiting for a database lock.')
+request_statements = Histogram(
+    'http_request_db_statements', 'SQL statements per HTTP request.', ('method', 'route'), buckets=STATEMENT_BUCKETS
+)
+request_db_time = Histogram('http_request_db_seconds', 'Total SQL time per HTTP request.', ('method', 'route'))
+telegram_latency = Histogram('telegram_request_duration_seconds', 'Outbound Bot API call latency.', ('method', 'result'))
+settings_cache_lookups = Counter('user_settings_cache_total', 'User settings cache lookups (hit, miss) and evictions.', ('result',))
+
+REGISTRY = (
+    http_requests,
+    http_latency,
+    request_statements,
+    request_db_time,
+    db_statements,
+    db_time,
+    db_lock_errors,
+    telegram_latency,
+    settings_cache_lookups,
+)
+
+# [statements, seconds] for the HTTP request being served, if any.
+_request_db: ContextVar[list | None] = ContextVar('request_db', default=None)
+
+
+def process_state() -> dict[str, list]:
+    return {metric.name: metric.state() for metric in REGISTRY}
+
+
+class SharedMetrics:
+    """Series of all the workers of one supervisor, summed through files in a directory they share.
+
+    Each worker rewrites ``<pid>.json`` every METRICS_FLUSH_SECONDS and on shutdown, and the worker
+    serving a scrape writes its own first. Files of workers that died stay, so totals never go back.
+    """
+
+    def __init__(self) -> None:
+        self.directory: str | None = None
+        self._task: asyncio.Task | None = None
+
+    def enable(self, directory: str) -> None:
+        """Called by the supervisor before it forks the workers."""
+        self.directory = directory
+
+    def start(self) -> None:
+        if self.directory is None or self._task:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.write()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.metrics_flush_seconds)
+            try:
+                self.write()
+            except OSError:
+                logger.exception('Writing shared metrics failed')
+
+    def write(self) -> None:
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as file:
+            json.dump(process_state(), file)
+        # Readers see the previous file or the new one, never a partial write.
+        os.replace(path + '.tmp', path)
+
+    def read(self) -> list[dict[str, list]]:
+        states = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                with open(os.path.join(self.directory, name)) as file:
+                    states.append(json.load(file))
+        return states
+
+
+shared_metrics = SharedMetrics()
+
+
+def render() -> str:
+    if shared_metrics.directory is None:
+        states = [process_state()]
+    else:
+        shared_metrics.write()
+        states = shared_metrics.read()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render([state.get(metric.name, []) for state in states]))
+    return '\n'.join(lines) + '\n'
+
+
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info['metrics_started_at'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - conn.info.pop('metrics_started_at', time.perf_counter())
+        db_statements.inc()
+        db_time.inc(amount=elapsed)
+        current = _request_db.get()
+        if current is not None:
+            current[0] += 1
+            current[1] += elapsed
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(context) -> None:
+        message = str(context.original_exception).lower()
+        if any(marker in message for marker in LOCK_ERROR_MARKERS):
+            db_lock_errors.inc()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: labels requests by route template, so path ids do not explode cardinality."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message) -> None:
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        db = [0, 0.0]
+        token = _request_db.set(db)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db.reset(token)
+            route = scope.get('route')
+            if route is not None:
+                path = route.path
+            elif scope.get('endpoint') is not None:
+                # Mounted apps only leave their mount point behind.
+                path = scope.get('root_path') or 'mounted'
+            else:
+                path = 'unmatched'
+            method = scope['method']
+            http_requests.inc(method, path, status[0])
+            http_latency.observe(elapsed, method, path)
+            request_statements.observe(db[0], method, path)
+            request_db_time.observe(db[1], method, path)
@@ -0,0 +1,167 @@
+"""Production launcher for the API (run_api.py).
+
+The supervisor migrates the database once, binds the listening socket,
+optionally imports the app (APP_PRELOAD, so workers share its pages
+copy-on-write) and forks APP_WORKERS uvicorn workers that accept on the
+shared socket. SIGTERM or SIGINT is passed on to every worker as SIGTERM.
+A worker then stops accepting, ends its /api/events streams, waits up to
+APP_GRACEFUL_SHUTDOWN_SECONDS for in-flight requests and runs the
+shutdown hooks, which finish the notification and purge work in
+progress. A worker that dies is replaced. Workers share their metrics
+through a temporary directory, so /metrics of any of them covers all.
+With APP_RELOAD it is one uvicorn process restarted on code changes
+instead.
+"""
+
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
+import uvicorn
+
+from app.core import metrics
+from app.core.config import settings
+from app.db.init_db import init_db
+from app.db.session import engine
+from app.services.events import event_broker
+
+# The logger uvicorn configures; its own supervisors log through it too.
+logger = logging.getLogger('uvicorn.error')
+
+# Position of this process among the workers, kept by a replacement; 0 outside the supervisor.
+worker_index = 0
+
+RESPAWN_DELAY_SECONDS = 1.0
+
+
+def worker_count() -> int:
+    if settings.app_workers > 0:
+        return settings.app_workers
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def uvicorn_config() -> uvicorn.Config:
+    return uvicorn.Config(
+        'app.main:app',
+        host=settings.app_host,
+        port=settings.app_port,
+        loop=settings.app_loop,
+        http=settings.app_http,
+        backlog=settings.app_backlog,
+        timeout_keep_alive=settings.app_keepalive_seconds,
+        timeout_graceful_shutdown=settings.app_graceful_shutdown_seconds,
+    )
+
+
+class Server(uvicorn.Server):
+    def handle_exit(self, sig: int, frame) -> None:
+        super().handle_exit(sig, frame)
+        # Open streams would otherwise hold the drain until the graceful timeout.
+        event_broker.close()
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int) -> None:
+        self.config = config
+        self.workers = workers
+        self._sock: socket.socket | None = None
+        self._children: dict[int, tuple[int, float]] = {}  # pid -> (worker index, started)
+        self._stopping = False
+
+    def run(self) -> None:
+        self._sock = self.config.bind_socket()
+        metrics_dir = tempfile.mkdtemp(prefix='routine-metrics-') if settings.metrics_enabled else None
+        if metrics_dir:
+            metrics.shared_metrics.enable(metrics_dir)
+        signal.signal(signal.SIGTERM, self._handle_exit)
+        signal.signal(signal.SIGINT, self._handle_exit)
+        signal.signal(signal.SIGALRM, self._handle_timeout)
+        logger.info('Started supervisor [%s] with %s workers', os.getpid(), self.workers)
+        for index in range(self.workers):
+            self._spawn(index)
+        while self._children:
+            pid, status = os.wait()
+            index, started = self._children.pop(pid, (None, 0.0))
+            if index is None or self._stopping:
+                continue
+            logger.error('Worker [%s] exited with code %s, replacing it', pid, os.waitstatus_to_exitcode(status))
+            # A worker that cannot even start would otherwise be forked in a tight loop.
+            time.sleep(max(0.0, started + RESPAWN_DELAY_SECONDS - time.monotonic()))
+            if not self._stopping:
+                self._spawn(index)
+        self._sock.close()
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+        logger.info('Stopped supervisor [%s]', os.getpid())
+
+    def _spawn(self, index: int) -> None:
+        pid = os.fork()
+        if pid:
+            self._children[pid] = (index, time.monotonic())
+            return
+        code = 0
+        try:
+            self._serve(index)
+        except BaseException:
+            logger.exception('Worker %s failed', index)
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _serve(self, index: int) -> None:
+        global worker_index
+        worker_index = index
+        # Own process group: a terminal's Ctrl+C reaches only the supervisor, which sends one SIGTERM.
+        os.setpgid(0, 0)
+        # uvicorn re-raises the signal it stopped on once it is done; the worker then exits normally.
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        Server(self.config).run(sockets=[self._sock])
+
+    def _signal_children(self, sig: int) -> None:
+        for pid in self._children:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def _handle_exit(self, sig: int, frame) -> None:
+        if self._stopping:
+            return
+        self._stopping = True
+        logger.info('Shutting down %s workers', len(self._children))
+        self._signal_children(signal.SIGTERM)
+        # Shutdown hooks run after the drain; kill whatever is still around well after both.
+        signal.alarm(int(settings.app_graceful_shutdown_seconds) + 30)
+
+    def _handle_timeout(self, sig: int, frame) -> None:
+        logger.error('Killing %s workers that did not stop in time', len(self._children))
+        self._signal_children(signal.SIGKILL)
+
+
+def serve() -> None:
+    if settings.app_reload:
+        # /api/events streams stay open until their max age; do not let them hold up a reload.
+        uvicorn.run('app.main:app', host=settings.app_host, port=settings.app_port, reload=True, timeout_graceful_shutdown=5)
+        return
+
+    # Migrate once, before any worker starts; their own init_db() then finds the head revision.
+    init_db()
+    # Forked workers must not share the supervisor's SQLite connection.
+    engine.dispose()
+
+    config = uvicorn_config()
+    workers = worker_count()
+    if workers == 1:
+        Server(config).run()
+        return
+    if settings.app_preload:
+        config.load()
+    Supervisor(config, workers).run()
@@ -0,0 +1,107 @@
+"""Mini App assets served from memory: content-hashed, gzip-precompressed, index.html rewritten.
+
+``load()`` runs once at startup. Every file under the static directory is
+kept both as is and gzipped, and is reachable under its own name
+(revalidated on each use) and under ``name.<hash>.ext``, which never changes
+and is cached for a year. index.html is rewritten to point at the hashed
+names, so a deploy is picked up on the next open while unchanged assets
+never leave the phone's cache.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import HTTPException, Request, Response
+
+INDEX = 'index.html'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+_STATIC_REF = re.compile(r'(["\'])/static/([^"\'?#]+)\1')
+
+
+@dataclass(frozen=True)
+class Asset:
+    body: bytes
+    gzipped: bytes | None
+    media_type: str
+    etag: str
+    cache_control: str
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    weights = {}
+    for part in accept_encoding.lower().split(','):
+        coding, *params = part.split(';')
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip()] = weight
+    return weights.get('gzip', weights.get('*', 0.0)) > 0
+
+
+def _build(body: bytes, media_type: str, digest: str, cache_control: str) -> Asset:
+    compressed = gzip.compress(body, compresslevel=9, mtime=0)
+    return Asset(
+        body=body,
+        # Not worth a Content-Encoding round for already compressed or tiny files.
+        gzipped=compressed if len(compressed) < len(body) * 0.9 else None,
+        media_type=media_type,
+        etag=f'"{digest}"',
+        cache_control=cache_control,
+    )
+
+
+def _hashed_name(name: str, digest: str) -> str:
+    stem, dot, suffix = name.rpartition('.')
+    return f'{stem}.{digest}.{suffix}' if dot else f'{name}.{digest}'
+
+
+class StaticAssets:
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self._assets: dict[str, Asset] = {}
+        self.index: Asset | None = None
+
+    def load(self) -> None:
+        assets: dict[str, Asset] = {}
+        hashed: dict[str, str] = {}
+        for path in sorted(self.directory.rglob('*')):
+            name = path.relative_to(self.directory).as_posix()
+            if not path.is_file() or name == INDEX:
+                continue
+            body = path.read_bytes()
+            digest = hashlib.sha256(body).hexdigest()[:12]
+            media_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            hashed[name] = _hashed_name(name, digest)
+            assets[name] = _build(body, media_type, digest, REVALIDATE)
+            assets[hashed[name]] = _build(body, media_type, digest, IMMUTABLE)
+
+        html = (self.directory / INDEX).read_text(encoding='utf-8')
+        html = _STATIC_REF.sub(lambda m: f'{m[1]}/static/{hashed.get(m[2], m[2])}{m[1]}', html)
+        body = html.encode()
+        self.index = _build(body, 'text/html; charset=utf-8', hashlib.sha256(body).hexdigest()[:12], REVALIDATE)
+        self._assets = assets
+
+    def response(self, request: Request, name: str) -> Response:
+        asset = self.index if name == INDEX else self._assets.get(name)
+        if asset is None:
+            raise HTTPException(status_code=404, detail='Not Found')
+
+        headers = {'ETag': asset.etag, 'Cache-Control': asset.cache_control, 'Vary': 'Accept-Encoding'}
+        if asset.etag in request.headers.get('if-none-match', ''):
+            return Response(status_code=304, headers=headers)
+        if asset.gzipped is not None and _accepts_gzip(request.headers.get('accept-encoding', '')):
+            return Response(asset.gzipped, media_type=asset.media_type, headers={**headers, 'Content-Encoding': 'gzip'})
+        return Response(asset.body, media_type=asset.media_type, headers=headers)
+
+
+static_assets = StaticAssets('app/static')
@@ -1,18 +1,106 @@
-from sqlalchemy import text
+"""Bring the database schema to the newest Alembic revision (migrations/).
+
+Every process calls ``init_db`` at startup. On an up-to-date database that
+is a single query comparing alembic_version with the head revision. Only
+otherwise does it take a lock shared by all processes (a file lock next to
+the SQLite database, an advisory lock on PostgreSQL), check again and
+upgrade, so workers starting together neither race on DDL nor wait for
+each other once the schema is current. Databases created by create_all
+before migrations existed are stamped with the revision they match first.
+"""
+
+import fcntl
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
 
-from app.db.base import Base
 from app.db.session import engine
-import app.models.models  # noqa: F401
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / 'alembic.ini'
+# Any constant shared by the processes of this app; pg_advisory_lock takes a bigint.
+MIGRATION_LOCK_KEY = 0x726F7574696E65
+
+
+@lru_cache(maxsize=1)
+def alembic_config() -> Config:
+    return Config(str(ALEMBIC_INI))
+
+
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def current_revision() -> str | None:
+    """The revision stored in the database; None before the first migration."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text('SELECT version_num FROM alembic_version')).scalar()
+    except DBAPIError:
+        return None
+
+
+@contextmanager
+def _migration_lock():
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+        return
+    database = engine.url.database
+    if not database or database == ':memory:':
+        yield
+        return
+    with open(f'{database}.migrate.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _legacy_revision(conn) -> str | None:
+    """The revision a database created by create_all (no alembic_version) matches, None for an empty one."""
+    inspector = inspect(conn)
+    if not inspector.has_table('tasks'):
+        return None
+    # init_db added tasks.order_index with ALTER TABLE; everything after it is 0003, which checks as it goes.
+    if 'order_index' in {column['name'] for column in inspector.get_columns('tasks')}:
+        return '0002'
+    return '0001'
+
+
+def upgrade_db() -> None:
+    config = alembic_config()
+    with engine.connect() as conn:
+        config.attributes['connection'] = conn
+        try:
+            if current_revision() is None:
+                legacy = _legacy_revision(conn)
+                if legacy is not None:
+                    command.stamp(config, legacy)
+                    conn.commit()
+            command.upgrade(config, 'head')
+            conn.commit()
+        finally:
+            del config.attributes['connection']
 
 
 def init_db() -> None:
-    Base.metadata.create_all(bind=engine)
-    with engine.begin() as conn:
-        task_columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info('tasks')").fetchall()]
-        if 'order_index' not in task_columns:
-            conn.execute(text('ALTER TABLE tasks ADD COLUMN order_index INTEGER DEFAULT 0'))
+    head = head_revision()
+    if current_revision() == head:
+        return
+    with _migration_lock():
+        # Another process may have migrated while this one waited for the lock.
+        if current_revision() != head:
+            upgrade_db()
 
 
 if __name__ == '__main__':
     init_db()
-    print('Database initialized')
+    print(f'Database at revision {current_revision()}')
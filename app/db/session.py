@@ -1,12 +1,103 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
-connect_args = {'check_same_thread': False} if settings.database_url.startswith('sqlite') else {}
-engine = create_engine(settings.database_url, connect_args=connect_args)
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def _async_database_url(database_url: str) -> str:
+    url = make_url(database_url)
+    async_driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if async_driver and url.drivername == url.get_backend_name():
+        return url.set(drivername=async_driver).render_as_string(hide_password=False)
+    return database_url
+
+
+def _sqlite_pragmas(read_only: bool = False) -> list[str]:
+    # SQLite ignores REFERENCES clauses, ON DELETE CASCADE included, unless enabled per connection.
+    pragmas = ['PRAGMA foreign_keys=ON']
+    if settings.sqlite_profile == 'production':
+        pragmas += [
+            'PRAGMA journal_mode=WAL',
+            'PRAGMA synchronous=NORMAL',
+            f'PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}',
+            f'PRAGMA mmap_size={int(settings.sqlite_mmap_size)}',
+            f'PRAGMA cache_size=-{int(settings.sqlite_cache_size_kib)}',
+        ]
+    elif settings.sqlite_profile != 'default':
+        raise ValueError(f'Unknown sqlite_profile: {settings.sqlite_profile}')
+    if read_only:
+        pragmas.append('PRAGMA query_only=ON')
+    return pragmas
+
+
+def _apply_sqlite_profile(engine: Engine, read_only: bool = False) -> None:
+    pragmas = _sqlite_pragmas(read_only)
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+        if read_only:
+            # The driver only opens transactions for writes; _on_begin opens them instead.
+            dbapi_connection.isolation_level = None
+
+    if read_only:
+
+        @event.listens_for(engine, 'begin')
+        def _on_begin(conn) -> None:
+            # Every query of a read session sees the same snapshot, e.g. /bootstrap's sessions and instances.
+            cursor = conn.connection.dbapi_connection.cursor()
+            cursor.execute('BEGIN')
+            cursor.close()
+
+
+is_sqlite = settings.database_url.startswith('sqlite')
+connect_args = {'check_same_thread': False} if is_sqlite else {}
+# SQLite pools are sized below for its single writer; pre-ping guards against server restarts and idle timeouts.
+pool_args = {} if is_sqlite else {
+    'pool_size': settings.db_pool_size,
+    'max_overflow': settings.db_max_overflow,
+    'pool_pre_ping': settings.db_pool_pre_ping,
+}
+
+engine = create_engine(settings.database_url, connect_args=connect_args, **pool_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if is_sqlite:
+    # SQLite allows a single writer at a time: funnel all writes through one
+    # connection and serve GET endpoints from a separate read-only pool, so
+    # reads keep flowing (WAL) while a rollover transaction is committing.
+    async_engine = create_async_engine(
+        _async_database_url(settings.database_url), connect_args=connect_args, pool_size=1, max_overflow=0
+    )
+    async_read_engine = create_async_engine(
+        _async_database_url(settings.database_url),
+        connect_args=connect_args,
+        pool_size=settings.db_read_pool_size,
+        max_overflow=0,
+    )
+    _apply_sqlite_profile(engine)
+    _apply_sqlite_profile(async_engine.sync_engine)
+    _apply_sqlite_profile(async_read_engine.sync_engine, read_only=True)
+    read_bind = async_read_engine
+else:
+    async_engine = create_async_engine(_async_database_url(settings.database_url), connect_args=connect_args, **pool_args)
+    async_read_engine = async_engine
+    # Read sessions never write; REPEATABLE READ gives all their queries one snapshot, as on SQLite.
+    read_bind = async_engine.execution_options(isolation_level='REPEATABLE READ')
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(read_bind, autoflush=False, expire_on_commit=False)
+
 
 def get_db():
     db = SessionLocal()
@@ -14,3 +105,19 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+async def dispose_engines() -> None:
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
@@ -1,16 +1,26 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.api.auth import router as auth_router
+from app.api.bootstrap import router as bootstrap_router
 from app.api.dashboard import router as dashboard_router
+from app.api.events import router as events_router
 from app.api.instances import router as instances_router
+from app.api.purges import router as purges_router
 from app.api.sessions import router as sessions_router
 from app.api.settings import router as settings_router
 from app.api.stats import router as stats_router
 from app.api.tasks import router as tasks_router
+from app.core import metrics, server
+from app.core.config import settings
+from app.core.static_assets import static_assets
 from app.db.init_db import init_db
+from app.db.session import async_engine, async_read_engine, dispose_engines, engine
+from app.services.events import event_broker
+from app.services.purge import purge_worker
+from app.services.telegram_notify import notification_dispatcher
 
 app = FastAPI(title='Routine Bot API', version='1.0.0')
 
@@ -20,7 +30,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=['*'],
     allow_headers=['*'],
+    expose_headers=['X-Next-Cursor'],
 )
+# Leaves text/event-stream and already encoded (precompressed static) responses alone.
+app.add_middleware(GZipMiddleware, minimum_size=settings.gzip_minimum_size, compresslevel=settings.gzip_compresslevel)
+
+if settings.metrics_enabled:
+    app.add_middleware(metrics.MetricsMiddleware)
+    for instrumented in {engine, async_engine.sync_engine, async_read_engine.sync_engine}:
+        metrics.instrument_engine(instrumented)
 
 app.include_router(auth_router, prefix='/api')
 app.include_router(tasks_router, prefix='/api')
@@ -28,16 +46,43 @@ app.include_router(settings_router, prefix='/api')
 app.include_router(sessions_router, prefix='/api')
 app.include_router(instances_router, prefix='/api')
 app.include_router(stats_router, prefix='/api')
+app.include_router(purges_router, prefix='/api')
 app.include_router(dashboard_router, prefix='/api')
-
-app.mount('/static', StaticFiles(directory='app/static'), name='static')
+app.include_router(bootstrap_router, prefix='/api')
+app.include_router(events_router, prefix='/api')
 
 
 @app.on_event('startup')
-def on_startup() -> None:
+async def on_startup() -> None:
     init_db()
+    static_assets.load()
+    # A dispatcher paces itself to the Bot API limits, so only the first worker sends; the rest wait for its poll.
+    if server.worker_index == 0:
+        notification_dispatcher.start()
+    purge_worker.start()
+    event_broker.start()
+    metrics.shared_metrics.start()
+
+
+@app.on_event('shutdown')
+async def on_shutdown() -> None:
+    await notification_dispatcher.stop()
+    await purge_worker.stop()
+    await event_broker.stop()
+    await dispose_engines()
+    await metrics.shared_metrics.stop()
+
+
+@app.get('/metrics', include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/static/{name:path}', include_in_schema=False)
+def static_file(name: str, request: Request):
+    return static_assets.response(request, name)
 
 
 @app.get('/')
-def webapp_index():
-    return FileResponse('app/static/index.html')
+def webapp_index(request: Request):
+    return static_assets.response(request, 'index.html')
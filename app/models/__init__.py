@@ -1,4 +1,4 @@
-from app.models.models import DaySession, Instance, Task, UserSettings, WeekSession, TelegramUser
+from app.models.models import ArchivedSession, DaySession, Instance, NotificationOutbox, PurgeJob, StatsRollup, Task, UserSettings, WeekSession, TelegramUser
 
 __all__ = [
     'TelegramUser',
@@ -7,4 +7,8 @@ __all__ = [
     'DaySession',
     'WeekSession',
     'Instance',
+    'StatsRollup',
+    'ArchivedSession',
+    'PurgeJob',
+    'NotificationOutbox',
 ]
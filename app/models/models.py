@@ -1,11 +1,35 @@
-from datetime import datetime
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
 from enum import Enum
+from typing import NamedTuple
 
-from sqlalchemy import Boolean, DateTime, Enum as SqlEnum, ForeignKey, Integer, Numeric, String, UniqueConstraint
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Date,
+    DateTime,
+    Enum as SqlEnum,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    Numeric,
+    String,
+    Text,
+    UniqueConstraint,
+    false,
+    text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
 
+# 64-bit on PostgreSQL. SQLite integers are 64-bit whatever the declared type, and only
+# INTEGER PRIMARY KEY is an alias for the rowid, so it keeps INTEGER there.
+BigInt = BigInteger().with_variant(Integer(), 'sqlite')
+
 
 class TaskKind(str, Enum):
     daily = 'daily'
@@ -20,37 +44,67 @@ class InstanceStatus(str, Enum):
     failed = 'failed'
 
 
+class PurgeStatus(str, Enum):
+    pending = 'pending'
+    running = 'running'
+    done = 'done'
+    failed = 'failed'
+
+
+class NotificationStatus(str, Enum):
+    pending = 'pending'
+    sent = 'sent'
+    failed = 'failed'
+
+
 class TelegramUser(Base):
     __tablename__ = 'telegram_users'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    telegram_user_id: Mapped[int] = mapped_column(Integer, unique=True, index=True)
+    telegram_user_id: Mapped[int] = mapped_column(BigInt, unique=True, index=True)
     username: Mapped[str | None] = mapped_column(String(64), nullable=True)
     first_name: Mapped[str | None] = mapped_column(String(128), nullable=True)
     last_name: Mapped[str | None] = mapped_column(String(128), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Bumped by every write to the user's data; GET endpoints derive their ETag from it.
+    data_version: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    # Bumped by settings and task writes; tags the cached copy in app.services.settings_cache.
+    settings_version: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    # created_at of the user's newest archived instance; history pages newer than it skip the archive.
+    archived_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
-    settings: Mapped['UserSettings'] = relationship(back_populates='user', uselist=False, cascade='all, delete-orphan')
-    tasks: Mapped[list['Task']] = relationship(back_populates='user', cascade='all, delete-orphan')
+    settings: Mapped['UserSettings'] = relationship(
+        back_populates='user', uselist=False, cascade='all, delete-orphan', passive_deletes=True
+    )
+    tasks: Mapped[list['Task']] = relationship(back_populates='user', cascade='all, delete-orphan', passive_deletes=True)
 
 
 class UserSettings(Base):
     __tablename__ = 'user_settings'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id'), unique=True, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id', ondelete='CASCADE'), unique=True, index=True)
     currency: Mapped[str] = mapped_column(String(8), default='EUR')
     penalty_daily_default: Mapped[float] = mapped_column(Numeric(10, 2), default=10)
     penalty_weekly_default: Mapped[float] = mapped_column(Numeric(10, 2), default=20)
+    timezone: Mapped[str] = mapped_column(String(64), default='UTC', server_default='UTC')
+    day_start_hour: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    week_start_day: Mapped[int] = mapped_column(Integer, default=0, server_default='0')  # 0 = Monday
+    # Opt-in: the Mini App does not send a timezone, so UTC boundaries would cut most users' days short.
+    auto_rollover: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
 
     user: Mapped['TelegramUser'] = relationship(back_populates='settings')
 
 
 class Task(Base):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        Index('ix_tasks_user_kind_active', 'user_id', 'kind', 'is_active'),
+        Index('ix_tasks_user_order', 'user_id', 'order_index', 'created_at'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id'), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id', ondelete='CASCADE'), index=True)
     title: Mapped[str] = mapped_column(String(255))
     kind: Mapped[TaskKind] = mapped_column(SqlEnum(TaskKind), index=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
@@ -60,24 +114,36 @@ class Task(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user: Mapped['TelegramUser'] = relationship(back_populates='tasks')
-    instances: Mapped[list['Instance']] = relationship(back_populates='task', cascade='all, delete-orphan')
+    # The database deletes a task's instances (ON DELETE CASCADE); the ORM never loads them for that.
+    instances: Mapped[list['Instance']] = relationship(back_populates='task', cascade='all, delete-orphan', passive_deletes=True)
 
 
 class WeekSession(Base):
     __tablename__ = 'week_sessions'
+    __table_args__ = (
+        # At most one open week per user, enforced by the database.
+        Index('uq_week_sessions_open', 'user_id', unique=True, sqlite_where=text('closed_at IS NULL'), postgresql_where=text('closed_at IS NULL')),
+        Index('ix_week_sessions_closed', 'closed_at'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id'), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id', ondelete='CASCADE'), index=True)
     started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     closed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
 
 class DaySession(Base):
     __tablename__ = 'day_sessions'
+    __table_args__ = (
+        Index('uq_day_sessions_open', 'user_id', unique=True, sqlite_where=text('closed_at IS NULL'), postgresql_where=text('closed_at IS NULL')),
+        Index('ix_day_sessions_closed', 'closed_at'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id'), index=True)
-    week_session_id: Mapped[int | None] = mapped_column(ForeignKey('week_sessions.id'), nullable=True, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id', ondelete='CASCADE'), index=True)
+    week_session_id: Mapped[int | None] = mapped_column(
+        ForeignKey('week_sessions.id', ondelete='SET NULL'), nullable=True, index=True
+    )
     started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     closed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
@@ -87,16 +153,166 @@ class Instance(Base):
     __table_args__ = (
         UniqueConstraint('task_id', 'day_session_id', name='uq_task_day_session'),
         UniqueConstraint('task_id', 'week_session_id', name='uq_task_week_session'),
+        Index('ix_instances_user_day_status', 'user_id', 'day_session_id', 'status'),
+        Index('ix_instances_user_week_status', 'user_id', 'week_session_id', 'status'),
+        Index('ix_instances_user_created', 'user_id', 'created_at', 'id'),
     )
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id'), index=True)
-    task_id: Mapped[int] = mapped_column(ForeignKey('tasks.id'), index=True)
-    status: Mapped[InstanceStatus] = mapped_column(SqlEnum(InstanceStatus), default=InstanceStatus.planned, index=True)
+    id: Mapped[int] = mapped_column(BigInt, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id', ondelete='CASCADE'))
+    task_id: Mapped[int] = mapped_column(ForeignKey('tasks.id', ondelete='CASCADE'), index=True)
+    status: Mapped[InstanceStatus] = mapped_column(SqlEnum(InstanceStatus), default=InstanceStatus.planned)
     penalty_applied: Mapped[float | None] = mapped_column(Numeric(10, 2), nullable=True)
-    day_session_id: Mapped[int | None] = mapped_column(ForeignKey('day_sessions.id'), nullable=True, index=True)
-    week_session_id: Mapped[int | None] = mapped_column(ForeignKey('week_sessions.id'), nullable=True, index=True)
+    day_session_id: Mapped[int | None] = mapped_column(ForeignKey('day_sessions.id', ondelete='CASCADE'), nullable=True, index=True)
+    week_session_id: Mapped[int | None] = mapped_column(ForeignKey('week_sessions.id', ondelete='CASCADE'), nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     task: Mapped['Task'] = relationship(back_populates='instances')
+
+
+class StatsRollup(Base):
+    __tablename__ = 'stats_rollups'
+    __table_args__ = (UniqueConstraint('user_id', 'kind', 'bucket', name='uq_stats_rollup_bucket'),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id', ondelete='CASCADE'))
+    kind: Mapped[str] = mapped_column(String(8))  # day | week
+    bucket: Mapped[date] = mapped_column(Date)  # first day of the calendar month
+    planned_count: Mapped[int] = mapped_column(Integer, default=0)
+    done_count: Mapped[int] = mapped_column(Integer, default=0)
+    canceled_count: Mapped[int] = mapped_column(Integer, default=0)
+    failed_count: Mapped[int] = mapped_column(Integer, default=0)
+    total_penalty: Mapped[float] = mapped_column(Numeric(12, 2), default=0)
+
+
+class ArchivedInstance(NamedTuple):
+    """An instance unpacked from ArchivedSession.payload; reads like an Instance row once ``task`` is set."""
+
+    id: int
+    user_id: int
+    task_id: int
+    status: InstanceStatus
+    penalty_applied: Decimal | None
+    day_session_id: int | None
+    week_session_id: int | None
+    created_at: datetime
+    updated_at: datetime
+    task: 'Task | None' = None
+
+
+class ArchivedSession(Base):
+    """A long-closed day or week session with its instances packed into one compressed row (app.services.archive)."""
+
+    __tablename__ = 'archived_sessions'
+    __table_args__ = (
+        Index('ix_archived_sessions_user_last', 'user_id', 'last_created_at', 'id'),
+        Index('ix_archived_sessions_user_kind_last', 'user_id', 'kind', 'last_created_at', 'id'),
+        Index('ix_archived_sessions_user_id', 'user_id', 'id'),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id', ondelete='CASCADE'))
+    kind: Mapped[str] = mapped_column(String(8))  # day | week
+    session_id: Mapped[int] = mapped_column(Integer)  # id the day/week session had
+    started_at: Mapped[datetime] = mapped_column(DateTime)
+    closed_at: Mapped[datetime] = mapped_column(DateTime)
+    # created_at range of the packed instances, to find the rows a history page needs.
+    first_created_at: Mapped[datetime] = mapped_column(DateTime)
+    last_created_at: Mapped[datetime] = mapped_column(DateTime)
+    instance_count: Mapped[int] = mapped_column(Integer)
+    payload: Mapped[bytes] = mapped_column(LargeBinary)
+
+    @staticmethod
+    def pack(instances) -> bytes:
+        """zlib-compressed JSON of [id, task_id, status, penalty, created_at, updated_at] per instance."""
+        rows = [
+            [
+                inst.id,
+                inst.task_id,
+                inst.status.value,
+                None if inst.penalty_applied is None else str(inst.penalty_applied),
+                inst.created_at.isoformat(),
+                inst.updated_at.isoformat(),
+            ]
+            for inst in instances
+        ]
+        return zlib.compress(json.dumps(rows, separators=(',', ':')).encode())
+
+    @property
+    def instances(self) -> list[ArchivedInstance]:
+        day_session_id = self.session_id if self.kind == 'day' else None
+        week_session_id = self.session_id if self.kind == 'week' else None
+        return [
+            ArchivedInstance(
+                id=instance_id,
+                user_id=self.user_id,
+                task_id=task_id,
+                status=InstanceStatus(status),
+                penalty_applied=None if penalty is None else Decimal(penalty),
+                day_session_id=day_session_id,
+                week_session_id=week_session_id,
+                created_at=datetime.fromisoformat(created_at),
+                updated_at=datetime.fromisoformat(updated_at),
+            )
+            for instance_id, task_id, status, penalty, created_at, updated_at in json.loads(zlib.decompress(self.payload))
+        ]
+
+
+class IdempotentResponse(Base):
+    __tablename__ = 'idempotent_responses'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'key', name='uq_idempotent_response_key'),
+        # Rows arrive in created_at order and leave by age: on PostgreSQL a BRIN index of a few pages does.
+        Index('ix_idempotent_responses_created_at', 'created_at', postgresql_using='brin'),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id', ondelete='CASCADE'))
+    key: Mapped[str] = mapped_column(String(255))
+    request: Mapped[str] = mapped_column(String(255))  # "METHOD /path" the key was first used for
+    status_code: Mapped[int] = mapped_column(Integer)
+    body: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class PurgeJob(Base):
+    """A deletion of a user's history or of a task, run in small transactions by app.services.purge."""
+
+    __tablename__ = 'purge_jobs'
+    __table_args__ = (
+        Index('ix_purge_jobs_status', 'status', 'updated_at'),
+        Index('ix_purge_jobs_user', 'user_id', 'kind', 'status'),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('telegram_users.id', ondelete='CASCADE'))
+    kind: Mapped[str] = mapped_column(String(8))  # stats | task
+    task_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    status: Mapped[PurgeStatus] = mapped_column(SqlEnum(PurgeStatus), default=PurgeStatus.pending)
+    # stats: rows created after the request are kept, so only ids up to these are deleted.
+    max_instance_id: Mapped[int] = mapped_column(BigInt, default=0)
+    max_day_session_id: Mapped[int] = mapped_column(Integer, default=0)
+    max_week_session_id: Mapped[int] = mapped_column(Integer, default=0)
+    # task: id of the last archived_sessions row rewritten.
+    archive_cursor: Mapped[int] = mapped_column(Integer, default=0)
+    deleted_count: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class NotificationOutbox(Base):
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (Index('ix_notification_outbox_due', 'status', 'next_attempt_at'),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInt)
+    text: Mapped[str] = mapped_column(Text)
+    status: Mapped[NotificationStatus] = mapped_column(SqlEnum(NotificationStatus), default=NotificationStatus.pending)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.db.init_db import init_db
+from app.db.session import SessionLocal, dispose_engines
+from app.services.archive import archive_closed_sessions
+from app.services.idempotency import purge_responses
+from app.services.purge import purge_finished_jobs
+from app.services.rollover import run_rollover
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def purge_idempotent_responses() -> int:
+    with SessionLocal() as db:
+        return purge_responses(db, datetime.utcnow() - timedelta(hours=settings.idempotency_ttl_hours))
+
+
+def purge_old_purge_jobs() -> int:
+    with SessionLocal() as db:
+        return purge_finished_jobs(db, datetime.utcnow() - timedelta(hours=settings.purge_job_ttl_hours))
+
+
+def archive_old_sessions() -> int:
+    with SessionLocal() as db:
+        return archive_closed_sessions(db)
+
+
+async def main() -> None:
+    init_db()
+    try:
+        while True:
+            try:
+                metrics = await run_rollover()
+                if metrics.due_users:
+                    logger.info('Rollover finished: %s', metrics.as_dict())
+            except Exception:
+                logger.exception('Rollover run failed')
+            try:
+                await asyncio.to_thread(purge_idempotent_responses)
+            except Exception:
+                logger.exception('Idempotency purge failed')
+            try:
+                await asyncio.to_thread(purge_old_purge_jobs)
+            except Exception:
+                logger.exception('Purge job cleanup failed')
+            try:
+                archived = await asyncio.to_thread(archive_old_sessions)
+                if archived:
+                    logger.info('Archived %s closed sessions', archived)
+            except Exception:
+                logger.exception('Archival failed')
+            await asyncio.sleep(settings.scheduler_interval_seconds)
+    finally:
+        await dispose_engines()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -3,7 +3,7 @@ from decimal import Decimal
 
 from pydantic import BaseModel, ConfigDict
 
-from app.models.models import InstanceStatus, TaskKind
+from app.models.models import InstanceStatus, PurgeStatus, TaskKind
 
 
 class MessageOut(BaseModel):
@@ -26,12 +26,20 @@ class SettingsOut(BaseModel):
     currency: str
     penalty_daily_default: Decimal
     penalty_weekly_default: Decimal
+    timezone: str
+    day_start_hour: int
+    week_start_day: int
+    auto_rollover: bool
 
 
 class SettingsUpdate(BaseModel):
     currency: str
     penalty_daily_default: Decimal
     penalty_weekly_default: Decimal
+    timezone: str | None = None
+    day_start_hour: int | None = None
+    week_start_day: int | None = None
+    auto_rollover: bool | None = None
 
 
 class TaskCreate(BaseModel):
@@ -86,10 +94,29 @@ class InstanceOut(BaseModel):
     created_at: datetime
 
 
+class BootstrapOut(BaseModel):
+    user: UserOut
+    settings: SettingsOut
+    tasks: list[TaskOut]
+    open_day: SessionOut | None
+    open_week: SessionOut | None
+    today: list[InstanceOut]
+    week: list[InstanceOut]
+
+
 class InstanceStatusUpdate(BaseModel):
     status: InstanceStatus
 
 
+class InstanceStatusChange(BaseModel):
+    instance_id: int
+    status: InstanceStatus
+
+
+class InstancesStatusUpdate(BaseModel):
+    changes: list[InstanceStatusChange]
+
+
 class AddBacklogToScope(BaseModel):
     task_id: int
     scope: str  # today | week
@@ -113,7 +140,21 @@ class StatsDetailsOut(BaseModel):
     total_penalty: Decimal
     status_counts: dict[str, int]
     rows: list[StatsDetailRow]
+    next_cursor: str | None = None
 
 
 class TasksReorderIn(BaseModel):
     ordered_ids: list[int]
+
+
+class PurgeOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    kind: str
+    task_id: int | None = None
+    status: PurgeStatus
+    deleted_count: int
+    error: str | None = None
+    created_at: datetime
+    finished_at: datetime | None = None
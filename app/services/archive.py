@@ -0,0 +1,264 @@
+"""Archive tier: instances of long-closed sessions packed one row per session.
+
+``archive_sessions`` moves day and week sessions closed before a cutoff
+into ``archived_sessions``, with their instances zlib-packed into one row
+each. It then deletes the sessions and their instances from the live
+tables, so those hold open and recently closed sessions only and their
+indexes stay shallow and in the page cache. Stats rollups are left as
+they are, because archived instances keep counting. History and stats
+details read both tiers through ``merge_archived``. An archived instance
+is read-only: its status can no longer be changed.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, case, delete, exists, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import ArchivedInstance, ArchivedSession, DaySession, Instance, Task, TelegramUser, WeekSession
+from app.services.stats_rollup import record_status_changes
+
+INSTANCE_COLUMNS = (
+    Instance.id,
+    Instance.user_id,
+    Instance.task_id,
+    Instance.status,
+    Instance.penalty_applied,
+    Instance.day_session_id,
+    Instance.week_session_id,
+    Instance.created_at,
+    Instance.updated_at,
+)
+
+
+def _archive(db: Session, kind: str, model, session_column, sessions: list) -> None:
+    ids = [session.id for session in sessions]
+    by_session = defaultdict(list)
+    for row in db.execute(select(*INSTANCE_COLUMNS).where(session_column.in_(ids)).order_by(Instance.id)):
+        instance = ArchivedInstance(*row)
+        by_session[instance.day_session_id if kind == 'day' else instance.week_session_id].append(instance)
+
+    rows = []
+    for session in sessions:
+        instances = by_session.get(session.id)
+        if instances:
+            rows.append(
+                {
+                    'user_id': session.user_id,
+                    'kind': kind,
+                    'session_id': session.id,
+                    'started_at': session.started_at,
+                    'closed_at': session.closed_at,
+                    'first_created_at': min(instance.created_at for instance in instances),
+                    'last_created_at': max(instance.created_at for instance in instances),
+                    'instance_count': len(instances),
+                    'payload': ArchivedSession.pack(instances),
+                }
+            )
+    if rows:
+        db.execute(insert(ArchivedSession), rows)
+        newest: dict[int, datetime] = {}
+        for row in rows:
+            newest[row['user_id']] = max(row['last_created_at'], newest.get(row['user_id'], row['last_created_at']))
+        users = TelegramUser.__table__
+        db.execute(
+            update(users)
+            .where(users.c.id == bindparam('archived_user_id'))
+            .values(
+                archived_until=case(
+                    (or_(users.c.archived_until.is_(None), users.c.archived_until < bindparam('newest')), bindparam('newest')),
+                    else_=users.c.archived_until,
+                )
+            ),
+            [{'archived_user_id': user_id, 'newest': moment} for user_id, moment in newest.items()],
+        )
+    db.execute(delete(Instance).where(session_column.in_(ids)).execution_options(synchronize_session=False))
+    db.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+
+
+def archive_sessions(db: Session, before: datetime, limit: int) -> int:
+    """Archive up to ``limit`` sessions closed before ``before``, in one transaction; returns how many.
+
+    A week is archived only once none of its days is left in the live table.
+    """
+    days = db.scalars(select(DaySession).where(DaySession.closed_at < before).order_by(DaySession.closed_at).limit(limit)).all()
+    if days:
+        _archive(db, 'day', DaySession, Instance.day_session_id, days)
+    weeks = []
+    if len(days) < limit:
+        weeks = db.scalars(
+            select(WeekSession)
+            .where(WeekSession.closed_at < before, ~exists().where(DaySession.week_session_id == WeekSession.id))
+            .order_by(WeekSession.closed_at)
+            .limit(limit - len(days))
+        ).all()
+        if weeks:
+            _archive(db, 'week', WeekSession, Instance.week_session_id, weeks)
+    db.commit()
+    return len(days) + len(weeks)
+
+
+def archive_closed_sessions(db: Session, now: datetime | None = None) -> int:
+    """Archive everything closed more than ARCHIVE_AFTER_DAYS ago, in batches of ARCHIVE_BATCH_SIZE sessions."""
+    if settings.archive_after_days <= 0:
+        return 0
+    before = (now or datetime.utcnow()) - timedelta(days=settings.archive_after_days)
+    total = 0
+    while True:
+        archived = archive_sessions(db, before, settings.archive_batch_size)
+        total += archived
+        if archived < settings.archive_batch_size:
+            return total
+
+
+def archived_page(
+    db: Session,
+    user_id: int,
+    cursor: tuple[datetime, int] | None,
+    size: int,
+    kind: str | None = None,
+    since: datetime | None = None,
+) -> list[ArchivedInstance]:
+    """Up to ``size`` archived instances of the user older than ``cursor``, newest first by (created_at, id)."""
+    query = select(ArchivedSession).where(ArchivedSession.user_id == user_id)
+    if kind is not None:
+        query = query.where(ArchivedSession.kind == kind)
+    if since is not None:
+        query = query.where(ArchivedSession.last_created_at >= since)
+    if cursor is not None:
+        query = query.where(ArchivedSession.first_created_at <= cursor[0])
+    query = query.order_by(ArchivedSession.last_created_at.desc(), ArchivedSession.id.desc())
+
+    entries: list[ArchivedInstance] = []
+    result = db.scalars(query.execution_options(yield_per=16))
+    try:
+        for archived in result:
+            # Sessions come newest first: once the page is full, an older session cannot contribute.
+            if len(entries) >= size and archived.last_created_at < entries[-1].created_at:
+                break
+            entries.extend(
+                instance
+                for instance in archived.instances
+                if (cursor is None or (instance.created_at, instance.id) < cursor) and (since is None or instance.created_at >= since)
+            )
+            entries.sort(key=lambda instance: (instance.created_at, instance.id), reverse=True)
+            del entries[size:]
+    finally:
+        result.close()
+    return entries
+
+
+def merge_archived(
+    db: Session,
+    user: TelegramUser,
+    live: list,
+    size: int,
+    cursor: tuple[datetime, int] | None,
+    kind: str | None = None,
+    since: datetime | None = None,
+) -> list:
+    """Merge the archive into ``live``, a keyset page of up to size + 1 rows newest first by (created_at, id).
+
+    Returns the newest size + 1 rows of both tiers; archived ones are
+    ArchivedInstance with ``task`` set. The archive is only queried when the
+    page reaches back to the user's archived_until.
+    """
+    if user.archived_until is None or (len(live) > size and live[-1].created_at > user.archived_until):
+        return live
+    archived = archived_page(db, user.id, cursor, size + 1, kind, since)
+    if not archived:
+        return live
+    tasks = {task.id: task for task in db.scalars(select(Task).where(Task.id.in_({instance.task_id for instance in archived})))}
+    rows = [*live, *(instance._replace(task=tasks[instance.task_id]) for instance in archived)]
+    rows.sort(key=lambda row: (row.created_at, row.id), reverse=True)
+    return rows[: size + 1]
+
+
+def _archived_batch(db: Session, limit: int, *where) -> list[ArchivedSession]:
+    """Archived sessions matching ``where`` in id order, as many as hold up to ``limit`` instances (at least one)."""
+    ids, total = [], 0
+    for archived_id, count in db.execute(
+        select(ArchivedSession.id, ArchivedSession.instance_count).where(*where).order_by(ArchivedSession.id).limit(limit)
+    ):
+        if ids and total + count > limit:
+            break
+        ids.append(archived_id)
+        total += count
+    if not ids:
+        return []
+    return db.scalars(select(ArchivedSession).where(ArchivedSession.id.in_(ids)).order_by(ArchivedSession.id)).all()
+
+
+def forget_archived_task(db: Session, user_id: int, task_id: int, after_id: int, limit: int) -> tuple[int, int] | None:
+    """Drop a deleted task's instances, and their share of the rollups, from the next archived sessions after ``after_id``.
+
+    Reads sessions holding up to ``limit`` instances; the caller commits.
+    Only sessions with instances created since the task are read, so the
+    cost follows the task's lifetime, not the user's whole archive.
+    Returns (id of the last session read, instances dropped), or None once
+    no session is left.
+    """
+    task_created_at = select(Task.created_at).where(Task.id == task_id).scalar_subquery()
+    since_task = (ArchivedSession.user_id == user_id, ArchivedSession.last_created_at >= task_created_at, ArchivedSession.id > after_id)
+    # A range of ix_archived_sessions_user_last. With min() alone the planners would walk
+    # ix_archived_sessions_user_id from the user's oldest session to the first match instead.
+    first_id, remaining = db.execute(select(func.min(ArchivedSession.id), func.count()).where(*since_task)).one()
+    if not remaining:
+        return None
+    batch = _archived_batch(db, limit, *since_task, ArchivedSession.id >= first_id)
+    if not batch:
+        return None
+    removed = []
+    for archived in batch:
+        instances = archived.instances
+        kept = [instance for instance in instances if instance.task_id != task_id]
+        if len(kept) == len(instances):
+            continue
+        removed.extend(instance for instance in instances if instance.task_id == task_id)
+        if not kept:
+            db.delete(archived)
+            continue
+        archived.payload = ArchivedSession.pack(kept)
+        archived.instance_count = len(kept)
+        archived.first_created_at = min(instance.created_at for instance in kept)
+        archived.last_created_at = max(instance.created_at for instance in kept)
+    record_status_changes(db, [(instance, instance.status, instance.penalty_applied, None, None) for instance in removed])
+    return batch[-1].id, len(removed)
+
+
+def delete_archived(db: Session, limit: int, *where) -> int:
+    """Delete the next archived sessions matching ``where``, holding up to ``limit`` instances, with their share of the rollups.
+
+    The caller commits. Returns how many instances went; 0 once nothing matches.
+    """
+    batch = _archived_batch(db, limit, *where)
+    record_status_changes(
+        db, [(instance, instance.status, instance.penalty_applied, None, None) for archived in batch for instance in archived.instances]
+    )
+    if batch:
+        db.execute(
+            delete(ArchivedSession).where(ArchivedSession.id.in_([archived.id for archived in batch])).execution_options(synchronize_session=False)
+        )
+    return sum(archived.instance_count for archived in batch)
+
+
+def reset_archived_until(db: Session, user_id: int) -> None:
+    """Clear the user's archived_until once none of their sessions is archived any more; the caller commits."""
+    db.execute(
+        update(TelegramUser)
+        .where(TelegramUser.id == user_id, ~exists().where(ArchivedSession.user_id == user_id))
+        .values(archived_until=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+if __name__ == '__main__':
+    from app.db.init_db import init_db
+    from app.db.session import SessionLocal
+
+    init_db()
+    with SessionLocal() as session:
+        count = archive_closed_sessions(session)
+    print(f'Archived {count} sessions closed more than {settings.archive_after_days} days ago')
@@ -1,56 +1,189 @@
+import base64
 from datetime import datetime
 from decimal import Decimal
 
 from fastapi import HTTPException
-from sqlalchemy import Select, func, select
-from sqlalchemy.orm import Session
+from sqlalchemy import DateTime, Integer, Numeric, Select, and_, bindparam, case, exists, func, insert, literal, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, contains_eager, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import settings as app_settings
+from app.models.models import (
+    ArchivedInstance,
+    DaySession,
+    Instance,
+    InstanceStatus,
+    StatsRollup,
+    Task,
+    TaskKind,
+    TelegramUser,
+    UserSettings,
+    WeekSession,
+)
+from app.services.archive import merge_archived
+from app.services.events import event_broker, instance_event, session_event
+from app.services.settings_cache import CachedSettings, task_penalty, user_settings_cache
+from app.services.stats_rollup import fail_and_record, insert_and_record, month_bucket, record_status_change, record_status_changes
+from app.services.telegram_notify import queue_day_closed, queue_week_closed
+
+
+def _create_planned_instances(
+    db: Session,
+    user_id: int,
+    kind: TaskKind,
+    *,
+    day_session_id: int | None = None,
+    week_session_id: int | None = None,
+) -> None:
+    """Plan the user's active tasks of ``kind`` in the new session and add them to the rollups."""
+    now = datetime.utcnow()
+    active_tasks = (
+        select(
+            Task.user_id,
+            Task.id,
+            literal(InstanceStatus.planned, Instance.status.type),
+            literal(day_session_id, Integer),
+            literal(week_session_id, Integer),
+            literal(now, DateTime),
+            literal(now, DateTime),
+        )
+        .where(Task.user_id == user_id, Task.kind == kind, Task.is_active.is_(True))
+        .order_by(Task.id)
+    )
+    insert_and_record(
+        db,
+        insert(Instance).from_select(
+            ['user_id', 'task_id', 'status', 'day_session_id', 'week_session_id', 'created_at', 'updated_at'],
+            active_tasks,
+        ),
+        Instance.day_session_id == day_session_id if day_session_id is not None else Instance.week_session_id == week_session_id,
+    )
 
-from app.models.models import DaySession, Instance, InstanceStatus, Task, TaskKind, TelegramUser, UserSettings, WeekSession
 
+def get_open_day(db: Session, user_id: int) -> DaySession | None:
+    return db.scalar(select(DaySession).where(DaySession.user_id == user_id, DaySession.closed_at.is_(None)))
 
-def _active_tasks_query(user_id: int, kind: TaskKind) -> Select[tuple[Task]]:
-    return select(Task).where(Task.user_id == user_id, Task.kind == kind, Task.is_active.is_(True))
 
+def get_open_week(db: Session, user_id: int) -> WeekSession | None:
+    return db.scalar(select(WeekSession).where(WeekSession.user_id == user_id, WeekSession.closed_at.is_(None)))
 
-def get_open_day(db: Session, user_id: int) -> DaySession | None:
-    return db.scalar(select(DaySession).where(DaySession.user_id == user_id, DaySession.closed_at.is_(None)).order_by(DaySession.id.desc()))
 
+def bump_data_version(db: Session, *user_ids: int) -> None:
+    """Invalidate the users' ETags; call it in the same transaction as the write."""
+    if user_ids:
+        db.execute(
+            update(TelegramUser)
+            .where(TelegramUser.id.in_(user_ids))
+            .values(data_version=TelegramUser.data_version + 1)
+            .execution_options(synchronize_session=False)
+        )
 
-def get_open_week(db: Session, user_id: int) -> WeekSession | None:
-    return db.scalar(select(WeekSession).where(WeekSession.user_id == user_id, WeekSession.closed_at.is_(None)).order_by(WeekSession.id.desc()))
 
+def resolve_penalty(task: Task, settings: UserSettings | CachedSettings) -> Decimal:
+    return task_penalty(task.kind, task.penalty_amount, settings)
 
-def resolve_penalty(task: Task, settings: UserSettings) -> Decimal:
-    if task.penalty_amount is not None:
-        return Decimal(task.penalty_amount)
-    if task.kind == TaskKind.weekly:
-        return Decimal(settings.penalty_weekly_default)
-    return Decimal(settings.penalty_daily_default)
 
+def _penalty_expr(settings: UserSettings | CachedSettings):
+    """SQL counterpart of resolve_penalty, correlated to the instance being updated."""
+    return (
+        select(
+            func.coalesce(
+                Task.penalty_amount,
+                case(
+                    (Task.kind == TaskKind.weekly, literal(settings.penalty_weekly_default, Numeric(10, 2))),
+                    else_=literal(settings.penalty_daily_default, Numeric(10, 2)),
+                ),
+            )
+        )
+        .where(Task.id == Instance.task_id)
+        .scalar_subquery()
+    )
 
-def mark_instance_failed(db: Session, instance: Instance, settings: UserSettings) -> None:
-    if instance.status != InstanceStatus.planned:
-        return
-    penalty = resolve_penalty(instance.task, settings)
-    instance.status = InstanceStatus.failed
-    instance.penalty_applied = penalty
 
+def fail_planned_instances(db: Session, settings: UserSettings | CachedSettings, *where) -> None:
+    """Mark every planned instance matching ``where`` as failed with its resolved penalty."""
+    where = (Instance.status == InstanceStatus.planned, *where)
+    penalty = _penalty_expr(settings)
+    fail_and_record(
+        db,
+        update(Instance)
+        .where(*where)
+        .values(status=InstanceStatus.failed, penalty_applied=penalty, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False),
+        penalty,
+        *where,
+    )
 
-def start_day(db: Session, user: TelegramUser) -> DaySession:
-    if get_open_day(db, user.id):
-        raise HTTPException(status_code=400, detail='There is already an open day session')
 
+def _user_penalty_expr():
+    """Like _penalty_expr, but reads the defaults of each instance owner's settings row."""
+    return (
+        select(
+            func.coalesce(
+                Task.penalty_amount,
+                case(
+                    (Task.kind == TaskKind.weekly, UserSettings.penalty_weekly_default),
+                    else_=UserSettings.penalty_daily_default,
+                ),
+            )
+        )
+        .where(Task.id == Instance.task_id, UserSettings.user_id == Instance.user_id)
+        .scalar_subquery()
+    )
+
+
+def fail_planned_instances_for_users(db: Session, *where) -> None:
+    """fail_planned_instances across many users at once, each with their own default penalties."""
+    where = (Instance.status == InstanceStatus.planned, *where)
+    penalty = _user_penalty_expr()
+    fail_and_record(
+        db,
+        update(Instance)
+        .where(*where)
+        .values(status=InstanceStatus.failed, penalty_applied=penalty, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False),
+        penalty,
+        *where,
+    )
+
+
+def open_day_session(db: Session, user: TelegramUser) -> DaySession:
+    """Open a day with planned daily instances; the caller owns the transaction."""
     open_week = get_open_week(db, user.id)
     day = DaySession(user_id=user.id, week_session_id=open_week.id if open_week else None)
     db.add(day)
     db.flush()
 
-    tasks = db.scalars(_active_tasks_query(user.id, TaskKind.daily)).all()
-    for task in tasks:
-        db.add(Instance(user_id=user.id, task_id=task.id, status=InstanceStatus.planned, day_session_id=day.id))
+    _create_planned_instances(db, user.id, TaskKind.daily, day_session_id=day.id)
+    return day
+
+
+def close_day_session(db: Session, user: TelegramUser, day: DaySession) -> None:
+    """Fail the day's planned instances, close it and queue the summary; the caller owns the transaction."""
+    settings = user_settings_cache.get(db, user)
+    fail_planned_instances(db, settings, Instance.user_id == user.id, Instance.day_session_id == day.id)
+
+    day.closed_at = datetime.utcnow()
+    db.flush()
+    summary = _instance_summary(db, user.id, day_session_id=day.id)
+    queue_day_closed(db, user.telegram_user_id, day.id, summary, settings.currency)
+
 
+def start_day(db: Session, user: TelegramUser) -> DaySession:
+    if get_open_day(db, user.id):
+        raise HTTPException(status_code=400, detail='There is already an open day session')
+
+    try:
+        day = open_day_session(db, user)
+    except IntegrityError:
+        # A concurrent start_day (another worker) won the uq_day_sessions_open race.
+        db.rollback()
+        raise HTTPException(status_code=400, detail='There is already an open day session')
+    bump_data_version(db, user.id)
     db.commit()
     db.refresh(day)
+    event_broker.publish(user.id, 'day.opened', session_event(day))
     return day
 
 
@@ -59,39 +192,27 @@ def close_day(db: Session, user: TelegramUser) -> DaySession:
     if not day:
         raise HTTPException(status_code=400, detail='No open day session')
 
-    settings = db.scalar(select(UserSettings).where(UserSettings.user_id == user.id))
-    planned = db.scalars(
-        select(Instance).where(
-            Instance.user_id == user.id,
-            Instance.day_session_id == day.id,
-            Instance.status == InstanceStatus.planned,
-        )
-    ).all()
-
-    for inst in planned:
-        mark_instance_failed(db, inst, settings)
-
-    day.closed_at = datetime.utcnow()
+    close_day_session(db, user, day)
+    bump_data_version(db, user.id)
     db.commit()
     db.refresh(day)
+    event_broker.publish(user.id, 'day.closed', session_event(day))
     return day
 
 
-def _close_week(db: Session, user: TelegramUser, week: WeekSession) -> None:
-    settings = db.scalar(select(UserSettings).where(UserSettings.user_id == user.id))
-    planned_weekly = db.scalars(
-        select(Instance)
-        .join(Task, Instance.task_id == Task.id)
-        .where(
-            Instance.user_id == user.id,
-            Instance.week_session_id == week.id,
-            Instance.status == InstanceStatus.planned,
-            Task.kind == TaskKind.weekly,
-        )
-    ).all()
-    for inst in planned_weekly:
-        mark_instance_failed(db, inst, settings)
+def _close_week(db: Session, user: TelegramUser, week: WeekSession, auto: bool = False) -> None:
+    settings = user_settings_cache.get(db, user)
+    fail_planned_instances(
+        db,
+        settings,
+        Instance.user_id == user.id,
+        Instance.week_session_id == week.id,
+        exists().where(Task.id == Instance.task_id, Task.kind == TaskKind.weekly),
+    )
     week.closed_at = datetime.utcnow()
+    db.flush()
+    summary = _instance_summary(db, user.id, week_session_id=week.id)
+    queue_week_closed(db, user.telegram_user_id, week.id, summary, settings.currency, auto=auto)
 
 
 def _instance_summary(
@@ -110,46 +231,77 @@ def _instance_summary(
     if week_session_id is not None:
         filters.append(Instance.week_session_id == week_session_id)
 
-    rows = db.execute(select(Instance.status, func.count(Instance.id)).where(*filters).group_by(Instance.status)).all()
-    by_status = {status.value: int(count) for status, count in rows}
-    total_penalty = db.scalar(
-        select(func.coalesce(func.sum(Instance.penalty_applied), 0)).where(*filters, Instance.status == InstanceStatus.failed)
-    )
+    done, canceled, failed, total_penalty = db.execute(select(*_summary_columns()).where(*filters)).one()
     return {
-        'done_count': by_status.get(InstanceStatus.done.value, 0),
-        'canceled_count': by_status.get(InstanceStatus.canceled.value, 0),
-        'failed_count': by_status.get(InstanceStatus.failed.value, 0),
+        'done_count': int(done),
+        'canceled_count': int(canceled),
+        'failed_count': int(failed),
         'total_penalty': Decimal(total_penalty),
     }
 
 
+def _summary_columns() -> tuple:
+    """done, canceled and failed counts and the failed penalty total, in one pass with FILTER aggregates."""
+    failed = Instance.status == InstanceStatus.failed
+    return (
+        func.count().filter(Instance.status == InstanceStatus.done),
+        func.count().filter(Instance.status == InstanceStatus.canceled),
+        func.count().filter(failed),
+        func.coalesce(func.sum(Instance.penalty_applied).filter(failed), 0),
+    )
+
+
+def instance_summaries(db: Session, session_column, session_ids: list[int]) -> dict[int, dict]:
+    """_instance_summary for many day or week sessions in one query, keyed by session id."""
+    summaries = {
+        session_id: {'done_count': 0, 'canceled_count': 0, 'failed_count': 0, 'total_penalty': Decimal('0.00')}
+        for session_id in session_ids
+    }
+    if not session_ids:
+        return summaries
+    rows = db.execute(select(session_column, *_summary_columns()).where(session_column.in_(session_ids)).group_by(session_column)).all()
+    for session_id, done, canceled, failed, penalty in rows:
+        summary = summaries[session_id]
+        summary.update(done_count=int(done), canceled_count=int(canceled), failed_count=int(failed))
+        if failed:
+            summary['total_penalty'] = Decimal(penalty)
+    return summaries
+
+
 def build_day_close_result(db: Session, user: TelegramUser, day: DaySession) -> tuple[dict, str]:
-    settings = db.scalar(select(UserSettings).where(UserSettings.user_id == user.id))
     summary = _instance_summary(db, user.id, day_session_id=day.id)
-    return summary, settings.currency
+    return summary, user_settings_cache.get(db, user).currency
 
 
 def build_week_close_result(db: Session, user: TelegramUser, week: WeekSession) -> tuple[dict, str]:
-    settings = db.scalar(select(UserSettings).where(UserSettings.user_id == user.id))
     summary = _instance_summary(db, user.id, week_session_id=week.id)
-    return summary, settings.currency
+    return summary, user_settings_cache.get(db, user).currency
 
 
-def start_week(db: Session, user: TelegramUser) -> WeekSession:
+def open_week_session(db: Session, user: TelegramUser) -> WeekSession:
+    """Auto-close the current week if any and open a new one; the caller owns the transaction."""
     current = get_open_week(db, user.id)
     if current:
-        _close_week(db, user, current)
+        _close_week(db, user, current, auto=True)
 
     week = WeekSession(user_id=user.id)
     db.add(week)
     db.flush()
 
-    weekly_tasks = db.scalars(_active_tasks_query(user.id, TaskKind.weekly)).all()
-    for task in weekly_tasks:
-        db.add(Instance(user_id=user.id, task_id=task.id, status=InstanceStatus.planned, week_session_id=week.id))
+    _create_planned_instances(db, user.id, TaskKind.weekly, week_session_id=week.id)
+    return week
+
 
+def start_week(db: Session, user: TelegramUser) -> WeekSession:
+    try:
+        week = open_week_session(db, user)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail='The week was restarted concurrently, reload and retry')
+    bump_data_version(db, user.id)
     db.commit()
     db.refresh(week)
+    event_broker.publish(user.id, 'week.opened', session_event(week))
     return week
 
 
@@ -158,16 +310,71 @@ def close_week(db: Session, user: TelegramUser) -> WeekSession:
     if not week:
         raise HTTPException(status_code=400, detail='No open week session')
     _close_week(db, user, week)
+    bump_data_version(db, user.id)
     db.commit()
     db.refresh(week)
+    event_broker.publish(user.id, 'week.closed', session_event(week))
     return week
 
 
+def encode_cursor(created_at: datetime, instance_id: int) -> str:
+    raw = f'{created_at.isoformat()}|{instance_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, instance_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(instance_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+def _page_size(limit: int | None) -> int:
+    if limit is None:
+        return app_settings.history_page_size
+    return limit
+
+
+def _keyset_page(query: Select, position: tuple[datetime, int] | None, limit: int | None) -> tuple[Select, int]:
+    """Order ``query`` newest first by (created_at, id) and start right after ``position``, a decoded cursor.
+
+    One extra row is fetched so the caller can tell whether another page exists.
+    """
+    size = _page_size(limit)
+    if position:
+        created_at, instance_id = position
+        query = query.where(
+            or_(
+                Instance.created_at < created_at,
+                and_(Instance.created_at == created_at, Instance.id < instance_id),
+            )
+        )
+    return query.order_by(Instance.created_at.desc(), Instance.id.desc()).limit(size + 1), size
+
+
+def list_history(
+    db: Session, user: TelegramUser, cursor: str | None = None, limit: int | None = None
+) -> tuple[list[Instance | ArchivedInstance], str | None]:
+    """A page of the user's instances, newest first, across the live and archived tiers."""
+    position = decode_cursor(cursor) if cursor else None
+    query, size = _keyset_page(
+        select(Instance).options(joinedload(Instance.task, innerjoin=True)).where(Instance.user_id == user.id), position, limit
+    )
+    instances = merge_archived(db, user, db.scalars(query).all(), size, position)
+    if len(instances) <= size:
+        return instances, None
+    instances = instances[:size]
+    return instances, encode_cursor(instances[-1].created_at, instances[-1].id)
+
+
 def list_instances(
     db: Session,
-    user_id: int,
+    user: TelegramUser,
     scope: str,
-) -> list[Instance]:
+) -> list[Instance | ArchivedInstance]:
+    user_id = user.id
     if scope == 'today':
         day = get_open_day(db, user_id)
         if not day:
@@ -175,8 +382,9 @@ def list_instances(
         return db.scalars(
             select(Instance)
             .join(Task, Instance.task_id == Task.id)
+            .options(contains_eager(Instance.task))
             .where(Instance.user_id == user_id, Instance.day_session_id == day.id)
-            .order_by(Task.order_index.asc(), Instance.created_at.asc())
+            .order_by(Task.order_index.asc(), Instance.created_at.asc(), Instance.id.asc())
         ).all()
 
     if scope == 'week':
@@ -186,16 +394,53 @@ def list_instances(
         return db.scalars(
             select(Instance)
             .join(Task, Instance.task_id == Task.id)
+            .options(contains_eager(Instance.task))
             .where(Instance.user_id == user_id, Instance.week_session_id == week.id)
-            .order_by(Task.order_index.asc(), Instance.created_at.asc())
+            .order_by(Task.order_index.asc(), Instance.created_at.asc(), Instance.id.asc())
         ).all()
 
     if scope == 'history':
-        return db.scalars(select(Instance).where(Instance.user_id == user_id).order_by(Instance.created_at.desc()).limit(200)).all()
+        return list_history(db, user)[0]
 
     raise HTTPException(status_code=400, detail='Unsupported scope')
 
 
+def bootstrap_state(db: Session, user_id: int) -> dict:
+    """Everything the Mini App renders on open, in five queries; both open scopes share one instance query.
+
+    On a read session the queries share one snapshot. The ETag comes from the user row authentication
+    read before it, so it is never newer than the data: a write in between costs one more refetch, not a stale 304.
+    """
+    settings = db.scalar(select(UserSettings).where(UserSettings.user_id == user_id))
+    tasks = db.scalars(select(Task).where(Task.user_id == user_id).order_by(Task.order_index.asc(), Task.created_at.asc())).all()
+    day = get_open_day(db, user_id)
+    week = get_open_week(db, user_id)
+
+    scopes = []
+    if day:
+        scopes.append(Instance.day_session_id == day.id)
+    if week:
+        scopes.append(Instance.week_session_id == week.id)
+    instances = []
+    if scopes:
+        instances = db.scalars(
+            select(Instance)
+            .join(Task, Instance.task_id == Task.id)
+            .options(contains_eager(Instance.task))
+            .where(Instance.user_id == user_id, or_(*scopes))
+            .order_by(Task.order_index.asc(), Instance.created_at.asc(), Instance.id.asc())
+        ).all()
+
+    return {
+        'settings': settings,
+        'tasks': tasks,
+        'open_day': day,
+        'open_week': week,
+        'today': [inst for inst in instances if day and inst.day_session_id == day.id],
+        'week': [inst for inst in instances if week and inst.week_session_id == week.id],
+    }
+
+
 def add_backlog_to_scope(db: Session, user: TelegramUser, task_id: int, scope: str) -> Instance:
     task = db.scalar(select(Task).where(Task.id == task_id, Task.user_id == user.id))
     if not task or task.kind != TaskKind.backlog:
@@ -208,7 +453,7 @@ def add_backlog_to_scope(db: Session, user: TelegramUser, task_id: int, scope: s
         instance = db.scalar(select(Instance).where(Instance.task_id == task.id, Instance.day_session_id == day.id))
         if instance:
             return instance
-        instance = Instance(user_id=user.id, task_id=task.id, status=InstanceStatus.planned, day_session_id=day.id)
+        instance = Instance(user_id=user.id, task=task, status=InstanceStatus.planned, day_session_id=day.id)
     elif scope == 'week':
         week = get_open_week(db, user.id)
         if not week:
@@ -216,52 +461,114 @@ def add_backlog_to_scope(db: Session, user: TelegramUser, task_id: int, scope: s
         instance = db.scalar(select(Instance).where(Instance.task_id == task.id, Instance.week_session_id == week.id))
         if instance:
             return instance
-        instance = Instance(user_id=user.id, task_id=task.id, status=InstanceStatus.planned, week_session_id=week.id)
+        instance = Instance(user_id=user.id, task=task, status=InstanceStatus.planned, week_session_id=week.id)
     else:
         raise HTTPException(status_code=400, detail='Scope must be today or week')
 
     db.add(instance)
+    db.flush()
+    record_status_change(db, instance, None, None, instance.status, None)
+    bump_data_version(db, user.id)
+    event = instance_event(instance)
     db.commit()
-    db.refresh(instance)
+    event_broker.publish(user.id, 'instance.added', event)
     return instance
 
 
 def update_instance_status(db: Session, user: TelegramUser, instance_id: int, status: InstanceStatus) -> Instance:
-    instance = db.scalar(select(Instance).where(Instance.id == instance_id, Instance.user_id == user.id))
+    instance = db.scalar(
+        select(Instance).options(joinedload(Instance.task, innerjoin=True)).where(Instance.id == instance_id, Instance.user_id == user.id)
+    )
     if not instance:
         raise HTTPException(status_code=404, detail='Instance not found')
 
     if instance.status == status:
         return instance
 
-    settings = db.scalar(select(UserSettings).where(UserSettings.user_id == user.id))
+    penalty = user_settings_cache.get(db, user).penalty(instance.task) if status == InstanceStatus.failed else None
+    record_status_change(db, instance, instance.status, instance.penalty_applied, status, penalty)
     instance.status = status
-    if status == InstanceStatus.failed:
-        instance.penalty_applied = resolve_penalty(instance.task, settings)
-    else:
-        instance.penalty_applied = None
-
+    instance.penalty_applied = penalty
+    bump_data_version(db, user.id)
+    event = instance_event(instance)
     db.commit()
-    db.refresh(instance)
+    event_broker.publish(user.id, 'instance.updated', event)
     return instance
 
 
-def stats_penalty(db: Session, user_id: int, period: str) -> tuple[int, Decimal]:
-    failed = select(func.count(Instance.id), func.coalesce(func.sum(Instance.penalty_applied), 0)).where(
-        Instance.user_id == user_id,
-        Instance.status == InstanceStatus.failed,
-    )
+def update_instance_statuses(db: Session, user: TelegramUser, changes: list[tuple[int, InstanceStatus]]) -> list[Instance]:
+    """Apply many (instance_id, status) changes in one transaction; the last change per instance wins.
 
+    Returns the instances in request order, unchanged ones included. An
+    unknown id fails the whole batch, so a retried offline queue never ends
+    up half applied.
+    """
+    if len(changes) > app_settings.instance_batch_max:
+        raise HTTPException(status_code=400, detail=f'At most {app_settings.instance_batch_max} changes per request')
+    targets = dict(changes)
+    if not targets:
+        return []
+
+    instances = db.scalars(
+        select(Instance).options(joinedload(Instance.task, innerjoin=True)).where(Instance.id.in_(targets), Instance.user_id == user.id)
+    ).all()
+    by_id = {instance.id: instance for instance in instances}
+    if len(by_id) != len(targets):
+        raise HTTPException(status_code=404, detail='Instance not found')
+
+    changed = [instance for instance in instances if instance.status != targets[instance.id]]
+    if changed:
+        settings = None
+        if any(targets[instance.id] == InstanceStatus.failed for instance in changed):
+            settings = user_settings_cache.get(db, user)
+        now = datetime.utcnow()
+        transitions, rows = [], []
+        for instance in changed:
+            status = targets[instance.id]
+            penalty = settings.penalty(instance.task) if status == InstanceStatus.failed else None
+            transitions.append((instance, instance.status, instance.penalty_applied, status, penalty))
+            rows.append({'instance_id': instance.id, 'new_status': status, 'new_penalty': penalty})
+        record_status_changes(db, transitions)
+        # One executemany instead of the unit of work's per-row UPDATEs.
+        table = Instance.__table__
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam('instance_id'))
+            .values(status=bindparam('new_status'), penalty_applied=bindparam('new_penalty'), updated_at=now),
+            rows,
+        )
+        for instance, row in zip(changed, rows):
+            set_committed_value(instance, 'status', row['new_status'])
+            set_committed_value(instance, 'penalty_applied', row['new_penalty'])
+            set_committed_value(instance, 'updated_at', now)
+        bump_data_version(db, user.id)
+        events = [instance_event(instance) for instance in changed]
+        db.commit()
+        for event in events:
+            event_broker.publish(user.id, 'instance.updated', event)
+    return [by_id[instance_id] for instance_id in targets]
+
+
+def _stats_rollup_filters(user_id: int, period: str) -> list:
+    filters = [StatsRollup.user_id == user_id]
     if period == 'days':
-        failed = failed.where(Instance.day_session_id.is_not(None))
+        filters.append(StatsRollup.kind == 'day')
     elif period == 'weeks':
-        failed = failed.where(Instance.week_session_id.is_not(None))
+        filters.append(StatsRollup.kind == 'week')
     elif period == 'months':
-        pass
+        filters.append(StatsRollup.bucket == month_bucket(datetime.utcnow()))
     else:
         raise HTTPException(status_code=400, detail='period must be days, weeks, or months')
+    return filters
+
 
-    count, total = db.execute(failed).one()
+def stats_penalty(db: Session, user_id: int, period: str) -> tuple[int, Decimal]:
+    count, total = db.execute(
+        select(
+            func.coalesce(func.sum(StatsRollup.failed_count), 0),
+            func.coalesce(func.sum(StatsRollup.total_penalty), 0),
+        ).where(*_stats_rollup_filters(user_id, period))
+    ).one()
     return int(count), Decimal(total)
 
 
@@ -272,38 +579,65 @@ def _stats_period_filters(user_id: int, period: str) -> list:
     elif period == 'weeks':
         filters.append(Instance.week_session_id.is_not(None))
     elif period == 'months':
-        pass
+        now = datetime.utcnow()
+        filters.append(Instance.created_at >= datetime(now.year, now.month, 1))
     else:
         raise HTTPException(status_code=400, detail='period must be days, weeks, or months')
     return filters
 
 
-def stats_details(db: Session, user_id: int, period: str) -> dict:
-    filters = _stats_period_filters(user_id, period)
+def _archive_period(period: str) -> dict:
+    """_stats_period_filters for the archived tier, as merge_archived arguments."""
+    if period == 'days':
+        return {'kind': 'day'}
+    if period == 'weeks':
+        return {'kind': 'week'}
+    now = datetime.utcnow()
+    return {'since': datetime(now.year, now.month, 1)}
 
-    status_rows = db.execute(
-        select(Instance.status, func.count(Instance.id)).where(*filters).group_by(Instance.status)
-    ).all()
-    status_counts = {status.value: int(count) for status, count in status_rows}
-    for key in ['planned', 'done', 'canceled', 'failed']:
-        status_counts.setdefault(key, 0)
 
-    total_penalty = Decimal(
-        db.scalar(select(func.coalesce(func.sum(Instance.penalty_applied), 0)).where(*filters, Instance.status == InstanceStatus.failed))
-    )
+def _detail_fields(row) -> tuple:
+    """An archived instance in the shape of a stats_details query row."""
+    if isinstance(row, ArchivedInstance):
+        return row.task.title, row.status, row.created_at, row.penalty_applied or Decimal('0.00'), row.id
+    return row
+
+
+def stats_details(db: Session, user: TelegramUser, period: str, cursor: str | None = None, limit: int | None = None) -> dict:
+    user_id = user.id
+    filters = _stats_period_filters(user_id, period)
 
-    rows = db.execute(
+    totals = db.execute(
+        select(
+            func.coalesce(func.sum(StatsRollup.planned_count), 0),
+            func.coalesce(func.sum(StatsRollup.done_count), 0),
+            func.coalesce(func.sum(StatsRollup.canceled_count), 0),
+            func.coalesce(func.sum(StatsRollup.failed_count), 0),
+            func.coalesce(func.sum(StatsRollup.total_penalty), 0),
+        ).where(*_stats_rollup_filters(user_id, period))
+    ).one()
+    status_counts = {key: int(count) for key, count in zip(['planned', 'done', 'canceled', 'failed'], totals[:4])}
+    total_penalty = Decimal(totals[4])
+
+    position = decode_cursor(cursor) if cursor else None
+    query, size = _keyset_page(
         select(
             Task.title,
             Instance.status,
             Instance.created_at,
             func.coalesce(Instance.penalty_applied, 0),
+            Instance.id,
         )
         .join(Task, Instance.task_id == Task.id)
-        .where(*filters)
-        .order_by(Instance.created_at.desc())
-        .limit(200)
-    ).all()
+        .where(*filters),
+        position,
+        limit,
+    )
+    rows = merge_archived(db, user, db.execute(query).all(), size, position, **_archive_period(period))
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
 
     detail_rows = [
         {
@@ -312,7 +646,7 @@ def stats_details(db: Session, user_id: int, period: str) -> dict:
             'started_at': started_at,
             'total_penalty': Decimal(penalty_value),
         }
-        for task_title, status, started_at, penalty_value in rows
+        for task_title, status, started_at, penalty_value, _ in map(_detail_fields, rows)
     ]
 
     return {
@@ -320,4 +654,5 @@ def stats_details(db: Session, user_id: int, period: str) -> dict:
         'total_penalty': total_penalty,
         'status_counts': status_counts,
         'rows': detail_rows,
+        'next_cursor': next_cursor,
     }
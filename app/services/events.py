@@ -0,0 +1,184 @@
+"""Fan-out of domain events to the user's open /api/events streams.
+
+Each stream owns a bounded queue of pre-formatted SSE messages. An idle
+stream costs one suspended coroutine and a queue, and takes no database
+connection. Publishing to a user without streams is a dict lookup. Events
+reach the streams served by the process that made the change. For the
+others (other workers, the scheduler) each process watches
+telegram_users.data_version of the users it has streams for, with one
+query every EVENTS_POLL_SECONDS, and sends a resync when it moves.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import AsyncReadSessionLocal
+from app.models.models import DaySession, Instance, TelegramUser, WeekSession
+
+logger = logging.getLogger(__name__)
+
+# Users per data_version query of the watch.
+WATCH_BATCH_SIZE = 500
+
+# Sent instead of the dropped backlog when a slow stream's queue overflows.
+RESYNC = 'event: resync\ndata: {}\n\n'
+# Queued by close(): the stream ends and EventSource reconnects after its retry delay.
+CLOSE = None
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def format_event(event: str, data: dict) -> str:
+    return f'event: {event}\ndata: {json.dumps(data, default=_json_default, separators=(",", ":"))}\n\n'
+
+
+class EventBroker:
+    def __init__(self, queue_size: int) -> None:
+        self._queue_size = queue_size
+        self._streams: dict[int, set[asyncio.Queue]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._closed = False
+        # user id -> the data_version the user's streams are known to be at
+        self._versions: dict[int, int] = {}
+        self._watcher: asyncio.Task | None = None
+
+    @property
+    def connections(self) -> int:
+        return sum(len(queues) for queues in self._streams.values())
+
+    def subscribe(self, user_id: int, data_version: int) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self._queue_size)
+        self._streams.setdefault(user_id, set()).add(queue)
+        self._versions.setdefault(user_id, data_version)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._streams.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._streams[user_id]
+            self._versions.pop(user_id, None)
+
+    def publish(self, user_id: int, event: str, data: dict) -> None:
+        """Queue an event for every stream of the user; safe to call from any thread, after commit."""
+        if user_id not in self._streams or self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._deliver, user_id, format_event(event, data))
+
+    def start(self) -> None:
+        if self._watcher or settings.events_poll_seconds <= 0:
+            return
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if not self._watcher:
+            return
+        self._watcher.cancel()
+        try:
+            await self._watcher
+        except asyncio.CancelledError:
+            pass
+        self._watcher = None
+
+    async def _watch(self) -> None:
+        while not self._closed:
+            await asyncio.sleep(settings.events_poll_seconds)
+            try:
+                await self.check_versions()
+            except Exception:
+                logger.exception('Event version check failed')
+
+    async def check_versions(self) -> None:
+        """Send a resync to the streams of users whose data changed since their last event or check."""
+        user_ids = list(self._streams)
+        for start in range(0, len(user_ids), WATCH_BATCH_SIZE):
+            async with AsyncReadSessionLocal() as db:
+                rows = await db.execute(
+                    select(TelegramUser.id, TelegramUser.data_version).where(TelegramUser.id.in_(user_ids[start : start + WATCH_BATCH_SIZE]))
+                )
+            for user_id, version in rows:
+                known = self._versions.get(user_id)
+                if known is not None and version != known:
+                    self._versions[user_id] = version
+                    self._deliver(user_id, RESYNC)
+
+    def close(self) -> None:
+        """End every open stream, so a shutting down server does not wait out their max age; safe from a signal handler."""
+        self._closed = True
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._close_streams)
+
+    def _close_streams(self) -> None:
+        for queues in self._streams.values():
+            for queue in queues:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(CLOSE)
+
+    def _deliver(self, user_id: int, message: str) -> None:
+        for queue in self._streams.get(user_id, ()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    async def stream(self, user_id: int, data_version: int):
+        """SSE chunks for one connection: heartbeats while idle, and an end after events_max_age_seconds.
+
+        A bounded lifetime lets EventSource reconnect, possibly to another
+        worker, and keeps open streams from stalling a graceful shutdown forever.
+        """
+        queue = self.subscribe(user_id, data_version)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.events_max_age_seconds
+        try:
+            yield f'retry: {int(settings.events_retry_ms)}\n'
+            yield format_event('ready', {})
+            while loop.time() < deadline and not self._closed:
+                try:
+                    message = await asyncio.wait_for(queue.get(), settings.events_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    message = ': heartbeat\n\n'
+                if message is CLOSE:
+                    break
+                yield message
+        finally:
+            self.unsubscribe(user_id, queue)
+
+
+def instance_event(instance: Instance) -> dict:
+    return {
+        'id': instance.id,
+        'task_id': instance.task_id,
+        'task_title': instance.task.title,
+        'task_kind': instance.task.kind.value,
+        'status': instance.status.value,
+        'penalty_applied': instance.penalty_applied,
+        'day_session_id': instance.day_session_id,
+        'week_session_id': instance.week_session_id,
+        'created_at': instance.created_at,
+    }
+
+
+def session_event(session: DaySession | WeekSession) -> dict:
+    return {'id': session.id, 'started_at': session.started_at, 'closed_at': session.closed_at}
+
+
+event_broker = EventBroker(settings.events_queue_size)
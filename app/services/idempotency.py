@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.models import IdempotentResponse
+
+# status_code of a key claimed by a request that is still running.
+IN_PROGRESS = 0
+# A claim this old belongs to a worker that died mid-request; the next request with the key takes it over.
+CLAIM_LEASE = timedelta(minutes=1)
+
+
+def find_response(db: Session, user_id: int, key: str) -> IdempotentResponse | None:
+    return db.scalar(select(IdempotentResponse).where(IdempotentResponse.user_id == user_id, IdempotentResponse.key == key))
+
+
+def is_abandoned(stored: IdempotentResponse) -> bool:
+    return stored.status_code == IN_PROGRESS and stored.created_at < datetime.utcnow() - CLAIM_LEASE
+
+
+def claim_key(db: Session, user_id: int, key: str, request: str, abandoned: IdempotentResponse | None = None) -> bool:
+    """Claim ``key`` for a request about to run, or take over an abandoned claim, and commit.
+
+    Returns False when another request got there first, in any worker.
+    """
+    if abandoned is None:
+        db.add(IdempotentResponse(user_id=user_id, key=key, request=request, status_code=IN_PROGRESS, body=''))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+    claimed = db.execute(
+        update(IdempotentResponse)
+        .where(
+            IdempotentResponse.id == abandoned.id,
+            IdempotentResponse.status_code == IN_PROGRESS,
+            IdempotentResponse.created_at == abandoned.created_at,
+        )
+        .values(request=request, created_at=datetime.utcnow())
+    ).rowcount
+    db.commit()
+    return bool(claimed)
+
+
+def save_response(db: Session, user_id: int, key: str, status_code: int, body: str) -> None:
+    """Store the response of the request that claimed ``key``."""
+    db.execute(
+        update(IdempotentResponse)
+        .where(IdempotentResponse.user_id == user_id, IdempotentResponse.key == key)
+        .values(status_code=status_code, body=body)
+    )
+    db.commit()
+
+
+def release_key(db: Session, user_id: int, key: str) -> None:
+    """Drop the claim of a request that failed; errors are not stored, so a retry runs again."""
+    db.rollback()
+    db.execute(
+        delete(IdempotentResponse).where(
+            IdempotentResponse.user_id == user_id, IdempotentResponse.key == key, IdempotentResponse.status_code == IN_PROGRESS
+        )
+    )
+    db.commit()
+
+
+def purge_responses(db: Session, before: datetime) -> int:
+    deleted = db.execute(delete(IdempotentResponse).where(IdempotentResponse.created_at < before)).rowcount
+    db.commit()
+    return deleted
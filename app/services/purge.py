@@ -0,0 +1,232 @@
+"""Chunked deletion of a user's history (DELETE /stats) and of a task (DELETE /tasks/{id}).
+
+A purge is a purge_jobs row. The API process works it off in transactions
+of at most PURGE_BATCH_SIZE rows, subtracting each chunk from the stats
+rollups as it goes, and hands the writer to whoever is waiting between
+chunks. Other users' writes interleave with a purge of years of history
+instead of queueing behind one long DELETE, and the job row is the
+progress report (GET /purges/{id}). A stats purge only deletes rows that
+existed when it was requested. A task is deactivated right away and its
+row deleted once its instances are gone; the ON DELETE CASCADE takes
+whatever was added in between.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.models import ArchivedSession, DaySession, Instance, PurgeJob, PurgeStatus, Task, WeekSession
+from app.services.archive import delete_archived, forget_archived_task, reset_archived_until
+from app.services.domain import bump_data_version
+from app.services.settings_cache import bump_settings_version
+from app.services.stats_rollup import record_instances
+
+logger = logging.getLogger(__name__)
+
+CLAIM_LEASE = timedelta(minutes=1)
+UNFINISHED = (PurgeStatus.pending, PurgeStatus.running)
+
+
+def start_purge(db: Session, user_id: int, kind: str, task_id: int | None = None) -> PurgeJob:
+    """A new pending purge, or the user's unfinished one of the same kind and task; the caller commits."""
+    job = db.scalar(
+        select(PurgeJob).where(
+            PurgeJob.user_id == user_id,
+            PurgeJob.kind == kind,
+            PurgeJob.status.in_(UNFINISHED),
+            PurgeJob.task_id.is_(None) if task_id is None else PurgeJob.task_id == task_id,
+        )
+    )
+    if job is not None:
+        return job
+    job = PurgeJob(user_id=user_id, kind=kind, task_id=task_id, status=PurgeStatus.pending)
+    if kind == 'stats':
+        job.max_instance_id = db.scalar(select(func.coalesce(func.max(Instance.id), 0)))
+        job.max_day_session_id = db.scalar(select(func.coalesce(func.max(DaySession.id), 0)))
+        job.max_week_session_id = db.scalar(select(func.coalesce(func.max(WeekSession.id), 0)))
+    db.add(job)
+    db.flush()
+    return job
+
+
+def _delete_instances(db: Session, ids: list[int]) -> int:
+    record_instances(db, Instance.id.in_(ids), sign=-1)
+    db.execute(delete(Instance).where(Instance.id.in_(ids)).execution_options(synchronize_session=False))
+    return len(ids)
+
+
+def _delete_sessions(db: Session, model, session_column, ids: list[int]) -> int:
+    # The purge already took their instances; any added since go with the cascade, minus their rollups first.
+    record_instances(db, session_column.in_(ids), sign=-1)
+    db.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+    return len(ids)
+
+
+def _purge_stats(db: Session, job: PurgeJob, limit: int) -> int | None:
+    """Live instances, then archived ones, then the emptied sessions; None once nothing is left."""
+    ids = db.scalars(
+        select(Instance.id)
+        .where(Instance.user_id == job.user_id, Instance.id <= job.max_instance_id)
+        .order_by(Instance.created_at, Instance.id)
+        .limit(limit)
+    ).all()
+    if ids:
+        return _delete_instances(db, ids)
+    deleted = delete_archived(
+        db,
+        limit,
+        ArchivedSession.user_id == job.user_id,
+        or_(
+            and_(ArchivedSession.kind == 'day', ArchivedSession.session_id <= job.max_day_session_id),
+            and_(ArchivedSession.kind == 'week', ArchivedSession.session_id <= job.max_week_session_id),
+        ),
+    )
+    if deleted:
+        return deleted
+    for model, session_column, max_id in (
+        (DaySession, Instance.day_session_id, job.max_day_session_id),
+        (WeekSession, Instance.week_session_id, job.max_week_session_id),
+    ):
+        ids = db.scalars(select(model.id).where(model.user_id == job.user_id, model.id <= max_id).order_by(model.id).limit(limit)).all()
+        if ids:
+            return _delete_sessions(db, model, session_column, ids)
+    reset_archived_until(db, job.user_id)
+    return None
+
+
+def _purge_task(db: Session, job: PurgeJob, limit: int) -> int | None:
+    """Live instances of the task, then its archived ones, then the task row; None once it is gone."""
+    ids = db.scalars(select(Instance.id).where(Instance.task_id == job.task_id).order_by(Instance.id).limit(limit)).all()
+    if ids:
+        return _delete_instances(db, ids)
+    forgotten = forget_archived_task(db, job.user_id, job.task_id, job.archive_cursor, limit)
+    if forgotten is not None:
+        job.archive_cursor, removed = forgotten
+        return removed
+    record_instances(db, Instance.task_id == job.task_id, sign=-1)
+    db.execute(delete(Task).where(Task.id == job.task_id).execution_options(synchronize_session=False))
+    bump_settings_version(db, job.user_id)
+    reset_archived_until(db, job.user_id)
+    return None
+
+
+STEPS = {'stats': _purge_stats, 'task': _purge_task}
+
+
+def purge_step(db: Session, job_id: int) -> bool:
+    """Run the next chunk of a running job and commit it; returns whether the job is finished."""
+    job = db.get(PurgeJob, job_id)
+    if job is None or job.status != PurgeStatus.running:
+        return True
+    deleted = STEPS[job.kind](db, job, settings.purge_batch_size)
+    job.updated_at = datetime.utcnow()
+    if deleted is None:
+        job.status = PurgeStatus.done
+        job.finished_at = job.updated_at
+    else:
+        job.deleted_count += deleted
+    bump_data_version(db, job.user_id)
+    db.commit()
+    return deleted is None
+
+
+def claim_job(db: Session) -> int | None:
+    """Mark the oldest pending job, or a running one whose worker went quiet, as running; returns its id."""
+    now = datetime.utcnow()
+    claimable = or_(
+        PurgeJob.status == PurgeStatus.pending,
+        and_(PurgeJob.status == PurgeStatus.running, PurgeJob.updated_at < now - CLAIM_LEASE),
+    )
+    # ix_purge_jobs_status yields them by (status, updated_at): oldest pending first, without a sort.
+    for job_id in db.scalars(select(PurgeJob.id).where(claimable).limit(8)).all():
+        claimed = db.execute(update(PurgeJob).where(PurgeJob.id == job_id, claimable).values(status=PurgeStatus.running, updated_at=now))
+        if claimed.rowcount:
+            db.commit()
+            return job_id
+    db.rollback()
+    return None
+
+
+def fail_job(db: Session, job_id: int, error: str) -> None:
+    """Stop a job after a chunk failed; the chunks before it stay deleted and a new request resumes the work."""
+    now = datetime.utcnow()
+    db.execute(update(PurgeJob).where(PurgeJob.id == job_id).values(status=PurgeStatus.failed, error=error, updated_at=now, finished_at=now))
+    db.commit()
+
+
+def purge_finished_jobs(db: Session, before: datetime) -> int:
+    deleted = db.execute(delete(PurgeJob).where(PurgeJob.status.not_in(UNFINISHED), PurgeJob.finished_at < before)).rowcount
+    db.commit()
+    return deleted
+
+
+class PurgeWorker:
+    """Background loop in the API process that runs purge jobs one chunk per writer transaction."""
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._stopping = False
+
+    def start(self) -> None:
+        if self._task:
+            return
+        # Created here, on the loop that runs the worker.
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self) -> None:
+        if not self._task:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                ran = await self.run_once()
+            except Exception:
+                logger.exception('Purge run failed')
+                ran = False
+            if ran:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.purge_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def run_once(self) -> bool:
+        """Claim one job and run it to the end (or until stop); returns whether there was one."""
+        async with AsyncSessionLocal() as db:
+            job_id = await db.run_sync(claim_job)
+        if job_id is None:
+            return False
+        while not self._stopping:
+            try:
+                async with AsyncSessionLocal() as db:
+                    if await db.run_sync(purge_step, job_id):
+                        return True
+            except Exception as exc:
+                logger.exception('Purge job %s failed', job_id)
+                async with AsyncSessionLocal() as db:
+                    await db.run_sync(fail_job, job_id, repr(exc))
+                return True
+            # Let writers queued on the connection (and other processes, via busy_timeout) in before the next chunk.
+            await asyncio.sleep(settings.purge_pause_seconds)
+        return True
+
+
+purge_worker = PurgeWorker()
@@ -0,0 +1,350 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import DateTime, Integer, exists, func, insert, literal, select, update
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import settings as app_settings
+from app.db.session import SessionLocal, is_sqlite
+from app.models.models import DaySession, Instance, InstanceStatus, Task, TaskKind, TelegramUser, UserSettings, WeekSession
+from app.services.domain import (
+    bump_data_version,
+    close_day_session,
+    fail_planned_instances_for_users,
+    get_open_day,
+    get_open_week,
+    instance_summaries,
+    open_day_session,
+    open_week_session,
+)
+from app.services.stats_rollup import insert_and_record
+from app.services.telegram_notify import queue_day_closed, queue_week_closed
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RolloverCandidate:
+    user_id: int
+    day_boundary: datetime | None
+    week_boundary: datetime | None
+
+    @property
+    def due_since(self) -> datetime:
+        return max(b for b in (self.day_boundary, self.week_boundary) if b is not None)
+
+
+@dataclass
+class RolloverMetrics:
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    due_users: int = 0
+    processed_users: int = 0
+    failed_users: int = 0
+    days_rolled: int = 0
+    weeks_rolled: int = 0
+    max_lag_seconds: float = 0.0
+    lag_total_seconds: float = 0.0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def mean_lag_seconds(self) -> float:
+        return self.lag_total_seconds / self.processed_users if self.processed_users else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'due_users': self.due_users,
+            'processed_users': self.processed_users,
+            'failed_users': self.failed_users,
+            'days_rolled': self.days_rolled,
+            'weeks_rolled': self.weeks_rolled,
+            'duration_seconds': round(self.finished_at - self.started_at, 3),
+            'max_lag_seconds': round(self.max_lag_seconds, 3),
+            'mean_lag_seconds': round(self.mean_lag_seconds, 3),
+        }
+
+
+@lru_cache(maxsize=1024)
+def _zone(name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning('Unknown timezone %r, falling back to UTC', name)
+        return ZoneInfo('UTC')
+
+
+def _to_naive_utc(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _local_boundary(local_date: date, hour: int, zone: ZoneInfo) -> datetime:
+    return datetime(local_date.year, local_date.month, local_date.day, hour, tzinfo=zone)
+
+
+def last_day_boundary(now: datetime, tz_name: str, day_start_hour: int) -> datetime:
+    """Most recent local day start at or before ``now`` (naive UTC in, naive UTC out)."""
+    zone = _zone(tz_name)
+    local_now = now.replace(tzinfo=timezone.utc).astimezone(zone)
+    boundary = _local_boundary(local_now.date(), day_start_hour, zone)
+    if boundary > local_now:
+        boundary = _local_boundary(local_now.date() - timedelta(days=1), day_start_hour, zone)
+    return _to_naive_utc(boundary)
+
+
+def last_week_boundary(now: datetime, tz_name: str, day_start_hour: int, week_start_day: int) -> datetime:
+    zone = _zone(tz_name)
+    day_boundary = last_day_boundary(now, tz_name, day_start_hour).replace(tzinfo=timezone.utc).astimezone(zone)
+    days_back = (day_boundary.weekday() - week_start_day) % 7
+    return _to_naive_utc(_local_boundary(day_boundary.date() - timedelta(days=days_back), day_start_hour, zone))
+
+
+def find_due_users(db: Session, now: datetime) -> list[RolloverCandidate]:
+    """Users whose open day or week started before their latest local boundary."""
+    open_day = aliased(DaySession)
+    open_week = aliased(WeekSession)
+    rows = db.execute(
+        select(
+            UserSettings.user_id,
+            UserSettings.timezone,
+            UserSettings.day_start_hour,
+            UserSettings.week_start_day,
+            open_day.started_at,
+            open_week.started_at,
+        )
+        .outerjoin(open_day, (open_day.user_id == UserSettings.user_id) & open_day.closed_at.is_(None))
+        .outerjoin(open_week, (open_week.user_id == UserSettings.user_id) & open_week.closed_at.is_(None))
+        .where(UserSettings.auto_rollover.is_(True))
+        .where(open_day.id.is_not(None) | open_week.id.is_not(None))
+    ).all()
+
+    due: dict[int, RolloverCandidate] = {}
+    for user_id, tz_name, day_start_hour, week_start_day, day_started_at, week_started_at in rows:
+        day_boundary = last_day_boundary(now, tz_name, day_start_hour)
+        week_boundary = last_week_boundary(now, tz_name, day_start_hour, week_start_day)
+        day_due = day_boundary if day_started_at is not None and day_started_at < day_boundary else None
+        week_due = week_boundary if week_started_at is not None and week_started_at < week_boundary else None
+        if day_due or week_due:
+            due[user_id] = RolloverCandidate(user_id, day_due, week_due)
+    return list(due.values())
+
+
+def rollover_user(db: Session, user: TelegramUser, candidate: RolloverCandidate) -> tuple[bool, bool]:
+    """Roll one user's sessions without committing.
+
+    The open sessions are re-read and re-checked against the boundary, so
+    running the same candidate twice (or after a manual Start/Close) is a no-op.
+    """
+    week_rolled = day_rolled = False
+    if candidate.week_boundary is not None:
+        week = get_open_week(db, user.id)
+        if week and week.started_at < candidate.week_boundary:
+            open_week_session(db, user)
+            week_rolled = True
+    if candidate.day_boundary is not None:
+        day = get_open_day(db, user.id)
+        if day and day.started_at < candidate.day_boundary:
+            close_day_session(db, user, day)
+            open_day_session(db, user)
+            day_rolled = True
+    if day_rolled or week_rolled:
+        bump_data_version(db, user.id)
+    return day_rolled, week_rolled
+
+
+def _open_sessions(db: Session, model, boundaries: dict[int, datetime]) -> list:
+    """Open sessions of ``boundaries``' users that still started before their boundary."""
+    if not boundaries:
+        return []
+    sessions = db.scalars(select(model).where(model.user_id.in_(list(boundaries)), model.closed_at.is_(None))).all()
+    return [session for session in sessions if session.started_at < boundaries[session.user_id]]
+
+
+def _insert_sessions(db: Session, model, rows: list[dict]) -> dict[int, int]:
+    if not rows:
+        return {}
+    created = db.execute(insert(model).returning(model.user_id, model.id), rows).all()
+    return dict(created)
+
+
+def _create_planned_instances_for(db: Session, model, kind: TaskKind, session_column, sessions: dict[int, int]) -> None:
+    """_create_planned_instances for many users at once; ``sessions`` maps user id to the new session id."""
+    if not sessions:
+        return
+    now = datetime.utcnow()
+    is_day = kind == TaskKind.daily
+    active_tasks = (
+        select(
+            Task.user_id,
+            Task.id,
+            literal(InstanceStatus.planned, Instance.status.type),
+            model.id if is_day else literal(None, Integer),
+            literal(None, Integer) if is_day else model.id,
+            literal(now, DateTime),
+            literal(now, DateTime),
+        )
+        .join(model, model.user_id == Task.user_id)
+        # The redundant user filter keeps SQLite on ix_tasks_user_kind_active for
+        # large batches instead of walking every task of this kind.
+        .where(
+            model.id.in_(list(sessions.values())),
+            Task.user_id.in_(list(sessions)),
+            Task.kind == kind,
+            Task.is_active.is_(True),
+        )
+        .order_by(Task.user_id, Task.id)
+    )
+    insert_and_record(
+        db,
+        insert(Instance).from_select(
+            ['user_id', 'task_id', 'status', 'day_session_id', 'week_session_id', 'created_at', 'updated_at'],
+            active_tasks,
+        ),
+        session_column.in_(list(sessions.values())),
+    )
+
+
+def _queue_summaries(db: Session, sessions: list, session_column, queue, **kwargs) -> None:
+    if not sessions:
+        return
+    user_ids = [session.user_id for session in sessions]
+    owners = {
+        user_id: (chat_id, currency)
+        for user_id, chat_id, currency in db.execute(
+            select(TelegramUser.id, TelegramUser.telegram_user_id, UserSettings.currency)
+            .join(UserSettings, UserSettings.user_id == TelegramUser.id)
+            .where(TelegramUser.id.in_(user_ids))
+        )
+    }
+    summaries = instance_summaries(db, session_column, [session.id for session in sessions])
+    for session in sessions:
+        chat_id, currency = owners[session.user_id]
+        queue(db, chat_id, session.id, summaries[session.id], currency, **kwargs)
+
+
+def _rollover_weeks(db: Session, boundaries: dict[int, datetime], now: datetime) -> set[int]:
+    weeks = _open_sessions(db, WeekSession, boundaries)
+    if not weeks:
+        return set()
+    week_ids = [week.id for week in weeks]
+    fail_planned_instances_for_users(
+        db,
+        Instance.week_session_id.in_(week_ids),
+        exists().where(Task.id == Instance.task_id, Task.kind == TaskKind.weekly),
+    )
+    db.execute(update(WeekSession).where(WeekSession.id.in_(week_ids)).values(closed_at=now))
+    _queue_summaries(db, weeks, Instance.week_session_id, queue_week_closed, auto=True)
+
+    new_weeks = _insert_sessions(db, WeekSession, [{'user_id': week.user_id, 'started_at': now} for week in weeks])
+    _create_planned_instances_for(db, WeekSession, TaskKind.weekly, Instance.week_session_id, new_weeks)
+    return set(new_weeks)
+
+
+def _rollover_days(db: Session, boundaries: dict[int, datetime], now: datetime) -> set[int]:
+    days = _open_sessions(db, DaySession, boundaries)
+    if not days:
+        return set()
+    day_ids = [day.id for day in days]
+    fail_planned_instances_for_users(db, Instance.day_session_id.in_(day_ids))
+    db.execute(update(DaySession).where(DaySession.id.in_(day_ids)).values(closed_at=now))
+    _queue_summaries(db, days, Instance.day_session_id, queue_day_closed)
+
+    user_ids = [day.user_id for day in days]
+    open_weeks = dict(
+        db.execute(
+            select(WeekSession.user_id, func.max(WeekSession.id))
+            .where(WeekSession.user_id.in_(user_ids), WeekSession.closed_at.is_(None))
+            .group_by(WeekSession.user_id)
+        ).all()
+    )
+    new_days = _insert_sessions(
+        db,
+        DaySession,
+        [{'user_id': user_id, 'week_session_id': open_weeks.get(user_id), 'started_at': now} for user_id in user_ids],
+    )
+    _create_planned_instances_for(db, DaySession, TaskKind.daily, Instance.day_session_id, new_days)
+    return set(new_days)
+
+
+def rollover_users(db: Session, candidates: list[RolloverCandidate]) -> tuple[int, int]:
+    """Set-based rollover_user for a whole batch, without committing.
+
+    Issues a fixed number of statements per batch instead of per user. Open
+    sessions are re-read and re-checked against each boundary inside the
+    transaction, so the batch is just as idempotent as the per-user path.
+    """
+    now = datetime.utcnow()
+    weeks = _rollover_weeks(db, {c.user_id: c.week_boundary for c in candidates if c.week_boundary is not None}, now)
+    days = _rollover_days(db, {c.user_id: c.day_boundary for c in candidates if c.day_boundary is not None}, now)
+    bump_data_version(db, *(days | weeks))
+    return len(days), len(weeks)
+
+
+def rollover_batch(db: Session, candidates: list[RolloverCandidate], metrics: RolloverMetrics) -> None:
+    try:
+        days_rolled, weeks_rolled = rollover_users(db, candidates)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception('Rollover batch failed, retrying users one by one')
+        days_rolled = weeks_rolled = 0
+        users = {user.id: user for user in db.scalars(select(TelegramUser).where(TelegramUser.id.in_([c.user_id for c in candidates])))}
+        for candidate in candidates:
+            try:
+                day_rolled, week_rolled = rollover_user(db, users[candidate.user_id], candidate)
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                metrics.failed_users += 1
+                metrics.errors.append(f'user {candidate.user_id}: {exc}')
+                logger.exception('Rollover failed for user %s', candidate.user_id)
+                continue
+            days_rolled += day_rolled
+            weeks_rolled += week_rolled
+
+    now = datetime.utcnow()
+    for candidate in candidates:
+        lag = (now - candidate.due_since).total_seconds()
+        metrics.max_lag_seconds = max(metrics.max_lag_seconds, lag)
+        metrics.lag_total_seconds += lag
+    metrics.processed_users += len(candidates)
+    metrics.days_rolled += days_rolled
+    metrics.weeks_rolled += weeks_rolled
+
+
+# The scheduler runs in its own process and spends its time in many small
+# statements, so it drives the sync engine from worker threads instead of
+# paying an aiosqlite thread hop per statement.
+def _find_due_users(now: datetime) -> list[RolloverCandidate]:
+    with SessionLocal() as db:
+        return find_due_users(db, now)
+
+
+def _rollover_batch(candidates: list[RolloverCandidate], metrics: RolloverMetrics) -> None:
+    with SessionLocal() as db:
+        rollover_batch(db, candidates, metrics)
+
+
+async def run_rollover(now: datetime | None = None) -> RolloverMetrics:
+    now = now or datetime.utcnow()
+    metrics = RolloverMetrics(started_at=time.monotonic())
+    candidates = await asyncio.to_thread(_find_due_users, now)
+    metrics.due_users = len(candidates)
+
+    batch_size = app_settings.scheduler_batch_size
+    batches = [candidates[i : i + batch_size] for i in range(0, len(candidates), batch_size)]
+    # SQLite funnels writes through a single connection, so extra workers would only queue on it.
+    semaphore = asyncio.Semaphore(1 if is_sqlite else app_settings.scheduler_concurrency)
+
+    async def process(batch: list[RolloverCandidate]) -> None:
+        async with semaphore:
+            await asyncio.to_thread(_rollover_batch, batch, metrics)
+            logger.info('Rollover progress: %s/%s users', metrics.processed_users, metrics.due_users)
+
+    await asyncio.gather(*(process(batch) for batch in batches))
+    metrics.finished_at = time.monotonic()
+    return metrics
@@ -0,0 +1,123 @@
+"""Per-process LRU of each user's settings and resolved task penalties.
+
+Entries are tagged with ``telegram_users.settings_version``, which the
+settings and task routes bump in the same transaction as their write
+(``bump_settings_version``). A lookup compares the tag with the user row
+that authentication already loaded, so a hit costs no query and a write
+made by another worker or the scheduler is never served stale.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import Decimal
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings as app_settings
+from app.models.models import Task, TaskKind, TelegramUser, UserSettings
+
+
+def task_penalty(kind: TaskKind, penalty_amount, settings) -> Decimal:
+    """The penalty of a failed instance: the task's own amount, else the user's default for its kind."""
+    if penalty_amount is not None:
+        return Decimal(penalty_amount)
+    if kind == TaskKind.weekly:
+        return Decimal(settings.penalty_weekly_default)
+    return Decimal(settings.penalty_daily_default)
+
+
+@dataclass(frozen=True)
+class CachedSettings:
+    """Read-only copy of a user_settings row plus the resolved penalty of every task of the user."""
+
+    version: int
+    currency: str
+    penalty_daily_default: Decimal
+    penalty_weekly_default: Decimal
+    timezone: str
+    day_start_hour: int
+    week_start_day: int
+    auto_rollover: bool
+    task_penalties: dict[int, Decimal]
+
+    def penalty(self, task: Task) -> Decimal:
+        penalty = self.task_penalties.get(task.id)
+        return task_penalty(task.kind, task.penalty_amount, self) if penalty is None else penalty
+
+
+def _load(db: Session, user: TelegramUser) -> CachedSettings:
+    rows = db.execute(
+        select(UserSettings, Task.id, Task.kind, Task.penalty_amount)
+        .outerjoin(Task, Task.user_id == UserSettings.user_id)
+        .where(UserSettings.user_id == user.id)
+    ).all()
+    settings = rows[0][0]
+    return CachedSettings(
+        version=user.settings_version,
+        currency=settings.currency,
+        penalty_daily_default=Decimal(settings.penalty_daily_default),
+        penalty_weekly_default=Decimal(settings.penalty_weekly_default),
+        timezone=settings.timezone,
+        day_start_hour=settings.day_start_hour,
+        week_start_day=settings.week_start_day,
+        auto_rollover=settings.auto_rollover,
+        task_penalties={
+            task_id: task_penalty(kind, penalty_amount, settings) for _, task_id, kind, penalty_amount in rows if task_id is not None
+        },
+    )
+
+
+class UserSettingsCache:
+    """Bounded LRU of user id -> CachedSettings; hits and misses are counted in app.core.metrics."""
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._items: OrderedDict[int, CachedSettings] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, db: Session, user: TelegramUser) -> CachedSettings:
+        """The user's settings, loaded with ``db`` (one query) unless cached for the user's settings_version."""
+        with self._lock:
+            cached = self._items.get(user.id)
+            if cached is not None and cached.version == user.settings_version:
+                self._items.move_to_end(user.id)
+                metrics.settings_cache_lookups.inc('hit')
+                return cached
+        metrics.settings_cache_lookups.inc('miss')
+        cached = _load(db, user)
+        if self._max_size > 0:
+            with self._lock:
+                self._items[user.id] = cached
+                self._items.move_to_end(user.id)
+                while len(self._items) > self._max_size:
+                    self._items.popitem(last=False)
+                    metrics.settings_cache_lookups.inc('eviction')
+        return cached
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._items.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+user_settings_cache = UserSettingsCache(app_settings.settings_cache_size)
+
+
+def bump_settings_version(db: Session, user_id: int) -> None:
+    """bump_data_version that also invalidates the user's cached settings in every process."""
+    db.execute(
+        update(TelegramUser)
+        .where(TelegramUser.id == user_id)
+        .values(data_version=TelegramUser.data_version + 1, settings_version=TelegramUser.settings_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    user_settings_cache.invalidate(user_id)
@@ -0,0 +1,240 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import Date, case, cast, delete, func, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.models import ArchivedSession, Instance, InstanceStatus, StatsRollup
+
+STATUS_COLUMNS = {
+    InstanceStatus.planned: 'planned_count',
+    InstanceStatus.done: 'done_count',
+    InstanceStatus.canceled: 'canceled_count',
+    InstanceStatus.failed: 'failed_count',
+}
+
+
+def month_bucket(moment: datetime | date) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def instance_kind(instance: Instance) -> str:
+    return 'day' if instance.day_session_id is not None else 'week'
+
+
+def _insert(db: Session):
+    if db.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert
+    return sqlite.insert
+
+
+def _bucket_expr(db: Session):
+    if db.get_bind().dialect.name == 'postgresql':
+        return cast(func.date_trunc('month', Instance.created_at), Date)
+    return func.strftime('%Y-%m-01', Instance.created_at)
+
+
+def _kind_expr():
+    return case((Instance.day_session_id.is_not(None), literal('day')), else_=literal('week'))
+
+
+def _add_on_conflict(stmt):
+    counters = [*STATUS_COLUMNS.values(), 'total_penalty']
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id', 'kind', 'bucket'],
+        set_={name: getattr(StatsRollup, name) + getattr(stmt.excluded, name) for name in counters},
+    )
+
+
+def _upsert(db: Session, rows: list[dict]) -> None:
+    if not rows:
+        return
+    insert = _insert(db)
+    # executemany form: the statement stays cacheable and SQLAlchemy splits
+    # large rebuilds into batches that fit the driver's parameter limit.
+    db.execute(_add_on_conflict(insert(StatsRollup)), rows)
+
+
+def _upsert_returning(db: Session, statement, from_status: InstanceStatus | None) -> None:
+    """Execute ``statement`` inside the rollup upsert, which aggregates the instance rows it returns (PostgreSQL).
+
+    Each returned row counts under its new status; with ``from_status`` it
+    also leaves that status, whose penalty was 0.
+    """
+    changed = statement.returning(
+        Instance.user_id, Instance.day_session_id, Instance.created_at, Instance.status, Instance.penalty_applied
+    ).cte('changed')
+    kind = case((changed.c.day_session_id.is_not(None), literal('day')), else_=literal('week'))
+    bucket = cast(func.date_trunc('month', changed.c.created_at), Date)
+    counts = []
+    for status in STATUS_COLUMNS:
+        count = func.count().filter(changed.c.status == status)
+        counts.append(count - func.count() if status == from_status else count)
+    aggregates = select(changed.c.user_id, kind, bucket, *counts, func.coalesce(func.sum(changed.c.penalty_applied), 0)).group_by(
+        changed.c.user_id, kind, bucket
+    )
+    # A data-modifying WITH must be the statement's outermost one.
+    stmt = postgresql.insert(StatsRollup).from_select(['user_id', 'kind', 'bucket', *STATUS_COLUMNS.values(), 'total_penalty'], aggregates)
+    db.execute(_add_on_conflict(stmt.add_cte(changed, nest_here=True)))
+
+
+def _returning_upserts(db: Session) -> bool:
+    # SQLite has RETURNING, but no INSERT or UPDATE inside WITH.
+    return db.get_bind().dialect.name == 'postgresql'
+
+
+def _delta_row(user_id: int, kind: str, bucket: date) -> dict:
+    row = {'user_id': user_id, 'kind': kind, 'bucket': bucket, 'total_penalty': Decimal(0)}
+    row.update({name: 0 for name in STATUS_COLUMNS.values()})
+    return row
+
+
+def record_status_change(
+    db: Session,
+    instance: Instance,
+    old_status: InstanceStatus | None,
+    old_penalty: Decimal | None,
+    new_status: InstanceStatus | None,
+    new_penalty: Decimal | None,
+) -> None:
+    """Apply one instance transition; a None status means the instance did not exist (or no longer exists)."""
+    record_status_changes(db, [(instance, old_status, old_penalty, new_status, new_penalty)])
+
+
+def record_status_changes(db: Session, transitions: list[tuple]) -> None:
+    """record_status_change for many (instance, old_status, old_penalty, new_status, new_penalty) at once, in one upsert."""
+    rows: dict[tuple, dict] = {}
+    for instance, old_status, old_penalty, new_status, new_penalty in transitions:
+        key = (instance.user_id, instance_kind(instance), month_bucket(instance.created_at))
+        row = rows.setdefault(key, _delta_row(*key))
+        if old_status is not None:
+            row[STATUS_COLUMNS[old_status]] -= 1
+            row['total_penalty'] -= Decimal(old_penalty or 0)
+        if new_status is not None:
+            row[STATUS_COLUMNS[new_status]] += 1
+            row['total_penalty'] += Decimal(new_penalty or 0)
+    _upsert(db, list(rows.values()))
+
+
+def record_instances(db: Session, *where, sign: int = 1) -> None:
+    """Add (sign=1) or subtract (sign=-1) the aggregate of every instance matching ``where``.
+
+    Call it after the matching rows are flushed and before they are deleted.
+    """
+    kind = _kind_expr()
+    bucket = _bucket_expr(db)
+    aggregates = db.execute(
+        select(
+            Instance.user_id,
+            kind,
+            bucket,
+            Instance.status,
+            func.count(Instance.id),
+            func.coalesce(func.sum(Instance.penalty_applied), 0),
+        )
+        .where(*where)
+        .group_by(Instance.user_id, kind, bucket, Instance.status)
+    ).all()
+
+    rows: dict[tuple, dict] = {}
+    for user_id, kind_value, bucket_value, status, count, penalty in aggregates:
+        if isinstance(bucket_value, str):
+            bucket_value = date.fromisoformat(bucket_value)
+        row = rows.setdefault((user_id, kind_value, bucket_value), _delta_row(user_id, kind_value, bucket_value))
+        row[STATUS_COLUMNS[status]] += sign * int(count)
+        row['total_penalty'] += sign * Decimal(penalty)
+    _upsert(db, list(rows.values()))
+
+
+def record_archived(db: Session, *where, sign: int = 1) -> None:
+    """record_instances for the instances packed in the archived_sessions matching ``where``."""
+    for archived_sessions in db.scalars(select(ArchivedSession).where(*where).execution_options(yield_per=200)).partitions():
+        record_status_changes(
+            db,
+            [
+                (instance, None, None, instance.status, instance.penalty_applied)
+                if sign > 0
+                else (instance, instance.status, instance.penalty_applied, None, None)
+                for archived in archived_sessions
+                for instance in archived.instances
+            ],
+        )
+
+
+def insert_and_record(db: Session, statement, *where) -> None:
+    """Execute ``statement``, an INSERT of instances, and add the new rows to the rollups.
+
+    ``where`` matches the new rows once inserted. PostgreSQL does both in one
+    statement; elsewhere the rows are aggregated after the insert.
+    """
+    if _returning_upserts(db):
+        _upsert_returning(db, statement, None)
+        return
+    db.execute(statement)
+    record_instances(db, *where)
+
+
+def fail_and_record(db: Session, statement, penalty, *where) -> None:
+    """Execute ``statement``, the UPDATE failing the planned instances matching ``where`` with ``penalty``, and apply it to the rollups.
+
+    PostgreSQL does both in one statement; elsewhere record_failures runs
+    before the update.
+    """
+    if _returning_upserts(db):
+        _upsert_returning(db, statement, InstanceStatus.planned)
+        return
+    record_failures(db, penalty, *where)
+    db.execute(statement)
+
+
+def record_failures(db: Session, penalty, *where) -> None:
+    """Move planned instances matching ``where`` to failed, adding ``penalty`` (a SQL expression) per row.
+
+    Call it right before the matching UPDATE, while the rows are still planned.
+    """
+    kind = _kind_expr()
+    bucket = _bucket_expr(db)
+    aggregates = db.execute(
+        select(Instance.user_id, kind, bucket, func.count(Instance.id), func.coalesce(func.sum(penalty), 0))
+        .where(*where)
+        .group_by(Instance.user_id, kind, bucket)
+    ).all()
+
+    rows = []
+    for user_id, kind_value, bucket_value, count, penalty_total in aggregates:
+        if isinstance(bucket_value, str):
+            bucket_value = date.fromisoformat(bucket_value)
+        row = _delta_row(user_id, kind_value, bucket_value)
+        row['planned_count'] -= int(count)
+        row['failed_count'] += int(count)
+        row['total_penalty'] += Decimal(penalty_total)
+        rows.append(row)
+    _upsert(db, rows)
+
+
+def clear_user_rollups(db: Session, user_id: int) -> None:
+    db.execute(delete(StatsRollup).where(StatsRollup.user_id == user_id))
+
+
+def rebuild_stats_rollups(db: Session, user_id: int | None = None) -> None:
+    """Recompute rollups from raw instance rows of both tiers, for one user or everybody."""
+    if user_id is None:
+        db.execute(delete(StatsRollup))
+        record_instances(db)
+        record_archived(db)
+    else:
+        clear_user_rollups(db, user_id)
+        record_instances(db, Instance.user_id == user_id)
+        record_archived(db, ArchivedSession.user_id == user_id)
+    db.commit()
+
+
+if __name__ == '__main__':
+    from app.db.init_db import init_db
+    from app.db.session import SessionLocal
+
+    init_db()
+    with SessionLocal() as session:
+        rebuild_stats_rollups(session)
+    print('Stats rollups rebuilt')
@@ -1,29 +1,30 @@
-import json
+import asyncio
 import logging
+import time
+from datetime import datetime, timedelta
 from decimal import Decimal
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
+from functools import lru_cache
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound, TelegramRetryAfter
+from aiogram.utils.token import TokenValidationError, validate_token
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.metrics import telegram_latency
+from app.db.session import AsyncSessionLocal
+from app.models.models import NotificationOutbox, NotificationStatus
 
 logger = logging.getLogger(__name__)
 
-
-def _send_message(chat_id: int, text: str) -> None:
-    if not settings.bot_token:
-        return
-    url = f'https://api.telegram.org/bot{settings.bot_token}/sendMessage'
-    payload = urlencode({'chat_id': chat_id, 'text': text}).encode('utf-8')
-    request = Request(url, data=payload, method='POST')
-    request.add_header('Content-Type', 'application/x-www-form-urlencoded')
-    try:
-        with urlopen(request, timeout=6) as response:
-            raw = response.read().decode('utf-8')
-            data = json.loads(raw)
-            if not data.get('ok'):
-                logger.warning('Telegram sendMessage failed: %s', raw)
-    except Exception as exc:
-        logger.warning('Telegram notification failed: %s', exc)
+BATCH_SIZE = 50
+CLAIM_LEASE = timedelta(minutes=2)
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 600.0
+PERMANENT_ERRORS = (TelegramBadRequest, TelegramForbiddenError, TelegramNotFound)
 
 
 def _close_text(period: str, session_id: int, done: int, canceled: int, failed: int, amount: Decimal, currency: str) -> str:
@@ -36,7 +37,26 @@ def _close_text(period: str, session_id: int, done: int, canceled: int, failed:
     )
 
 
-def notify_day_closed(chat_id: int, session_id: int, summary: dict, currency: str) -> None:
+@lru_cache(maxsize=1)
+def notifications_enabled() -> bool:
+    """Whether BOT_TOKEN is set and well-formed; the API runs without notifications otherwise."""
+    if not settings.bot_token:
+        return False
+    try:
+        validate_token(settings.bot_token)
+    except TokenValidationError:
+        logger.error('BOT_TOKEN is malformed, notifications are disabled')
+        return False
+    return True
+
+
+def _enqueue(db: Session, chat_id: int, text: str) -> None:
+    if not notifications_enabled():
+        return
+    db.add(NotificationOutbox(chat_id=chat_id, text=text))
+
+
+def queue_day_closed(db: Session, chat_id: int, session_id: int, summary: dict, currency: str) -> None:
     text = _close_text(
         period='Day',
         session_id=session_id,
@@ -46,10 +66,10 @@ def notify_day_closed(chat_id: int, session_id: int, summary: dict, currency: st
         amount=summary['total_penalty'],
         currency=currency,
     )
-    _send_message(chat_id, text)
+    _enqueue(db, chat_id, text)
 
 
-def notify_week_closed(chat_id: int, session_id: int, summary: dict, currency: str, auto: bool = False) -> None:
+def queue_week_closed(db: Session, chat_id: int, session_id: int, summary: dict, currency: str, auto: bool = False) -> None:
     title = 'Week (auto)'
     if not auto:
         title = 'Week'
@@ -62,4 +82,152 @@ def notify_week_closed(chat_id: int, session_id: int, summary: dict, currency: s
         amount=summary['total_penalty'],
         currency=currency,
     )
-    _send_message(chat_id, text)
+    _enqueue(db, chat_id, text)
+
+
+class _RateLimiter:
+    """Reserves send slots so the Bot API global and per-chat limits are never exceeded."""
+
+    def __init__(self, global_rate: float, per_chat_interval: float) -> None:
+        self._global_interval = 1.0 / global_rate if global_rate > 0 else 0.0
+        self._per_chat_interval = per_chat_interval
+        self._next_global = 0.0
+        self._next_by_chat: dict[int, float] = {}
+
+    async def wait(self, chat_id: int) -> None:
+        now = time.monotonic()
+        slot = max(now, self._next_global, self._next_by_chat.get(chat_id, 0.0))
+        self._next_global = slot + self._global_interval
+        self._next_by_chat[chat_id] = slot + self._per_chat_interval
+        if len(self._next_by_chat) > 10000:
+            self._next_by_chat = {key: value for key, value in self._next_by_chat.items() if value > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class NotificationDispatcher:
+    """Background loop that delivers notification_outbox rows through one pooled Bot API client."""
+
+    def __init__(self) -> None:
+        self._bot: Bot | None = None
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._semaphore = asyncio.Semaphore(settings.notify_concurrency)
+        self._limiter = _RateLimiter(settings.notify_global_rate, settings.notify_per_chat_interval)
+
+    def start(self) -> None:
+        if not notifications_enabled() or self._task:
+            return
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(settings.telegram_api_url),
+            limit=settings.notify_concurrency,
+        )
+        self._bot = Bot(token=settings.bot_token, session=session)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        if not self._task:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        await self._bot.session.close()
+        self._bot = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                delivered = await self.dispatch_once()
+            except Exception:
+                logger.exception('Notification dispatch failed')
+                delivered = 0
+            if delivered:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.notify_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def dispatch_once(self) -> int:
+        batch = await self._claim_batch()
+        if not batch:
+            return 0
+        results = await asyncio.gather(*(self._deliver(*row) for row in batch))
+        await self._store_results(results)
+        return len(batch)
+
+    async def _claim_batch(self) -> list[tuple[int, int, str, int]]:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            rows = (
+                await db.execute(
+                    select(NotificationOutbox.id, NotificationOutbox.chat_id, NotificationOutbox.text, NotificationOutbox.attempts)
+                    .where(NotificationOutbox.status == NotificationStatus.pending, NotificationOutbox.next_attempt_at <= now)
+                    .order_by(NotificationOutbox.id.asc())
+                    .limit(BATCH_SIZE)
+                )
+            ).all()
+            claimed = []
+            for row in rows:
+                result = await db.execute(
+                    update(NotificationOutbox)
+                    .where(
+                        NotificationOutbox.id == row.id,
+                        NotificationOutbox.status == NotificationStatus.pending,
+                        NotificationOutbox.next_attempt_at <= now,
+                    )
+                    .values(next_attempt_at=now + CLAIM_LEASE)
+                )
+                if result.rowcount:
+                    claimed.append(tuple(row))
+            await db.commit()
+        return claimed
+
+    async def _deliver(self, outbox_id: int, chat_id: int, text: str, attempts: int) -> tuple[int, dict]:
+        async with self._semaphore:
+            await self._limiter.wait(chat_id)
+            started = time.perf_counter()
+            try:
+                await self._bot.send_message(chat_id=chat_id, text=text)
+            except TelegramRetryAfter as exc:
+                telegram_latency.observe(time.perf_counter() - started, 'sendMessage', 'retry_after')
+                return outbox_id, self._retry_values(attempts, str(exc), delay=float(exc.retry_after))
+            except PERMANENT_ERRORS as exc:
+                telegram_latency.observe(time.perf_counter() - started, 'sendMessage', 'rejected')
+                logger.warning('Telegram notification %s rejected: %s', outbox_id, exc)
+                return outbox_id, {'status': NotificationStatus.failed, 'attempts': attempts + 1, 'last_error': str(exc)}
+            except Exception as exc:
+                telegram_latency.observe(time.perf_counter() - started, 'sendMessage', 'error')
+                logger.warning('Telegram notification %s failed: %s', outbox_id, exc)
+                return outbox_id, self._retry_values(attempts, str(exc))
+            telegram_latency.observe(time.perf_counter() - started, 'sendMessage', 'ok')
+        return outbox_id, {'status': NotificationStatus.sent, 'attempts': attempts + 1, 'sent_at': datetime.utcnow(), 'last_error': None}
+
+    def _retry_values(self, attempts: int, error: str, delay: float | None = None) -> dict:
+        attempts += 1
+        if attempts >= settings.notify_max_attempts:
+            return {'status': NotificationStatus.failed, 'attempts': attempts, 'last_error': error}
+        if delay is None:
+            delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+        return {
+            'status': NotificationStatus.pending,
+            'attempts': attempts,
+            'last_error': error,
+            'next_attempt_at': datetime.utcnow() + timedelta(seconds=delay),
+        }
+
+    async def _store_results(self, results: list[tuple[int, dict]]) -> None:
+        async with AsyncSessionLocal() as db:
+            for outbox_id, values in results:
+                await db.execute(update(NotificationOutbox).where(NotificationOutbox.id == outbox_id).values(**values))
+            await db.commit()
+
+
+notification_dispatcher = NotificationDispatcher()
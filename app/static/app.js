@@ -157,18 +157,12 @@ function navSetup() {
 }
 
 async function loadAll() {
-  const [tasks, todayInstances, weekInstances, settings, dashboard] = await Promise.all([
-    api('/tasks'),
-    api('/instances?scope=today').catch(() => []),
-    api('/instances?scope=week').catch(() => []),
-    api('/settings'),
-    api('/dashboard'),
-  ]);
-  state.tasks = tasks;
-  state.todayInstances = todayInstances;
-  state.weekInstances = weekInstances;
-  state.settings = settings;
-  state.dashboard = dashboard;
+  const data = await api('/bootstrap');
+  state.tasks = data.tasks;
+  state.todayInstances = data.today;
+  state.weekInstances = data.week;
+  state.settings = data.settings;
+  state.dashboard = { open_day: data.open_day, open_week: data.open_week };
   if (!state.dashboard?.open_day) clearLocalStart('day');
   if (!state.dashboard?.open_week) clearLocalStart('week');
 }
@@ -501,9 +495,18 @@ async function editTask(id) {
   await refreshAndRender();
 }
 
+// DELETE /stats and DELETE /tasks/{id} answer 202 with a purge job that runs in the background.
+async function waitForPurge(job) {
+  while (job.status === 'pending' || job.status === 'running') {
+    await new Promise((resolve) => setTimeout(resolve, 500));
+    job = await api(`/purges/${job.id}`);
+  }
+  if (job.status === 'failed') throw new Error(job.error || 'Deletion failed');
+}
+
 async function deleteTask(id) {
   if (!confirm('Delete task?')) return;
-  await api(`/tasks/${id}`, { method: 'DELETE' });
+  await waitForPurge(await api(`/tasks/${id}`, { method: 'DELETE' }));
   await refreshAndRender();
 }
 
@@ -632,7 +635,7 @@ function bindTouchDnDItem(item) {
 
 async function clearStats() {
   if (!confirm('Delete all statistics (instances and day/week sessions)?')) return;
-  await api('/stats', { method: 'DELETE' });
+  await waitForPurge(await api('/stats', { method: 'DELETE' }));
   state.activeStatsPeriod = null;
   state.statsDetail = null;
   clearLocalStart('day');
@@ -669,11 +672,26 @@ window.clearStats = clearStats;
 window.openStatsDetails = openStatsDetails;
 window.onStatusDetailsToggle = onStatusDetailsToggle;
 
+const LIVE_EVENTS = ['ready', 'resync', 'instance.updated', 'instance.added', 'day.opened', 'day.closed', 'week.opened', 'week.closed'];
+
+function connectEvents() {
+  // EventSource cannot send headers, so live updates need initData in the query string.
+  if (!state.tgInitData || !window.EventSource) return;
+  const source = new EventSource(`/api/events?initData=${encodeURIComponent(state.tgInitData)}`);
+  let timer = null;
+  const refresh = () => {
+    clearTimeout(timer);
+    timer = setTimeout(() => loadAll().then(renderAll).catch(() => {}), 300);
+  };
+  LIVE_EVENTS.forEach(name => source.addEventListener(name, refresh));
+}
+
 async function init() {
   loadLocalStarts();
   bootstrapAuth();
   navSetup();
   await refreshAndRender();
+  connectEvents();
 }
 
 init();
@@ -0,0 +1,109 @@
+"""Compare the sync (threadpool) and async database stacks under concurrent clients.
+
+Usage:
+    python -m benchmarks.async_vs_sync --clients 200 --requests 20
+
+Each client authenticates as its own user and repeatedly reads the Today
+list and flips an instance status, which is the hottest Mini App loop.
+The sync mode runs the domain calls on a 40-thread pool (Starlette's
+default), the async mode runs them on the event loop through AsyncSession.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--clients', type=int, default=200)
+parser.add_argument('--requests', type=int, default=20, help='requests per client')
+parser.add_argument('--tasks', type=int, default=10, help='daily tasks per user')
+parser.add_argument('--threads', type=int, default=40, help='threadpool size for the sync mode')
+parser.add_argument('--database-url', default=None, help='defaults to a fresh temporary SQLite file')
+args = parser.parse_args()
+
+if args.database_url:
+    os.environ['DATABASE_URL'] = args.database_url
+else:
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/bench.db'
+os.environ.setdefault('BOT_TOKEN', '')
+
+import anyio  # noqa: E402
+from anyio import to_thread  # noqa: E402
+
+from app.core.auth import _get_or_create_fake_user  # noqa: E402
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import AsyncSessionLocal, SessionLocal, async_engine  # noqa: E402
+from app.models.models import InstanceStatus, Task, TaskKind  # noqa: E402
+from app.services.domain import list_instances, start_day, update_instance_status  # noqa: E402
+
+STATUSES = [InstanceStatus.done, InstanceStatus.planned]
+
+
+def seed() -> None:
+    init_db()
+    with SessionLocal() as db:
+        for client in range(args.clients):
+            user = _get_or_create_fake_user(db, 900000 + client)
+            for idx in range(args.tasks):
+                db.add(Task(user_id=user.id, title=f'task {idx}', kind=TaskKind.daily, order_index=idx))
+            db.commit()
+            start_day(db, user)
+
+
+def client_step(db, telegram_user_id: int, step: int) -> None:
+    user = _get_or_create_fake_user(db, telegram_user_id)
+    instances = list_instances(db, user, 'today')
+    target = instances[step % len(instances)]
+    update_instance_status(db, user, target.id, STATUSES[step % 2])
+
+
+def sync_request(telegram_user_id: int, step: int) -> None:
+    with SessionLocal() as db:
+        client_step(db, telegram_user_id, step)
+
+
+async def async_request(telegram_user_id: int, step: int) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(client_step, telegram_user_id, step)
+
+
+async def run_mode(mode: str) -> dict:
+    limiter = anyio.CapacityLimiter(args.threads)
+    latencies: list[float] = []
+
+    async def client(idx: int) -> None:
+        for step in range(args.requests):
+            started = time.perf_counter()
+            if mode == 'sync':
+                await to_thread.run_sync(sync_request, 900000 + idx, step, limiter=limiter)
+            else:
+                await async_request(900000 + idx, step)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(idx) for idx in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+async def main() -> None:
+    seed()
+    for mode in ('sync', 'async'):
+        print(await run_mode(mode))
+    await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,196 @@
+"""Populate a database with realistic synthetic users, tasks and session history.
+
+Usage:
+    python -m benchmarks.datagen --users 1000 --months 3 --database-url sqlite:///./bench.db
+
+Each user gets a mix of daily, weekly and backlog tasks (some inactive,
+some with their own penalty) and ``--months`` of closed weeks and days,
+with a day skipped now and then and instances that are mostly done, a
+few canceled and the rest failed with the resolved penalty. The current
+week and day are left open, so a load test can start right away.
+Telegram ids are ``--first-telegram-id`` onwards, which is the range
+``benchmarks.loadtest`` authenticates as through X-Telegram-User-Id.
+The same ``--seed`` always produces the same data.
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--users', type=int, default=1000)
+parser.add_argument('--months', type=int, default=3)
+parser.add_argument('--first-telegram-id', type=int, default=5_000_000)
+parser.add_argument('--batch-users', type=int, default=200, help='users generated and inserted per transaction')
+parser.add_argument('--seed', type=int, default=1)
+parser.add_argument('--database-url', default=None, help='defaults to DATABASE_URL from the environment / .env')
+args = parser.parse_args()
+
+if args.database_url:
+    os.environ['DATABASE_URL'] = args.database_url
+os.environ.setdefault('BOT_TOKEN', '')
+
+from sqlalchemy import func, insert, select, text  # noqa: E402
+
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+from app.models.models import DaySession, Instance, Task, TelegramUser, UserSettings, WeekSession  # noqa: E402
+from app.services.stats_rollup import rebuild_stats_rollups  # noqa: E402
+
+TABLES = {'users': TelegramUser, 'settings': UserSettings, 'tasks': Task, 'weeks': WeekSession, 'days': DaySession, 'instances': Instance}
+
+STATUS_WEIGHTS = (('done', 70), ('canceled', 5), ('failed', 25))
+DAY_SKIP_PROBABILITY = 0.12
+
+
+class _Ids:
+    """Hands out primary keys up front so related rows can be inserted in bulk without round trips."""
+
+    def __init__(self, db, models) -> None:
+        self._next = {model: (db.scalar(select(func.max(model.id))) or 0) + 1 for model in models}
+
+    def take(self, model) -> int:
+        value = self._next[model]
+        self._next[model] = value + 1
+        return value
+
+
+def _pick_status(rng: random.Random) -> str:
+    roll = rng.uniform(0, 100)
+    for status, weight in STATUS_WEIGHTS:
+        if roll < weight:
+            return status
+        roll -= weight
+    return STATUS_WEIGHTS[-1][0]
+
+
+def _user_rows(rng: random.Random, ids: _Ids, telegram_user_id: int, now: datetime, months: int) -> dict[str, list[dict]]:
+    rows: dict[str, list[dict]] = {name: [] for name in TABLES}
+
+    user_id = ids.take(TelegramUser)
+    started = now - timedelta(days=30 * months)
+    # History starts with the week that day falls in; the user and the tasks exist from its first session on.
+    started = (started - timedelta(days=started.weekday())).replace(hour=6, minute=0, second=0, microsecond=0)
+    rows['users'].append(
+        {'id': user_id, 'telegram_user_id': telegram_user_id, 'username': f'bench_{telegram_user_id}', 'first_name': 'Bench', 'created_at': started}
+    )
+    daily_default = Decimal(rng.choice((5, 10, 20)))
+    weekly_default = daily_default * 2
+    rows['settings'].append(
+        {
+            'user_id': user_id,
+            'currency': rng.choice(('EUR', 'USD', 'RUB')),
+            'penalty_daily_default': daily_default,
+            'penalty_weekly_default': weekly_default,
+        }
+    )
+
+    tasks = []
+    for kind, count in (('daily', rng.randint(3, 10)), ('weekly', rng.randint(1, 4)), ('backlog', rng.randint(0, 6))):
+        for _ in range(count):
+            penalty = Decimal(rng.choice((5, 15, 50))) if rng.random() < 0.2 else None
+            task = {
+                'id': ids.take(Task),
+                'user_id': user_id,
+                'title': f'{kind} task {len(tasks) + 1}',
+                'kind': kind,
+                'is_active': rng.random() > 0.1,
+                'penalty_amount': penalty,
+                'order_index': len(tasks),
+                'created_at': started,
+            }
+            task['penalty'] = penalty if penalty is not None else (weekly_default if kind == 'weekly' else daily_default)
+            tasks.append(task)
+    rows['tasks'] = [{key: value for key, value in task.items() if key != 'penalty'} for task in tasks]
+    active = {kind: [task for task in tasks if task['kind'] == kind and task['is_active']] for kind in ('daily', 'weekly', 'backlog')}
+
+    def add_instances(session_tasks, created_at, day_id=None, week_id=None, open_session=False) -> None:
+        for task in session_tasks:
+            status = 'planned' if open_session and rng.random() < 0.6 else _pick_status(rng)
+            if open_session and status == 'failed':
+                status = 'planned'
+            rows['instances'].append(
+                {
+                    'id': ids.take(Instance),
+                    'user_id': user_id,
+                    'task_id': task['id'],
+                    'status': status,
+                    'penalty_applied': task['penalty'] if status == 'failed' else None,
+                    'day_session_id': day_id,
+                    'week_session_id': week_id,
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                }
+            )
+
+    week_start = started
+    while week_start <= now:
+        week_end = week_start + timedelta(days=7)
+        week_open = week_end > now
+        week_id = ids.take(WeekSession)
+        rows['weeks'].append({'id': week_id, 'user_id': user_id, 'started_at': week_start, 'closed_at': None if week_open else week_end})
+        weekly_tasks = active['weekly'] + rng.sample(active['backlog'], k=min(len(active['backlog']), rng.randint(0, 1)))
+        add_instances(weekly_tasks, week_start, week_id=week_id, open_session=week_open)
+
+        for offset in range(7):
+            day_start = week_start + timedelta(days=offset, minutes=rng.randint(0, 180))
+            is_today = day_start.date() == now.date()
+            if day_start > now:
+                if not is_today:
+                    break
+                day_start = now
+            if not is_today and rng.random() < DAY_SKIP_PROBABILITY:
+                continue
+            day_id = ids.take(DaySession)
+            closed_at = None if is_today else day_start + timedelta(hours=rng.randint(12, 16))
+            rows['days'].append({'id': day_id, 'user_id': user_id, 'week_session_id': week_id, 'started_at': day_start, 'closed_at': closed_at})
+            daily_tasks = active['daily'] + rng.sample(active['backlog'], k=min(len(active['backlog']), rng.randint(0, 2)))
+            add_instances(daily_tasks, day_start, day_id=day_id, open_session=is_today)
+        week_start = week_end
+    return rows
+
+
+def _sync_sequences(db) -> None:
+    """Move PostgreSQL's id sequences past the ids handed out by _Ids, so the API can insert after the run."""
+    if db.get_bind().dialect.name != 'postgresql':
+        return
+    for model in TABLES.values():
+        table = model.__tablename__
+        db.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 0) + 1, false) FROM {table}"))
+    db.commit()
+
+
+def generate(users: int, months: int, first_telegram_id: int, batch_users: int, seed: int) -> dict:
+    init_db()
+    now = datetime.utcnow()
+    totals = dict.fromkeys(TABLES, 0)
+    with SessionLocal() as db:
+        ids = _Ids(db, (TelegramUser, Task, WeekSession, DaySession, Instance))
+        for start in range(0, users, batch_users):
+            batch: dict[str, list[dict]] = {name: [] for name in TABLES}
+            for offset in range(start, min(start + batch_users, users)):
+                rng = random.Random(seed * 1_000_003 + offset)
+                for name, user_rows in _user_rows(rng, ids, first_telegram_id + offset, now, months).items():
+                    batch[name].extend(user_rows)
+            for name, model in TABLES.items():
+                if batch[name]:
+                    db.execute(insert(model), batch[name])
+                totals[name] += len(batch[name])
+            db.commit()
+            print(f'generated {min(start + batch_users, users)}/{users} users', flush=True)
+        _sync_sequences(db)
+        rebuild_stats_rollups(db)
+    return totals
+
+
+def main() -> None:
+    started = time.perf_counter()
+    totals = generate(args.users, args.months, args.first_telegram_id, args.batch_users, args.seed)
+    print({**totals, 'seconds': round(time.perf_counter() - started, 1)})
+
+
+if __name__ == '__main__':
+    main()
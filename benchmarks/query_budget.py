@@ -0,0 +1,142 @@
+"""Count SQL statements per API endpoint and fail when one exceeds its budget.
+
+Usage:
+    python -m benchmarks.query_budget
+
+Seeds one user with enough tasks and closed days that any per-row lazy
+load would blow far past the budget, calls every read endpoint and the
+instance writes (single and a whole day in one batch) through the ASGI
+app, revalidates a cached read with If-None-Match (which must be a 304
+answered by the authentication lookup alone), and counts the statements
+each request sends to the database (authentication included). Exits
+non-zero on any overrun so it can be wired into CI as a regression gate.
+"""
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/budget.db'
+os.environ.setdefault('BOT_TOKEN', '')
+os.environ['DEBUG_ALLOW_FAKE_AUTH'] = 'true'
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.db.session import async_engine, async_read_engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+HEADERS = {'X-Telegram-User-Id': '424242'}
+DAILY_TASKS = 40
+WEEKLY_TASKS = 10
+CLOSED_DAYS = 6
+
+# Statements per request, authentication lookup included.
+BUDGETS = {
+    'GET /auth/me': 1,
+    'GET /bootstrap': 6,
+    'GET /dashboard': 3,
+    'GET /tasks': 2,
+    'GET /settings': 2,
+    'GET /instances?scope=today': 3,
+    'GET /instances?scope=week': 3,
+    'GET /instances?scope=history': 2,
+    'GET /instances?scope=history&limit=50&cursor': 2,
+    'GET /bootstrap If-None-Match': 1,
+    'PUT /instances/{id}/status': 6,
+    'PUT /instances/status (whole day)': 6,
+    'POST /instances/add_backlog': 7,
+    'GET /stats?period=days': 2,
+    'GET /stats/details?period=weeks': 3,
+}
+
+
+class StatementCounter:
+    def __init__(self) -> None:
+        self.count = 0
+        for engine in {async_engine.sync_engine, async_read_engine.sync_engine}:
+            event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        if statement.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+            self.count += 1
+
+    @contextmanager
+    def measure(self):
+        result = {}
+        start = self.count
+        yield result
+        result['statements'] = self.count - start
+
+
+def seed(client: TestClient) -> None:
+    for idx in range(DAILY_TASKS):
+        client.post('/api/tasks', json={'title': f'daily {idx}', 'kind': 'daily'}, headers=HEADERS)
+    for idx in range(WEEKLY_TASKS):
+        client.post('/api/tasks', json={'title': f'weekly {idx}', 'kind': 'weekly'}, headers=HEADERS)
+    client.post('/api/tasks', json={'title': 'backlog', 'kind': 'backlog'}, headers=HEADERS)
+    client.post('/api/sessions/start_week', headers=HEADERS)
+    for _ in range(CLOSED_DAYS):
+        client.post('/api/sessions/start_day', headers=HEADERS)
+        client.post('/api/sessions/close_day', headers=HEADERS)
+    client.post('/api/sessions/start_day', headers=HEADERS)
+
+
+def main() -> int:
+    failures = 0
+    with TestClient(app) as client:
+        seed(client)
+        counter = StatementCounter()
+        today = client.get('/api/instances?scope=today', headers=HEADERS).json()
+        backlog_id = next(task['id'] for task in client.get('/api/tasks', headers=HEADERS).json() if task['kind'] == 'backlog')
+        cursor = client.get('/api/instances?scope=history&limit=50', headers=HEADERS).headers['X-Next-Cursor']
+        etag = client.get('/api/bootstrap', headers=HEADERS).headers['ETag']
+
+        calls = {
+            'GET /auth/me': lambda: client.get('/api/auth/me', headers=HEADERS),
+            'GET /bootstrap': lambda: client.get('/api/bootstrap', headers=HEADERS),
+            'GET /dashboard': lambda: client.get('/api/dashboard', headers=HEADERS),
+            'GET /tasks': lambda: client.get('/api/tasks', headers=HEADERS),
+            'GET /settings': lambda: client.get('/api/settings', headers=HEADERS),
+            'GET /instances?scope=today': lambda: client.get('/api/instances?scope=today', headers=HEADERS),
+            'GET /instances?scope=week': lambda: client.get('/api/instances?scope=week', headers=HEADERS),
+            'GET /instances?scope=history': lambda: client.get('/api/instances?scope=history', headers=HEADERS),
+            'GET /instances?scope=history&limit=50&cursor': lambda: client.get(
+                f'/api/instances?scope=history&limit=50&cursor={cursor}', headers=HEADERS
+            ),
+            'GET /bootstrap If-None-Match': lambda: client.get('/api/bootstrap', headers={**HEADERS, 'If-None-Match': etag}),
+            'PUT /instances/{id}/status': lambda: client.put(
+                f'/api/instances/{today[0]["id"]}/status', json={'status': 'failed'}, headers=HEADERS
+            ),
+            'PUT /instances/status (whole day)': lambda: client.put(
+                '/api/instances/status',
+                json={'changes': [{'instance_id': inst['id'], 'status': 'done'} for inst in today]},
+                headers=HEADERS,
+            ),
+            'POST /instances/add_backlog': lambda: client.post(
+                '/api/instances/add_backlog', json={'task_id': backlog_id, 'scope': 'today'}, headers=HEADERS
+            ),
+            'GET /stats?period=days': lambda: client.get('/api/stats?period=days', headers=HEADERS),
+            'GET /stats/details?period=weeks': lambda: client.get('/api/stats/details?period=weeks', headers=HEADERS),
+        }
+
+        for name, call in calls.items():
+            with counter.measure() as result:
+                response = call()
+            budget = BUDGETS[name]
+            expected_status = 304 if 'If-None-Match' in name else 200
+            if response.status_code != expected_status:
+                failures += 1
+                print(f'FAIL {name}: HTTP {response.status_code} {response.text[:200]}')
+            elif result['statements'] > budget:
+                failures += 1
+                print(f'FAIL {name}: {result["statements"]} statements (budget {budget})')
+            else:
+                print(f'ok   {name}: {result["statements"]} statements (budget {budget})')
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Run EXPLAIN QUERY PLAN for every statement the domain layer issues and fail on full scans.
+
+Usage:
+    python -m benchmarks.query_plans
+
+Exits non-zero when a query against a history table (instances,
+day_sessions, week_sessions, tasks, archived_sessions) degrades to a table scan or needs a
+temporary B-tree to sort, so it can be wired into CI as a regression gate.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/plans.db'
+os.environ.setdefault('BOT_TOKEN', '')
+
+from sqlalchemy import event  # noqa: E402
+
+from app.core.auth import _get_or_create_fake_user  # noqa: E402
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.models.models import InstanceStatus, Task, TaskKind  # noqa: E402
+from app.services import archive, domain, purge  # noqa: E402
+
+HISTORY_TABLES = ('instances', 'day_sessions', 'week_sessions', 'tasks', 'archived_sessions')
+
+# Sorting the handful of rows of one open session by task order is expected.
+ALLOWED_SORTS = {
+    'list_instances(today)',
+    'list_instances(week)',
+    'bootstrap_state',
+}
+
+
+def _bad_plan_lines(plan: list[str], allow_sort: bool) -> list[str]:
+    bad = []
+    for line in plan:
+        if line.startswith('SCAN ') and line.split()[1] in HISTORY_TABLES and 'COVERING INDEX' not in line:
+            bad.append(line)
+        if 'USE TEMP B-TREE FOR' in line and 'ORDER BY' in line and not allow_sort:
+            bad.append(line)
+    return bad
+
+
+def _purge(db, user_id: int, kind: str, task_id: int | None = None) -> None:
+    job = purge.start_purge(db, user_id, kind, task_id)
+    db.commit()
+    purge.claim_job(db)
+    while not purge.purge_step(db, job.id):
+        pass
+
+
+def main() -> int:
+    init_db()
+    captured: list[tuple[str, tuple]] = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _capture(conn, cursor, statement, parameters, context, executemany) -> None:
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT')):
+            captured.append((statement, parameters))
+
+    failures = 0
+    with SessionLocal() as db:
+        user = _get_or_create_fake_user(db, 1)
+        db.add_all(
+            [
+                Task(user_id=user.id, title='daily', kind=TaskKind.daily, order_index=0),
+                Task(user_id=user.id, title='weekly', kind=TaskKind.weekly, order_index=1),
+                Task(user_id=user.id, title='backlog', kind=TaskKind.backlog, order_index=2),
+            ]
+        )
+        db.commit()
+        backlog_id = db.query(Task.id).filter(Task.kind == TaskKind.backlog).scalar()
+        daily_id = db.query(Task.id).filter(Task.kind == TaskKind.daily).scalar()
+
+        instance_ids: list[int] = []
+        calls = [
+            ('start_week', lambda: domain.start_week(db, user)),
+            ('start_day', lambda: domain.start_day(db, user)),
+            ('get_open_day', lambda: domain.get_open_day(db, user.id)),
+            ('get_open_week', lambda: domain.get_open_week(db, user.id)),
+            ('add_backlog_to_scope', lambda: domain.add_backlog_to_scope(db, user, backlog_id, 'today')),
+            ('list_instances(today)', lambda: instance_ids.extend(inst.id for inst in domain.list_instances(db, user, 'today'))),
+            ('list_instances(week)', lambda: domain.list_instances(db, user, 'week')),
+            ('bootstrap_state', lambda: domain.bootstrap_state(db, user.id)),
+            ('list_instances(history)', lambda: domain.list_instances(db, user, 'history')),
+            ('list_history(cursor)', lambda: domain.list_history(db, user, domain.encode_cursor(datetime.utcnow(), 1), 50)),
+            ('update_instance_status', lambda: domain.update_instance_status(db, user, instance_ids[0], InstanceStatus.done)),
+            ('close_day', lambda: domain.close_day(db, user)),
+            ('close_week', lambda: domain.close_week(db, user)),
+            ('stats_penalty', lambda: domain.stats_penalty(db, user.id, 'days')),
+            ('stats_details', lambda: domain.stats_details(db, user, 'weeks')),
+            ('stats_details(cursor)', lambda: domain.stats_details(db, user, 'months', domain.encode_cursor(datetime.utcnow(), 1), 50)),
+            ('archive_sessions', lambda: archive.archive_sessions(db, datetime.utcnow() + timedelta(days=1), 100)),
+            ('list_history(archived)', lambda: domain.list_history(db, user)),
+            ('list_history(archived, cursor)', lambda: domain.list_history(db, user, domain.encode_cursor(datetime.utcnow(), 1), 50)),
+            ('stats_details(archived)', lambda: domain.stats_details(db, user, 'days')),
+            ('start_day(after archive)', lambda: domain.start_day(db, user)),
+            ('purge(task)', lambda: _purge(db, user.id, 'task', daily_id)),
+            ('purge(stats)', lambda: _purge(db, user.id, 'stats')),
+        ]
+
+        for name, call in calls:
+            captured.clear()
+            call()
+            statements = list(captured)
+            call_failures = 0
+            for statement, parameters in statements:
+                with engine.connect() as conn:
+                    rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+                plan = [row[-1] for row in rows]
+                if _bad_plan_lines(plan, allow_sort=name in ALLOWED_SORTS):
+                    call_failures += 1
+                    print(f'FAIL {name}: {" ".join(statement.split())}')
+                    for line in plan:
+                        print(f'    {line}')
+            if not call_failures:
+                print(f'ok   {name} ({len(statements)} statements)')
+            failures += call_failures
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
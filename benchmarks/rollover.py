@@ -0,0 +1,72 @@
+"""Time day/week rollover for users with hundreds of tasks.
+
+Usage:
+    python -m benchmarks.rollover --users 20 --tasks 500
+
+Every user gets ``--tasks`` active tasks (two thirds daily, one third
+weekly). The script then times start_week, start_day, close_day and
+close_week per user and prints mean and p95 latency for each step.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--users', type=int, default=20)
+parser.add_argument('--tasks', type=int, default=500, help='active tasks per user')
+parser.add_argument('--rounds', type=int, default=3, help='day/week cycles per user')
+parser.add_argument('--database-url', default=None, help='defaults to a fresh temporary SQLite file')
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{tempfile.mkdtemp()}/rollover.db'
+os.environ.setdefault('BOT_TOKEN', '')
+
+from app.core.auth import _get_or_create_fake_user  # noqa: E402
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+from app.models.models import Task, TaskKind  # noqa: E402
+from app.services.domain import close_day, close_week, start_day, start_week  # noqa: E402
+
+STEPS = [('start_week', start_week), ('start_day', start_day), ('close_day', close_day), ('close_week', close_week)]
+
+
+def main() -> None:
+    init_db()
+    timings: dict[str, list[float]] = {name: [] for name, _ in STEPS}
+    with SessionLocal() as db:
+        users = []
+        for idx in range(args.users):
+            user = _get_or_create_fake_user(db, 800000 + idx)
+            db.add_all(
+                Task(
+                    user_id=user.id,
+                    title=f'task {n}',
+                    kind=TaskKind.weekly if n % 3 == 0 else TaskKind.daily,
+                    order_index=n,
+                    penalty_amount=5 if n % 4 == 0 else None,
+                )
+                for n in range(args.tasks)
+            )
+            users.append(user)
+        db.commit()
+
+        for _ in range(args.rounds):
+            for user in users:
+                for name, step in STEPS:
+                    started = time.perf_counter()
+                    step(db, user)
+                    timings[name].append(time.perf_counter() - started)
+
+    for name, values in timings.items():
+        values.sort()
+        print(
+            f'{name:<11} mean {statistics.mean(values) * 1000:8.2f} ms'
+            f'   p95 {values[int(len(values) * 0.95) - 1] * 1000:8.2f} ms   ({len(values)} runs, {args.tasks} tasks/user)'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Time one scheduled rollover pass over many users.
+
+Usage:
+    python -m benchmarks.scheduler --users 100000 --tasks 8
+
+Seeds ``--users`` users with ``--tasks`` active tasks each (daily and
+weekly), opens a day and a week for every user that started before the
+last boundary, then runs the scheduler's rollover once and prints its
+progress and lag metrics.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--users', type=int, default=10000)
+parser.add_argument('--tasks', type=int, default=8, help='active tasks per user')
+parser.add_argument('--database-url', default=None, help='defaults to a fresh temporary SQLite file')
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{tempfile.mkdtemp()}/scheduler.db'
+os.environ.setdefault('BOT_TOKEN', '')
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import SessionLocal, dispose_engines  # noqa: E402
+from app.models.models import (  # noqa: E402
+    DaySession,
+    Instance,
+    InstanceStatus,
+    Task,
+    TaskKind,
+    TelegramUser,
+    UserSettings,
+    WeekSession,
+)
+from app.services.rollover import run_rollover  # noqa: E402
+from app.services.stats_rollup import rebuild_stats_rollups  # noqa: E402
+
+
+def seed() -> None:
+    init_db()
+    started = datetime.utcnow() - timedelta(days=8)
+    with SessionLocal() as db:
+        db.execute(insert(TelegramUser), [{'telegram_user_id': 1_000_000 + n, 'first_name': 'Bench'} for n in range(args.users)])
+        user_ids = db.scalars(select(TelegramUser.id)).all()
+        db.execute(
+            insert(UserSettings),
+            [
+                {'user_id': uid, 'currency': 'EUR', 'penalty_daily_default': 10, 'penalty_weekly_default': 20, 'auto_rollover': True}
+                for uid in user_ids
+            ],
+        )
+        db.execute(
+            insert(Task),
+            [
+                {
+                    'user_id': uid,
+                    'title': f'task {n}',
+                    'kind': TaskKind.weekly if n % 4 == 0 else TaskKind.daily,
+                    'is_active': True,
+                    'order_index': n,
+                }
+                for uid in user_ids
+                for n in range(args.tasks)
+            ],
+        )
+        db.execute(insert(WeekSession), [{'user_id': uid, 'started_at': started} for uid in user_ids])
+        week_ids = dict(db.execute(select(WeekSession.user_id, WeekSession.id)).all())
+        db.execute(insert(DaySession), [{'user_id': uid, 'week_session_id': week_ids[uid], 'started_at': started} for uid in user_ids])
+        day_ids = dict(db.execute(select(DaySession.user_id, DaySession.id)).all())
+        tasks = db.execute(select(Task.user_id, Task.id, Task.kind)).all()
+        db.execute(
+            insert(Instance),
+            [
+                {
+                    'user_id': uid,
+                    'task_id': task_id,
+                    'status': InstanceStatus.planned,
+                    'day_session_id': day_ids[uid] if kind == TaskKind.daily else None,
+                    'week_session_id': week_ids[uid] if kind == TaskKind.weekly else None,
+                    'created_at': started,
+                }
+                for uid, task_id, kind in tasks
+            ],
+        )
+        db.commit()
+        rebuild_stats_rollups(db)
+
+
+async def main() -> None:
+    started = time.perf_counter()
+    seed()
+    print(f'seeded {args.users} users in {time.perf_counter() - started:.1f}s')
+    metrics = await run_rollover()
+    print(metrics.as_dict())
+    print(f'{metrics.processed_users / max(metrics.finished_at - metrics.started_at, 1e-9):.0f} users/s')
+    await dispose_engines()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""Compare FastAPI's response_model path with the direct JSON encoding used by list endpoints.
+
+Usage:
+    python -m benchmarks.serialization --rows 200 --repeat 300
+
+Builds ``--rows`` instance rows and stats detail rows shaped like the
+database returns them and encodes them both ways. The response_model path
+is what the endpoints used to do: build pydantic objects, let FastAPI
+validate and dump them against response_model, then json.dumps them in
+JSONResponse. The direct path hands the dicts to app.api.responses.dump_json.
+It checks that both produce identical bytes before timing them.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+os.environ.setdefault('BOT_TOKEN', '')
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from app.api.responses import dump_json  # noqa: E402
+from app.models.models import InstanceStatus, TaskKind  # noqa: E402
+from app.schemas.common import InstanceOut, StatsDetailsOut  # noqa: E402
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--rows', type=int, default=200)
+parser.add_argument('--repeat', type=int, default=300)
+args = parser.parse_args()
+
+STATUSES = list(InstanceStatus)
+loop = asyncio.new_event_loop()
+
+
+def instance_rows(count: int) -> list[dict]:
+    started = datetime(2026, 1, 5, 6, 30, 12, 345678)
+    return [
+        {
+            'id': idx + 1,
+            'task_id': idx % 17 + 1,
+            'task_title': f'Задача {idx % 17}',
+            'task_kind': TaskKind.daily,
+            'status': STATUSES[idx % 4],
+            'penalty_applied': Decimal('10.00') if STATUSES[idx % 4] == InstanceStatus.failed else None,
+            'day_session_id': idx // 17 + 1,
+            'week_session_id': None,
+            'created_at': started + timedelta(hours=idx),
+        }
+        for idx in range(count)
+    ]
+
+
+def stats_details(count: int) -> dict:
+    rows = instance_rows(count)
+    return {
+        'period': 'days',
+        'total_penalty': Decimal('1230.00'),
+        'status_counts': {'planned': 3, 'done': 120, 'canceled': 7, 'failed': 70},
+        'rows': [
+            {'task_title': row['task_title'], 'status': row['status'], 'started_at': row['created_at'], 'total_penalty': Decimal('10.00')}
+            for row in rows
+        ],
+        'next_cursor': 'MjAyNi0wMS0wNVQwNjozMDoxMi4zNDU2Nzg6MjAw',
+    }
+
+
+def via_response_model(field, content) -> bytes:
+    serialized = loop.run_until_complete(serialize_response(field=field, response_content=content, is_coroutine=True))
+    return JSONResponse(serialized).body
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main() -> None:
+    cases = {
+        'GET /instances': (
+            list[InstanceOut],
+            lambda rows=instance_rows(args.rows): [InstanceOut(**row) for row in rows],
+            lambda rows=instance_rows(args.rows): rows,
+        ),
+        'GET /stats/details': (
+            StatsDetailsOut,
+            lambda data=stats_details(args.rows): data,
+            lambda data=stats_details(args.rows): data,
+        ),
+    }
+
+    print(f'{args.rows} rows, mean of {args.repeat} runs')
+    print(f'{"endpoint":<22} {"response_model ms":>18} {"direct ms":>10} {"speedup":>8}')
+    for name, (annotation, old_content, new_content) in cases.items():
+        # FastAPI builds the response field once per route.
+        field = create_model_field(name='Response', type_=annotation, mode='serialization')
+        old_bytes = via_response_model(field, old_content())
+        new_bytes = dump_json(annotation, new_content())
+        if old_bytes != new_bytes:
+            raise SystemExit(f'{name}: encodings differ\n{old_bytes[:300]}\n{new_bytes[:300]}')
+        old_ms = timed(lambda: via_response_model(field, old_content()), args.repeat)
+        new_ms = timed(lambda: dump_json(annotation, new_content()), args.repeat)
+        print(f'{name:<22} {old_ms:>18.3f} {new_ms:>10.3f} {old_ms / new_ms:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
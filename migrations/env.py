@@ -0,0 +1,58 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.core.config import settings
+from app.db.base import Base
+import app.models.models  # noqa: F401
+
+config = context.config
+# init_db passes its own connection and leaves logging to the application.
+if config.config_file_name is not None and 'connection' not in config.attributes:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+
+def _configure(**kwargs) -> None:
+    # SQLite cannot ALTER most things: batch operations copy the table instead.
+    context.configure(target_metadata=Base.metadata, render_as_batch=True, **kwargs)
+
+
+def run_migrations_offline() -> None:
+    _configure(url=settings.database_url, literal_binds=True, dialect_opts={'paramstyle': 'named'})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run(connection) -> None:
+    is_sqlite = connection.dialect.name == 'sqlite'
+    if is_sqlite:
+        # Copying a table ends with dropping the original, which would cascade into its children.
+        # The pragma is ignored inside a transaction, so it is set before the migration begins one.
+        connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+        connection.commit()
+    try:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+    finally:
+        if is_sqlite:
+            connection.rollback()
+            connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+            connection.commit()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        _run(connection)
+        return
+    from app.db.session import engine
+
+    with engine.connect() as connection:
+        _run(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
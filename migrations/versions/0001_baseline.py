@@ -0,0 +1,117 @@
+"""Baseline: the schema of the first release, before tasks.order_index
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+TASK_KIND = sa.Enum('daily', 'weekly', 'backlog', name='taskkind')
+INSTANCE_STATUS = sa.Enum('planned', 'done', 'canceled', 'failed', name='instancestatus')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'telegram_users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('telegram_user_id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=64), nullable=True),
+        sa.Column('first_name', sa.String(length=128), nullable=True),
+        sa.Column('last_name', sa.String(length=128), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_telegram_users_id', 'telegram_users', ['id'])
+    op.create_index('ix_telegram_users_telegram_user_id', 'telegram_users', ['telegram_user_id'], unique=True)
+
+    op.create_table(
+        'user_settings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('currency', sa.String(length=8), nullable=False),
+        sa.Column('penalty_daily_default', sa.Numeric(10, 2), nullable=False),
+        sa.Column('penalty_weekly_default', sa.Numeric(10, 2), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['telegram_users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_user_settings_user_id', 'user_settings', ['user_id'], unique=True)
+
+    op.create_table(
+        'tasks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=255), nullable=False),
+        sa.Column('kind', TASK_KIND, nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('penalty_amount', sa.Numeric(10, 2), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['telegram_users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_tasks_user_id', 'tasks', ['user_id'])
+    op.create_index('ix_tasks_kind', 'tasks', ['kind'])
+
+    op.create_table(
+        'week_sessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('closed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['telegram_users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_week_sessions_user_id', 'week_sessions', ['user_id'])
+
+    op.create_table(
+        'day_sessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('week_session_id', sa.Integer(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('closed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['telegram_users.id']),
+        sa.ForeignKeyConstraint(['week_session_id'], ['week_sessions.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_day_sessions_user_id', 'day_sessions', ['user_id'])
+    op.create_index('ix_day_sessions_week_session_id', 'day_sessions', ['week_session_id'])
+
+    op.create_table(
+        'instances',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('status', INSTANCE_STATUS, nullable=False),
+        sa.Column('penalty_applied', sa.Numeric(10, 2), nullable=True),
+        sa.Column('day_session_id', sa.Integer(), nullable=True),
+        sa.Column('week_session_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['telegram_users.id']),
+        sa.ForeignKeyConstraint(['task_id'], ['tasks.id']),
+        sa.ForeignKeyConstraint(['day_session_id'], ['day_sessions.id']),
+        sa.ForeignKeyConstraint(['week_session_id'], ['week_sessions.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('task_id', 'day_session_id', name='uq_task_day_session'),
+        sa.UniqueConstraint('task_id', 'week_session_id', name='uq_task_week_session'),
+    )
+    op.create_index('ix_instances_user_id', 'instances', ['user_id'])
+    op.create_index('ix_instances_task_id', 'instances', ['task_id'])
+    op.create_index('ix_instances_status', 'instances', ['status'])
+    op.create_index('ix_instances_day_session_id', 'instances', ['day_session_id'])
+    op.create_index('ix_instances_week_session_id', 'instances', ['week_session_id'])
+
+
+def downgrade() -> None:
+    for table in ('instances', 'day_sessions', 'week_sessions', 'tasks', 'user_settings', 'telegram_users'):
+        op.drop_table(table)
+    INSTANCE_STATUS.drop(op.get_bind(), checkfirst=True)
+    TASK_KIND.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,25 @@
+"""tasks.order_index: user-defined task order (was an ALTER TABLE in init_db)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('order_index', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index('ix_tasks_order_index', 'tasks', ['order_index'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_order_index', table_name='tasks')
+    with op.batch_alter_table('tasks') as batch:
+        batch.drop_column('order_index')
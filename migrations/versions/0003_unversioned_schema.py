@@ -0,0 +1,238 @@
+"""Everything init_db added to existing databases before migrations existed
+
+Stats rollups, the notification outbox, idempotent responses, the archive
+and purge jobs; the user columns for ETags, the settings cache and the
+archive; the user_settings columns for timezones and rollover; the
+history indexes; one open session per user; ON DELETE actions on every
+foreign key. Databases from those releases are stamped 0002 and may
+already have any part of it, so each step checks first.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+STATUSES = ('planned', 'done', 'canceled', 'failed')
+
+ADDED_COLUMNS = {
+    'telegram_users': [
+        sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('settings_version', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('archived_until', sa.DateTime(), nullable=True),
+    ],
+    'user_settings': [
+        sa.Column('timezone', sa.String(length=64), nullable=False, server_default='UTC'),
+        sa.Column('day_start_hour', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('week_start_day', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('auto_rollover', sa.Boolean(), nullable=False, server_default=sa.true()),
+    ],
+}
+
+
+def _user_id() -> sa.Column:
+    return sa.Column('user_id', sa.Integer(), sa.ForeignKey('telegram_users.id', ondelete='CASCADE'), nullable=False)
+
+
+TABLES = {
+    'stats_rollups': lambda: (
+        sa.Column('id', sa.Integer(), primary_key=True),
+        _user_id(),
+        sa.Column('kind', sa.String(length=8), nullable=False),
+        sa.Column('bucket', sa.Date(), nullable=False),
+        *(sa.Column(f'{status}_count', sa.Integer(), nullable=False) for status in STATUSES),
+        sa.Column('total_penalty', sa.Numeric(12, 2), nullable=False),
+        sa.UniqueConstraint('user_id', 'kind', 'bucket', name='uq_stats_rollup_bucket'),
+    ),
+    'notification_outbox': lambda: (
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('chat_id', sa.Integer(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('status', sa.Enum('pending', 'sent', 'failed', name='notificationstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+    ),
+    'idempotent_responses': lambda: (
+        sa.Column('id', sa.Integer(), primary_key=True),
+        _user_id(),
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('request', sa.String(length=255), nullable=False),
+        sa.Column('status_code', sa.Integer(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.UniqueConstraint('user_id', 'key', name='uq_idempotent_response_key'),
+    ),
+    'archived_sessions': lambda: (
+        sa.Column('id', sa.Integer(), primary_key=True),
+        _user_id(),
+        sa.Column('kind', sa.String(length=8), nullable=False),
+        sa.Column('session_id', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('closed_at', sa.DateTime(), nullable=False),
+        sa.Column('first_created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_created_at', sa.DateTime(), nullable=False),
+        sa.Column('instance_count', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+    ),
+    'purge_jobs': lambda: (
+        sa.Column('id', sa.Integer(), primary_key=True),
+        _user_id(),
+        sa.Column('kind', sa.String(length=8), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.Enum('pending', 'running', 'done', 'failed', name='purgestatus'), nullable=False),
+        sa.Column('max_instance_id', sa.Integer(), nullable=False),
+        sa.Column('max_day_session_id', sa.Integer(), nullable=False),
+        sa.Column('max_week_session_id', sa.Integer(), nullable=False),
+        sa.Column('archive_cursor', sa.Integer(), nullable=False),
+        sa.Column('deleted_count', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    ),
+}
+
+OPEN_SESSION = sa.text('closed_at IS NULL')
+
+# name -> (table, columns, options)
+INDEXES = {
+    'ix_tasks_user_kind_active': ('tasks', ['user_id', 'kind', 'is_active'], {}),
+    'ix_tasks_user_order': ('tasks', ['user_id', 'order_index', 'created_at'], {}),
+    'uq_week_sessions_open': ('week_sessions', ['user_id'], {'unique': True, 'sqlite_where': OPEN_SESSION, 'postgresql_where': OPEN_SESSION}),
+    'ix_week_sessions_closed': ('week_sessions', ['closed_at'], {}),
+    'uq_day_sessions_open': ('day_sessions', ['user_id'], {'unique': True, 'sqlite_where': OPEN_SESSION, 'postgresql_where': OPEN_SESSION}),
+    'ix_day_sessions_closed': ('day_sessions', ['closed_at'], {}),
+    'ix_instances_user_day_status': ('instances', ['user_id', 'day_session_id', 'status'], {}),
+    'ix_instances_user_week_status': ('instances', ['user_id', 'week_session_id', 'status'], {}),
+    'ix_instances_user_created': ('instances', ['user_id', 'created_at', 'id'], {}),
+    'ix_notification_outbox_due': ('notification_outbox', ['status', 'next_attempt_at'], {}),
+    'ix_idempotent_responses_created_at': ('idempotent_responses', ['created_at'], {}),
+    'ix_archived_sessions_user_last': ('archived_sessions', ['user_id', 'last_created_at', 'id'], {}),
+    'ix_archived_sessions_user_kind_last': ('archived_sessions', ['user_id', 'kind', 'last_created_at', 'id'], {}),
+    'ix_archived_sessions_user_id': ('archived_sessions', ['user_id', 'id'], {}),
+    'ix_purge_jobs_status': ('purge_jobs', ['status', 'updated_at'], {}),
+    'ix_purge_jobs_user': ('purge_jobs', ['user_id', 'kind', 'status'], {}),
+}
+
+# Replaced by the composite indexes above; *_sessions_open were non-unique and partial.
+OBSOLETE_INDEXES = {
+    'ix_instances_user_id': 'instances',
+    'ix_instances_status': 'instances',
+    'ix_week_sessions_open': 'week_sessions',
+    'ix_day_sessions_open': 'day_sessions',
+}
+
+# table -> [(column, referred table, ON DELETE)]
+FOREIGN_KEYS = {
+    'user_settings': [('user_id', 'telegram_users', 'CASCADE')],
+    'tasks': [('user_id', 'telegram_users', 'CASCADE')],
+    'week_sessions': [('user_id', 'telegram_users', 'CASCADE')],
+    'day_sessions': [('user_id', 'telegram_users', 'CASCADE'), ('week_session_id', 'week_sessions', 'SET NULL')],
+    'instances': [
+        ('user_id', 'telegram_users', 'CASCADE'),
+        ('task_id', 'tasks', 'CASCADE'),
+        ('day_session_id', 'day_sessions', 'CASCADE'),
+        ('week_session_id', 'week_sessions', 'CASCADE'),
+    ],
+    'stats_rollups': [('user_id', 'telegram_users', 'CASCADE')],
+    'idempotent_responses': [('user_id', 'telegram_users', 'CASCADE')],
+    'archived_sessions': [('user_id', 'telegram_users', 'CASCADE')],
+}
+
+# PostgreSQL's default constraint names; SQLite's unnamed ones get the same through the batch naming convention.
+FK_NAMING = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def _set_foreign_keys(table: str, wanted: list[tuple[str, str, str]]) -> None:
+    existing = {
+        fk['constrained_columns'][0]: (fk['options'].get('ondelete') or 'NO ACTION').upper()
+        for fk in _inspector().get_foreign_keys(table)
+    }
+    stale = [(column, referred, ondelete) for column, referred, ondelete in wanted if existing.get(column) != ondelete]
+    if not stale:
+        return
+    with op.batch_alter_table(table, naming_convention=FK_NAMING) as batch:
+        for column, referred, ondelete in stale:
+            name = f'{table}_{column}_fkey'
+            if column in existing:
+                batch.drop_constraint(name, type_='foreignkey')
+            batch.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def _populate_rollups() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        bucket = "CAST(date_trunc('month', created_at) AS DATE)"
+    else:
+        bucket = "strftime('%Y-%m-01', created_at)"
+    counts = ', '.join(f"SUM(CASE WHEN status = '{status}' THEN 1 ELSE 0 END)" for status in STATUSES)
+    op.execute(
+        'INSERT INTO stats_rollups (user_id, kind, bucket, planned_count, done_count, canceled_count, failed_count, total_penalty) '
+        f"SELECT user_id, CASE WHEN day_session_id IS NOT NULL THEN 'day' ELSE 'week' END, {bucket}, {counts}, "
+        'COALESCE(SUM(penalty_applied), 0) FROM instances GROUP BY 1, 2, 3'
+    )
+
+
+def upgrade() -> None:
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {column['name'] for column in _inspector().get_columns(table)}
+        for column in columns:
+            if column.name not in existing:
+                op.add_column(table, column)
+
+    created = set()
+    for table, columns in TABLES.items():
+        if not _inspector().has_table(table):
+            op.create_table(table, *columns())
+            created.add(table)
+
+    # Partial indexes are dropped before the tables are copied below and created again at the end.
+    for name, table in {**OBSOLETE_INDEXES, 'uq_week_sessions_open': 'week_sessions', 'uq_day_sessions_open': 'day_sessions'}.items():
+        if name in {index['name'] for index in _inspector().get_indexes(table)}:
+            op.drop_index(name, table_name=table)
+
+    for table, wanted in FOREIGN_KEYS.items():
+        _set_foreign_keys(table, wanted)
+
+    # uq_*_sessions_open allows one open session per user: close duplicates older races left behind.
+    for table in ('week_sessions', 'day_sessions'):
+        op.execute(
+            f'UPDATE {table} SET closed_at = started_at WHERE closed_at IS NULL '
+            f'AND id NOT IN (SELECT max(id) FROM {table} WHERE closed_at IS NULL GROUP BY user_id)'
+        )
+
+    for name, (table, columns, options) in INDEXES.items():
+        if name not in {index['name'] for index in _inspector().get_indexes(table)}:
+            op.create_index(name, table, columns, **options)
+
+    if 'stats_rollups' in created:
+        _populate_rollups()
+
+
+def downgrade() -> None:
+    for name, (table, _, _) in INDEXES.items():
+        if table not in TABLES:
+            op.drop_index(name, table_name=table)
+    op.create_index('ix_instances_user_id', 'instances', ['user_id'])
+    op.create_index('ix_instances_status', 'instances', ['status'])
+    for table in reversed(TABLES):
+        op.drop_table(table)
+    for table, columns in ADDED_COLUMNS.items():
+        with op.batch_alter_table(table) as batch:
+            for column in columns:
+                batch.drop_column(column.name)
+    for name in ('notificationstatus', 'purgestatus'):
+        sa.Enum(name=name).drop(op.get_bind(), checkfirst=True)
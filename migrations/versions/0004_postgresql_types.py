@@ -0,0 +1,47 @@
+"""64-bit Telegram ids and instance ids, BRIN index for idempotent_responses on PostgreSQL
+
+Telegram user and chat ids no longer fit a 32-bit integer, and instances
+is the table whose ids grow fastest. SQLite stores 64-bit integers in any
+INTEGER column and has no BRIN, so there is nothing to do on it. On
+PostgreSQL the ALTER of instances.id rewrites the table: run it off-peak
+on a large database.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# table -> columns
+BIGINT_COLUMNS = {
+    'telegram_users': ['telegram_user_id'],
+    'notification_outbox': ['chat_id'],
+    'instances': ['id'],
+    'purge_jobs': ['max_instance_id'],
+}
+
+
+def _set_types(type_: sa.types.TypeEngine, sequence_type: str, index_using: str) -> None:
+    for table, columns in BIGINT_COLUMNS.items():
+        for column in columns:
+            op.alter_column(table, column, type_=type_)
+    op.execute(f'ALTER SEQUENCE instances_id_seq AS {sequence_type}')
+    op.drop_index('ix_idempotent_responses_created_at', table_name='idempotent_responses')
+    op.create_index('ix_idempotent_responses_created_at', 'idempotent_responses', ['created_at'], postgresql_using=index_using)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        _set_types(sa.BigInteger(), 'bigint', 'brin')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        _set_types(sa.Integer(), 'integer', 'btree')
@@ -0,0 +1,48 @@
+"""user_settings.auto_rollover is opt-in
+
+It defaulted to on with timezone UTC, so the scheduler closed days at
+00:00 UTC for users who never set a timezone and failed their planned
+instances in the middle of their local day. Users still on the default
+schedule (UTC, day start 0, week start Monday) are switched off; whoever
+set a schedule through PUT /settings keeps rolling over.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+user_settings = sa.table(
+    'user_settings',
+    sa.column('timezone', sa.String()),
+    sa.column('day_start_hour', sa.Integer()),
+    sa.column('week_start_day', sa.Integer()),
+    sa.column('auto_rollover', sa.Boolean()),
+)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('user_settings') as batch:
+        batch.alter_column('auto_rollover', existing_type=sa.Boolean(), server_default=sa.false())
+    op.execute(
+        user_settings.update()
+        .where(
+            user_settings.c.timezone == 'UTC',
+            user_settings.c.day_start_hour == 0,
+            user_settings.c.week_start_day == 0,
+        )
+        .values(auto_rollover=False)
+    )
+
+
+def downgrade() -> None:
+    # Users switched off above stay off.
+    with op.batch_alter_table('user_settings') as batch:
+        batch.alter_column('auto_rollover', existing_type=sa.Boolean(), server_default=sa.true())
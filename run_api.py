@@ -1,6 +1,4 @@
-import uvicorn
-
-from app.core.config import settings
+from app.core.server import serve
 
 if __name__ == '__main__':
-    uvicorn.run('app.main:app', host=settings.app_host, port=settings.app_port, reload=True)
+    serve()
@@ -0,0 +1,5 @@
+from app.scheduler.scheduler import main
+import asyncio
+
+if __name__ == '__main__':
+    asyncio.run(main())